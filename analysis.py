@@ -0,0 +1,250 @@
+# Background analysis of the position on screen
+# AnalysisWorker runs the search in another process (or thread) fed through a queue: analyse(board) sends the
+# position and poll() returns the updates the search streamed back after every iteration (depth, score, best move,
+# principal variation) without ever waiting, so the gui loop keeps drawing at FPS while the search runs
+# Every position sent gets a new generation number, which is also written to a shared value the search checks every
+# 1024 nodes, so sending the next position (after a move or an undo) stops the old search right away and poll()
+# drops the updates it sent before it noticed
+# A process is the default: a search in a thread holds the GIL for most of every switch interval and the frames of
+# the gui loop get uneven
+# Usage:
+#   python analysis.py analyse [--fen FEN] [--seconds N] [--mode MODE] [--backend NAME]   prints the updates
+#   python analysis.py frames [--seconds N] [--mode MODE] [--backend NAME]               frame times of a headless
+#                                                                                        gui loop playing a move a second
+# MODE is process or thread, frames also takes inline (the search run in the loop itself) for comparison
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from engine import BACKENDS, BINARY_TO_PIECES, createBoard
+from perft import START_FEN, moveName
+from search import MATE, MAX_PLY, Search
+
+MODES = ('process', 'thread')
+# Plies of the principal variation shown by formatUpdate
+SHOWN_PV = 5
+# Time the inline mode of the frame benchmark searches every position for
+INLINE_SECONDS = 0.5
+
+# The latest generation for the thread mode, a plain int attribute is enough with the GIL
+class Generation:
+  def __init__(self):
+    self.value = 0
+
+class AnalysisWorker:
+  def __init__(self, backend='list', mode='process', hashMegabytes=16, maxDepth=MAX_PLY - 1):
+    if mode not in MODES:
+      raise ValueError('unknown mode ' + repr(mode) + ', choose from: ' + ', '.join(MODES))
+    self.mode = mode
+    self.generation = 0
+    if mode == 'process':
+      self.requests = multiprocessing.Queue()
+      self.results = multiprocessing.Queue()
+      self.latest = multiprocessing.Value('i', 0, lock=False)
+      worker = multiprocessing.Process
+    else:
+      self.requests = queue.Queue()
+      self.results = queue.Queue()
+      self.latest = Generation()
+      worker = threading.Thread
+    self.worker = worker(target=analysisLoop, args=(self.requests, self.results, self.latest, backend, hashMegabytes, maxDepth),
+                         daemon=True)
+    self.worker.start()
+
+  # Starts analysing the board's position, the search of the previous position stops at its next check
+  def analyse(self, board):
+    self.cancel()
+    self.requests.put((self.generation,) + positionOf(board))
+
+  # Stops the current search without starting another one
+  def cancel(self):
+    self.generation += 1
+    self.latest.value = self.generation
+
+  # The updates of the current position that arrived since the last call, never blocks
+  def poll(self):
+    updates = []
+    while True:
+      try:
+        update = self.results.get_nowait()
+      except queue.Empty:
+        return updates
+      if update['generation'] == self.generation:
+        updates.append(update)
+
+  def close(self, timeout=2.0):
+    self.cancel()
+    self.requests.put(None)
+    # Updates still in the results queue are read so a worker process isn't left waiting to flush them
+    deadline = time.perf_counter() + timeout
+    while self.worker.is_alive() and time.perf_counter() < deadline:
+      self.poll()
+      self.worker.join(0.05)
+    if self.mode == 'process' and self.worker.is_alive():
+      self.worker.terminate()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+# The position as the FEN after its last capture or pawn move and the moves played since, so the search in the worker
+# knows which positions repeat
+def positionOf(board):
+  moves = board.moveLog[len(board.moveLog) - min(board.halfmoveClock, len(board.moveLog)):]
+  for move in moves:
+    board.undoMove()
+  fen = board.toFEN()
+  for move in moves:
+    board.makeMove(move)
+  return fen, [moveName(move) for move in moves]
+
+# The worker: searches the newest position of the queue until a newer one is sent, None ends it
+def analysisLoop(requests, results, latest, backend, hashMegabytes, maxDepth):
+  search = Search(hashMegabytes)
+  while True:
+    request = requests.get()
+    # Positions sent while the last search was stopping were replaced already, only the newest one is searched
+    while request is not None:
+      try:
+        request = requests.get_nowait()
+      except queue.Empty:
+        break
+    if request is None:
+      return
+    generation, fen, moves = request
+    if generation != latest.value:
+      continue
+    board = createBoard(backend, fen)
+    for text in moves:
+      board.makeMove(board.findMove(text))
+    stop = lambda: latest.value != generation
+    report = lambda info: results.put(updateOf(generation, board, info))
+    search.search(board, maxDepth, report=report, stop=stop)
+    if not stop():
+      results.put({'generation': generation, 'done': True,
+                   'result': None if board.getValidMoves() else 'checkmate' if board.inCheck else 'stalemate'})
+
+# An update as it is sent back: the score in centipawns and the moves to mate (None without a mate) are from
+# white's point of view, the moves in long algebraic notation
+def updateOf(generation, board, info):
+  sign = 1 if board.whiteToMove else -1
+  mate = None
+  if abs(info.score) >= MATE - MAX_PLY:
+    moves = (MATE - abs(info.score) + 1) // 2
+    mate = sign * moves if info.score > 0 else -sign * moves
+  return {'generation': generation, 'done': False, 'depth': info.depth, 'score': sign * info.score, 'mate': mate,
+          'bestMove': moveName(info.bestMove), 'pv': [moveName(move) for move in info.pv], 'nodes': info.nodes,
+          'nps': info.nps()}
+
+# One line for the gui, ex: depth 6  +0.35  e2e4 e7e5 g1f3
+# None for the end of a search that has nothing new to show, the last line stays
+def formatUpdate(update):
+  if update['done']:
+    return update['result']
+  score = 'M{}'.format(update['mate']) if update['mate'] is not None else '{:+.2f}'.format(update['score'] / 100)
+  return 'depth {}  {}  {}'.format(update['depth'], score, ' '.join(update['pv'][:SHOWN_PV]))
+
+# Prints the updates of one position for the given number of seconds
+def analyseFor(fen, seconds, mode, backend):
+  with AnalysisWorker(backend, mode) as worker:
+    worker.analyse(createBoard(backend, fen))
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+      for update in worker.poll():
+        if update['done']:
+          print(update['result'] or 'done')
+          return
+        print(formatUpdate(update) + '  nodes {:,} nps {:,.0f}'.format(update['nodes'], update['nps']))
+      time.sleep(0.05)
+
+# Runs the gui loop without a window: the renderer draws every frame, a random move is played every second and the
+# new position is analysed, then the frame times are printed
+# In inline mode every position is searched for INLINE_SECONDS inside the loop, like a gui without the worker
+def frameBench(seconds, mode, backend):
+  os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+  import pygame
+  from constants import FPS, HEIGHT, SQUARE_SIZE, WIDTH
+  from ui.render import FrameLog, Renderer
+  pygame.init()
+  screen = pygame.display.set_mode((WIDTH, HEIGHT))
+  # Plain squares instead of the piece images, drawing them is the same work
+  images = {}
+  for piece in BINARY_TO_PIECES:
+    if piece:
+      images[piece] = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE))
+      images[piece].fill((255, 255, 255) if piece & 8 else (0, 0, 0))
+  renderer = Renderer(screen, images)
+  worker = AnalysisWorker(backend, mode) if mode != 'inline' else None
+  search = Search()
+  board = createBoard(backend)
+  rng = random.Random(0)
+  clock = pygame.time.Clock()
+  frames = FrameLog(FPS)
+  updates = 0
+  changed = True
+  now = time.perf_counter()
+  nextMove = now + 1.0
+  end = now + seconds
+  while now < end:
+    pygame.event.pump()
+    if now >= nextMove:
+      moves = board.getValidMoves()
+      if moves and len(board.moveLog) < 100:
+        board.makeMove(rng.choice(moves))
+      else:
+        board = createBoard(backend)
+      changed = True
+      nextMove += 1.0
+    if changed:
+      changed = False
+      if worker is not None:
+        worker.analyse(board)
+      else:
+        infos = search.search(board, timeLimit=INLINE_SECONDS)
+        updates += len(infos)
+        if infos:
+          renderer.setAnalysis(formatUpdate(updateOf(0, board, infos[-1])))
+    if worker is not None:
+      for update in worker.poll():
+        updates += 1
+        text = formatUpdate(update)
+        if text is not None:
+          renderer.setAnalysis(text)
+    renderer.draw(board, ())
+    frames.tick()
+    clock.tick(FPS)
+    now = time.perf_counter()
+  if worker is not None:
+    worker.close()
+  pygame.quit()
+  print('{:<8} {}, {:,} analysis updates'.format(mode, frames.summary(), updates))
+
+def main(argv):
+  # Imported here, the analysis worker imports this module and has no use for the command line
+  import argparse
+  parser = argparse.ArgumentParser(description='Analyses positions in a background worker')
+  commands = parser.add_subparsers(dest='command', required=True)
+  analyse = commands.add_parser('analyse', help='prints the updates of one position')
+  analyse.add_argument('--fen', default=START_FEN)
+  analyse.add_argument('--seconds', type=float, default=5.0)
+  analyse.add_argument('--mode', default='process', choices=MODES)
+  analyse.add_argument('--backend', default='list', choices=list(BACKENDS))
+  frames = commands.add_parser('frames', help='frame times of a headless gui loop while analysing')
+  frames.add_argument('--seconds', type=float, default=10.0)
+  frames.add_argument('--mode', default='process', choices=MODES + ('inline',))
+  frames.add_argument('--backend', default='list', choices=list(BACKENDS))
+  args = parser.parse_args(argv)
+
+  if args.command == 'analyse':
+    analyseFor(args.fen, args.seconds, args.mode, args.backend)
+  else:
+    frameBench(args.seconds, args.mode, args.backend)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,303 @@
+# Attack map backend
+# Keeps, for each side, how many of its pieces attack every square (index row * 8 + col) and updates the counts in
+# makeMove instead of walking rays from a square every time a question is asked: isAttacked, the enemy attack mask used
+# for king moves, whether the side to move is in check and which pieces hang are lookups
+# A move only changes the attacks of the pieces on the squares it changes (start, end, the pawn taken en passant, the
+# castling rook) and of the sliders whose rays pass through those squares, so only those are taken out before the move
+# and put back after it, one ray per slider
+# undoMove puts back the counts saved by makeMove, copying 128 counts is cheaper than walking the rays again
+# Usage:
+#   python attackmap.py check [--games N] [--seed N]   compares the maps with the scan-based Board code in random games
+#   python attackmap.py bench [--seconds N]            lookups against scans, and perft with and without the maps
+# Also a backend of engine.BACKENDS ('attackmap'), so perft.py, difftest.py and the rest can run on it
+import random
+import sys
+import time
+from engine import DIAGONALS, KING_OFFSETS, KNIGHT_OFFSETS, ORTHOGONALS, Board, createBoard
+
+WHITE = 8
+BLACK = 16
+
+# The 4 orthogonal directions then the 4 diagonal ones, OPPOSITE[d] is the direction back
+DIRECTIONS = ORTHOGONALS + DIAGONALS
+OPPOSITE = [DIRECTIONS.index((-dr, -dc)) for dr, dc in DIRECTIONS]
+
+# Squares along every direction from every square to the edge of the board, RAYS[sq][d]
+RAYS = [[[(r + dr * i) * 8 + c + dc * i for i in range(1, 8) if 0 <= r + dr * i < 8 and 0 <= c + dc * i < 8]
+         for dr, dc in DIRECTIONS] for r, c in (divmod(sq, 8) for sq in range(64))]
+
+def stepTargets(offsets):
+  return [[(r + dr) * 8 + c + dc for dr, dc in offsets if 0 <= r + dr < 8 and 0 <= c + dc < 8]
+          for r, c in (divmod(sq, 8) for sq in range(64))]
+
+KNIGHT_TARGETS = stepTargets(KNIGHT_OFFSETS)
+KING_TARGETS = stepTargets(KING_OFFSETS)
+# White pawns attack up the board (row - 1) and black pawns down
+PAWN_TARGETS = {WHITE: stepTargets([(-1, -1), (-1, 1)]), BLACK: stepTargets([(1, -1), (1, 1)])}
+
+# Directions each piece type slides in, indexed by piece & 7
+SLIDES = [(), (), (), (), range(4, 8), range(4), range(8)]
+
+class AttackMapBoard(Board):
+  def __init__(self):
+    super().__init__()
+    self.loadAttacks()
+
+  def setPosition(self, board, whiteToMove, castlingRights=0, enpassantSquare=None, halfmoveClock=0, fullmoveNumber=1):
+    super().setPosition(board, whiteToMove, castlingRights, enpassantSquare, halfmoveClock, fullmoveNumber)
+    self.loadAttacks()
+
+  # Counts every attack of the position from scratch
+  def loadAttacks(self):
+    self.attacks = {WHITE: [0] * 64, BLACK: [0] * 64}
+    self.attackLog = [] # (white counts, black counts) before every move of the moveLog
+    board = self.board
+    for sq in range(64):
+      piece = board[sq >> 3][sq & 7]
+      if piece:
+        self.addAttacks(piece, sq, 1)
+
+  def clone(self, history=True):
+    board = super().clone(history)
+    board.attacks = {WHITE: self.attacks[WHITE][:], BLACK: self.attacks[BLACK][:]}
+    # The saved counts become the live ones again on undo and are then changed in place, so each is copied
+    board.attackLog = [(white[:], black[:]) for white, black in self.attackLog] if history else []
+    return board
+
+  # Adds delta to the count of every square the piece on sq attacks
+  def addAttacks(self, piece, sq, delta):
+    counts = self.attacks[piece & 24]
+    pieceType = piece & 7
+    if pieceType == 2:
+      targets = PAWN_TARGETS[piece & 24][sq]
+    elif pieceType == 3:
+      targets = KNIGHT_TARGETS[sq]
+    elif pieceType == 1:
+      targets = KING_TARGETS[sq]
+    else:
+      for d in SLIDES[pieceType]:
+        self.addRay(counts, sq, d, delta)
+      return
+    for t in targets:
+      counts[t] += delta
+
+  # Adds delta along the ray from sq up to and including the first piece
+  def addRay(self, counts, sq, d, delta):
+    board = self.board
+    for t in RAYS[sq][d]:
+      counts[t] += delta
+      if board[t >> 3][t & 7]:
+        return
+
+  # (square, direction) of the slider rays that reach one of the squares, for sliders not on those squares
+  def raysThrough(self, squares):
+    board = self.board
+    rays = set()
+    for sq in squares:
+      for d in range(8):
+        for t in RAYS[sq][d]:
+          piece = board[t >> 3][t & 7]
+          if piece:
+            back = OPPOSITE[d]
+            if back in SLIDES[piece & 7] and t not in squares:
+              rays.add((t, back))
+            break
+    return rays
+
+  def makeMove(self, move):
+    attacks = self.attacks
+    self.attackLog.append((attacks[WHITE][:], attacks[BLACK][:]))
+    changed = [move.startRow * 8 + move.startCol, move.endRow * 8 + move.endCol]
+    if move.isEnpassant:
+      changed.append(move.startRow * 8 + move.endCol)
+    elif move.isCastle:
+      row = move.endRow * 8
+      changed += [row + 7, row + 5] if move.endCol == 6 else [row, row + 3]
+    board = self.board
+    # Out with the attacks of the pieces on the changed squares and of the rays through them, on the old board
+    rays = self.raysThrough(changed)
+    for sq, d in rays:
+      self.addRay(attacks[board[sq >> 3][sq & 7] & 24], sq, d, -1)
+    for sq in changed:
+      piece = board[sq >> 3][sq & 7]
+      if piece:
+        self.addAttacks(piece, sq, -1)
+    super().makeMove(move)
+    # And back in on the new board
+    for sq, d in rays:
+      self.addRay(attacks[board[sq >> 3][sq & 7] & 24], sq, d, 1)
+    for sq in changed:
+      piece = board[sq >> 3][sq & 7]
+      if piece:
+        self.addAttacks(piece, sq, 1)
+
+  def undoMove(self):
+    if not self.moveLog:
+      return
+    super().undoMove()
+    white, black = self.attackLog.pop()
+    self.attacks = {WHITE: white, BLACK: black}
+
+  # Is the square (r, c) attacked by the side not to move
+  def isAttacked(self, r, c):
+    return self.attacks[BLACK if self.whiteToMove else WHITE][r * 8 + c] > 0
+
+  def isInCheck(self):
+    kingR, kingC = self.wKingPos if self.whiteToMove else self.bKingPos
+    return self.isAttacked(kingR, kingC)
+
+  # Bitmask of the squares the color attacks
+  def attackedSquares(self, color):
+    mask = 0
+    for sq, count in enumerate(self.attacks[color]):
+      if count:
+        mask |= 1 << sq
+    return mask
+
+  # Same as Board.enemyAttacks: the squares the side not to move attacks, looking through our own king
+  # The maps see the king as a blocker so the rays of the sliders checking it are carried on past it
+  def enemyAttacks(self):
+    enemy = BLACK if self.whiteToMove else WHITE
+    attacks = self.attackedSquares(enemy)
+    kingR, kingC = self.wKingPos if self.whiteToMove else self.bKingPos
+    king = kingR * 8 + kingC
+    if not self.attacks[enemy][king]:
+      return attacks
+    board = self.board
+    for d in range(8):
+      for t in RAYS[king][d]:
+        piece = board[t >> 3][t & 7]
+        if piece:
+          if piece & enemy and d in SLIDES[piece & 7]:
+            # A slider in direction d checks the king, its ray goes on the other way
+            for behind in RAYS[king][OPPOSITE[d]]:
+              attacks |= 1 << behind
+              if board[behind >> 3][behind & 7]:
+                break
+          break
+    return attacks
+
+  # Squares of the color's pieces (kings left out) the other side attacks and the color doesn't defend
+  def hangingPieces(self, color):
+    board = self.board
+    enemy = self.attacks[color ^ 24]
+    own = self.attacks[color]
+    return [sq for sq in range(64) if board[sq >> 3][sq & 7] & color and board[sq >> 3][sq & 7] & 7 != 1
+            and enemy[sq] and not own[sq]]
+
+# Describes the first difference between the board's maps and the scan-based code, None when they agree
+def checkAttackMaps(board):
+  fresh = AttackMapBoard()
+  fresh.setPosition([row[:] for row in board.board], board.whiteToMove)
+  if board.attacks != fresh.attacks:
+    return 'counts differ from a recount'
+  for whiteToMove in (True, False):
+    saved = board.whiteToMove
+    board.whiteToMove = whiteToMove
+    try:
+      for sq in range(64):
+        if board.isAttacked(sq >> 3, sq & 7) != Board.isAttacked(board, sq >> 3, sq & 7):
+          return 'isAttacked differs on square {}'.format(sq)
+      if board.enemyAttacks() != Board.enemyAttacks(board):
+        return 'enemyAttacks differs'
+      if board.isInCheck() != Board.lookForChecksPins(board)[0]:
+        return 'check differs'
+    finally:
+      board.whiteToMove = saved
+  return None
+
+# Plays random games, checking the maps after every move and again while undoing them
+# Returns (positions checked, list of failures)
+def runCheck(games=50, maxPlies=200, seed=0):
+  rng = random.Random(seed)
+  positions = 0
+  failures = []
+  for game in range(games):
+    board = AttackMapBoard()
+    for ply in range(maxPlies):
+      moves = board.getValidMoves()
+      if not moves:
+        break
+      board.makeMove(rng.choice(moves))
+      problem = checkAttackMaps(board)
+      positions += 1
+      if problem:
+        failures.append((game, ply, problem, board.toFEN()))
+        break
+    # A clone keeps its own history while the original goes back a move and plays on
+    if board.moveLog:
+      clone = board.clone()
+      board.undoMove()
+      for i in range(3):
+        moves = board.getValidMoves()
+        if not moves:
+          break
+        board.makeMove(rng.choice(moves))
+      while clone.moveLog:
+        clone.undoMove()
+        problem = checkAttackMaps(clone)
+        positions += 1
+        if problem:
+          failures.append((game, 'clone undo', problem, clone.toFEN()))
+          break
+    while board.moveLog:
+      board.undoMove()
+      problem = checkAttackMaps(board)
+      positions += 1
+      if problem:
+        failures.append((game, 'undo', problem, board.toFEN()))
+        break
+  return positions, failures
+
+# Lookups against the scans they replace on a middlegame position, then perft with and without the maps
+def bench(seconds):
+  from bench import measure
+  from perft import perft
+  fen = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+  scan = createBoard('list', fen)
+  maps = createBoard('attackmap', fen)
+  for name, board, isAttacked, enemyAttacks in (('scan', scan, Board.isAttacked, Board.enemyAttacks),
+                                                ('maps', maps, AttackMapBoard.isAttacked, AttackMapBoard.enemyAttacks)):
+    def allSquares():
+      for sq in range(64):
+        isAttacked(board, sq >> 3, sq & 7)
+      return 64
+    print('{}: isAttacked {:,.0f}/s, enemyAttacks {:,.0f}/s'.format(
+      name, measure(allSquares, seconds), measure(lambda: enemyAttacks(board) and 1, seconds)))
+  print('maps: hangingPieces {:,.0f}/s'.format(measure(lambda: len(maps.hangingPieces(WHITE)) + 1, seconds)))
+  for backend in ('list', 'attackmap'):
+    board = createBoard(backend, fen)
+    moves = board.getValidMoves()
+    def makeUndo():
+      for move in moves:
+        board.makeMove(move)
+        board.undoMove()
+      return len(moves)
+    print('makeMove + undoMove[{}]: {:,.0f}/s'.format(backend, measure(makeUndo, seconds)))
+  for backend in ('list', 'attackmap'):
+    board = createBoard(backend)
+    print('perft[{}]: {:,.0f} nodes/s'.format(backend, measure(lambda: perft(board, 3), seconds)))
+
+def main(argv):
+  import argparse
+  parser = argparse.ArgumentParser(description='Checks and times the incremental attack maps')
+  commands = parser.add_subparsers(dest='command', required=True)
+  check = commands.add_parser('check', help='compares the maps with the scan-based code in random games')
+  check.add_argument('--games', type=int, default=50)
+  check.add_argument('--seed', type=int, default=0)
+  benchParser = commands.add_parser('bench', help='times lookups against scans and perft with and without the maps')
+  benchParser.add_argument('--seconds', type=float, default=2.0)
+  args = parser.parse_args(argv)
+
+  if args.command == 'check':
+    start = time.perf_counter()
+    positions, failures = runCheck(args.games, seed=args.seed)
+    print('{:,} positions checked in {:.1f}s, {} failures'.format(positions, time.perf_counter() - start, len(failures)))
+    for failure in failures[:10]:
+      print(failure)
+    return 1 if failures else 0
+  bench(args.seconds)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
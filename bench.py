@@ -0,0 +1,109 @@
+# Micro benchmarks for the engine
+# Usage: python bench.py [name] [seconds]
+import sys
+import time
+from engine import BACKENDS, createBoard
+
+# Runs fn repeatedly for roughly the given number of seconds
+# fn returns how many units of work it did, the rate of units per second is returned
+def measure(fn, seconds=2.0):
+  units = 0
+  start = time.perf_counter()
+  end = start + seconds
+  now = start
+  while now < end:
+    units += fn()
+    now = time.perf_counter()
+  return units / (now - start)
+
+# Pseudo legal moves generated per second from the starting position, for every backend
+def benchMoveGen(seconds):
+  for backend in BACKENDS:
+    board = createBoard(backend)
+    rate = measure(lambda: len(board.generateAllMoves()), seconds)
+    print('movegen[' + backend + ']: {:,.0f} moves/s'.format(rate))
+
+# Perft nodes per second (getValidMoves, makeMove and undoMove) from the starting position, for every backend
+def benchPerft(seconds):
+  import perft
+  for backend in BACKENDS:
+    board = createBoard(backend)
+    rate = measure(lambda: perft.perft(board, 3), seconds)
+    print('perft[' + backend + ']: {:,.0f} nodes/s'.format(rate))
+
+# Cost of the incremental Zobrist update against copying the board and hashing it from scratch
+def benchHash(seconds):
+  board = createBoard()
+  move = board.getValidMoves()[0]
+  def makeUndo():
+    for i in range(100):
+      board.makeMove(move)
+      board.undoMove()
+    return 100
+  def copyBoard():
+    for i in range(100):
+      [row[:] for row in board.board]
+    return 100
+  def computeHash():
+    for i in range(100):
+      board.computeHash()
+    return 100
+  print('hash: makeMove + undoMove {:,.0f}/s, board copy {:,.0f}/s, full hash {:,.0f}/s'.format(
+    measure(makeUndo, seconds / 3), measure(copyBoard, seconds / 3), measure(computeHash, seconds / 3)))
+
+# Copying a board in the middle of a game: copy.deepcopy against Board.clone, then searching ahead on a copy per move
+# (copy-make) against makeMove + undoMove on the same board
+def benchClone(seconds):
+  import copy
+  import random
+  rng = random.Random(0)
+  for backend in BACKENDS:
+    board = createBoard(backend)
+    for ply in range(60):
+      board.makeMove(rng.choice(board.getValidMoves()))
+    moves = board.getValidMoves()
+    def deepcopyBoard():
+      for i in range(10):
+        copy.deepcopy(board)
+      return 10
+    def cloneBoard():
+      for i in range(100):
+        board.clone()
+      return 100
+    def cloneWithoutHistory():
+      for i in range(100):
+        board.clone(history=False)
+      return 100
+    def copyMake():
+      for move in moves:
+        board.clone(history=False).makeMove(move)
+      return len(moves)
+    def makeUndo():
+      for move in moves:
+        board.makeMove(move)
+        board.undoMove()
+      return len(moves)
+    print('clone[' + backend + ']: deepcopy {:,.0f}/s, clone {:,.0f}/s, clone(history=False) {:,.0f}/s, '
+          'clone + makeMove {:,.0f}/s, makeMove + undoMove {:,.0f}/s'.format(
+            measure(deepcopyBoard, seconds / 5), measure(cloneBoard, seconds / 5), measure(cloneWithoutHistory, seconds / 5),
+            measure(copyMake, seconds / 5), measure(makeUndo, seconds / 5)))
+
+BENCHMARKS = {
+  'movegen': benchMoveGen,
+  'perft': benchPerft,
+  'hash': benchHash,
+  'clone': benchClone,
+}
+
+def main(argv):
+  names = [argv[0]] if argv else list(BENCHMARKS)
+  seconds = float(argv[1]) if len(argv) > 1 else 2.0
+  for name in names:
+    if name not in BENCHMARKS:
+      print('unknown benchmark ' + name + ', choose from: ' + ', '.join(BENCHMARKS))
+      return 1
+    BENCHMARKS[name](seconds)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
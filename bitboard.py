@@ -0,0 +1,241 @@
+# Bitboard move generation backend
+# Square index is row * 8 + col, so bit 0 is a8 and bit 63 is h1 (same orientation as Board.board)
+# The nested list in Board.board is still kept up to date so the gui and Move objects keep working
+from engine import PROMOTIONS, Board, Move
+
+WHITE = 8
+BLACK = 16
+KING, PAWN, KNIGHT, BISHOP, ROOK, QUEEN = 1, 2, 3, 4, 5, 6
+
+FULL = (1 << 64) - 1
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+ROW_0 = 0xFF # Rank 8
+ROW_7 = 0xFF << 56 # Rank 1
+
+# Same order as Board.lookForChecksPins, the first 4 are orthogonal and the last 4 diagonal
+DIRECTIONS = [(-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+KNIGHT_TARGETS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+
+# Builds a table of 64 bitboards with the squares reachable by a single step in each of the given offsets
+def stepTable(offsets):
+  table = []
+  for sq in range(64):
+    r, c = divmod(sq, 8)
+    bb = 0
+    for dr, dc in offsets:
+      if 0 <= r + dr < 8 and 0 <= c + dc < 8:
+        bb |= 1 << ((r + dr) * 8 + c + dc)
+    table.append(bb)
+  return table
+
+# Builds RAYS[d][sq], every square from sq (exclusive) to the edge of the board in direction d
+def rayTable():
+  rays = []
+  for dr, dc in DIRECTIONS:
+    table = []
+    for sq in range(64):
+      r, c = divmod(sq, 8)
+      bb = 0
+      r += dr
+      c += dc
+      while 0 <= r < 8 and 0 <= c < 8:
+        bb |= 1 << (r * 8 + c)
+        r += dr
+        c += dc
+      table.append(bb)
+    rays.append(table)
+  return rays
+
+KNIGHT_ATTACKS = stepTable(KNIGHT_TARGETS)
+KING_ATTACKS = stepTable(DIRECTIONS)
+RAYS = rayTable()
+# A direction walks towards higher square indexes if its row step is positive or it goes right on the same row
+POSITIVE = [dr * 8 + dc > 0 for dr, dc in DIRECTIONS]
+
+# Classical ray lookup: take the full ray and cut it off behind the first blocker
+def rayAttacks(sq, d, occupied):
+  ray = RAYS[d][sq]
+  blockers = ray & occupied
+  if blockers:
+    if POSITIVE[d]:
+      first = (blockers & -blockers).bit_length() - 1
+    else:
+      first = blockers.bit_length() - 1
+    ray ^= RAYS[d][first]
+  return ray
+
+def rookAttacks(sq, occupied):
+  return rayAttacks(sq, 0, occupied) | rayAttacks(sq, 1, occupied) | rayAttacks(sq, 2, occupied) | rayAttacks(sq, 3, occupied)
+
+def bishopAttacks(sq, occupied):
+  return rayAttacks(sq, 4, occupied) | rayAttacks(sq, 5, occupied) | rayAttacks(sq, 6, occupied) | rayAttacks(sq, 7, occupied)
+
+# Yields the index of every set bit, lowest first
+def squares(bb):
+  while bb:
+    low = bb & -bb
+    yield low.bit_length() - 1
+    bb ^= low
+
+# A Board that keeps one bitboard per piece code and one per color next to the nested list
+class BitboardBoard(Board):
+  def __init__(self):
+    super().__init__()
+    self.loadBitboards()
+
+  def setPosition(self, board, whiteToMove, castlingRights=0, enpassantSquare=None, halfmoveClock=0, fullmoveNumber=1):
+    super().setPosition(board, whiteToMove, castlingRights, enpassantSquare, halfmoveClock, fullmoveNumber)
+    self.loadBitboards()
+
+  # Rebuilds every bitboard from self.board
+  def loadBitboards(self):
+    self.pieceBB = [0] * 23 # indexed by the binary piece code (color | type)
+    self.colorBB = {WHITE: 0, BLACK: 0}
+    for r in range(8):
+      for c in range(8):
+        piece = self.board[r][c]
+        if piece != 0:
+          bit = 1 << (r * 8 + c)
+          self.pieceBB[piece] |= bit
+          self.colorBB[piece & 24] |= bit
+    self.occupied = self.colorBB[WHITE] | self.colorBB[BLACK]
+
+  def clone(self, history=True):
+    board = super().clone(history)
+    board.pieceBB = self.pieceBB[:]
+    board.colorBB = self.colorBB.copy()
+    return board
+
+  def makeMove(self, move):
+    super().makeMove(move)
+    self.toggleMove(move)
+
+  def undoMove(self):
+    if not self.moveLog:
+      return
+    move = self.moveLog[-1]
+    super().undoMove()
+    self.toggleMove(move)
+
+  # Xors the move into the bitboards, xoring it again takes it back out so makeMove and undoMove share it
+  def toggleMove(self, move):
+    pb = self.pieceBB
+    cb = self.colorBB
+    start = 1 << (move.startRow * 8 + move.startCol)
+    end = 1 << (move.endRow * 8 + move.endCol)
+    moved = move.pieceMoved
+    pb[moved] ^= start
+    pb[move.promotion or moved] ^= end
+    cb[moved & 24] ^= start | end
+    if move.pieceCaptured != 0:
+      # The pawn taken en passant is next to the start square
+      captured = 1 << (move.startRow * 8 + move.endCol) if move.isEnpassant else end
+      pb[move.pieceCaptured] ^= captured
+      cb[move.pieceCaptured & 24] ^= captured
+    if move.isCastle:
+      row = move.endRow * 8
+      rook = (1 << (row + 7) | 1 << (row + 5)) if move.endCol == 6 else (1 << row | 1 << (row + 3))
+      pb[(moved & 24) | ROOK] ^= rook
+      cb[moved & 24] ^= rook
+    self.occupied = cb[WHITE] | cb[BLACK]
+
+  # Adds a Move for every target bit
+  def addMoves(self, sq, targets, moves):
+    start = divmod(sq, 8)
+    for t in squares(targets):
+      moves.append(Move(start, divmod(t, 8), self))
+
+  # Same moves as Board.generateAllMoves (kings are generated separately) using the bitboards
+  def generateAllMoves(self):
+    moves = []
+    us = WHITE if self.whiteToMove else BLACK
+    them = BLACK if self.whiteToMove else WHITE
+    occupied = self.occupied
+    notOwn = FULL ^ self.colorBB[us]
+    enemies = self.colorBB[them]
+    empty = FULL ^ occupied
+
+    self.generatePawnBitboardMoves(us, empty, enemies, moves)
+    for sq in squares(self.pieceBB[us | KNIGHT]):
+      self.addMoves(sq, KNIGHT_ATTACKS[sq] & notOwn, moves)
+    for sq in squares(self.pieceBB[us | BISHOP] | self.pieceBB[us | QUEEN]):
+      self.addMoves(sq, bishopAttacks(sq, occupied) & notOwn, moves)
+    for sq in squares(self.pieceBB[us | ROOK] | self.pieceBB[us | QUEEN]):
+      self.addMoves(sq, rookAttacks(sq, occupied) & notOwn, moves)
+    return moves
+
+  def generatePawnBitboardMoves(self, us, empty, enemies, moves):
+    pawns = self.pieceBB[us | PAWN]
+    # The en passant square can be captured on like an enemy piece
+    if self.enpassantSquare is not None:
+      enemies |= 1 << (self.enpassantSquare[0] * 8 + self.enpassantSquare[1])
+    if us == WHITE:
+      single = (pawns >> 8) & empty
+      double = ((single & (0xFF << 40)) >> 8) & empty # pawns that started on row 6
+      pushes = [(single, 8), (double, 16)]
+      captures = [((pawns >> 9) & NOT_FILE_H & enemies, 9), ((pawns >> 7) & NOT_FILE_A & enemies, 7)]
+      lastRow = ROW_0
+    else:
+      single = (pawns << 8) & empty
+      double = ((single & (0xFF << 16)) << 8) & empty # pawns that started on row 1
+      pushes = [(single, -8), (double, -16)]
+      captures = [((pawns << 9) & NOT_FILE_A & enemies, -9), ((pawns << 7) & NOT_FILE_H & enemies, -7)]
+      lastRow = ROW_7
+    for targets, delta in pushes + captures:
+      for t in squares(targets & (FULL ^ lastRow)):
+        moves.append(Move(divmod(t + delta, 8), divmod(t, 8), self))
+      # A pawn reaching the last row promotes, one move per piece
+      for t in squares(targets & lastRow):
+        start = divmod(t + delta, 8)
+        end = divmod(t, 8)
+        for promotion in PROMOTIONS:
+          moves.append(Move(start, end, self, promotion))
+
+  # Same as Board.enemyAttacks: every square the side not to move attacks, looking through our own king
+  def enemyAttacks(self):
+    them = BLACK if self.whiteToMove else WHITE
+    us = WHITE if self.whiteToMove else BLACK
+    pb = self.pieceBB
+    occupied = self.occupied ^ pb[us | KING]
+    attacks = 0
+    pawns = pb[them | PAWN]
+    if them == WHITE:
+      attacks |= ((pawns >> 9) & NOT_FILE_H) | ((pawns >> 7) & NOT_FILE_A)
+    else:
+      attacks |= ((pawns << 9) & NOT_FILE_A) | ((pawns << 7) & NOT_FILE_H)
+    for sq in squares(pb[them | KNIGHT]):
+      attacks |= KNIGHT_ATTACKS[sq]
+    for sq in squares(pb[them | KING]):
+      attacks |= KING_ATTACKS[sq]
+    for sq in squares(pb[them | BISHOP] | pb[them | QUEEN]):
+      attacks |= bishopAttacks(sq, occupied)
+    for sq in squares(pb[them | ROOK] | pb[them | QUEEN]):
+      attacks |= rookAttacks(sq, occupied)
+    return attacks & FULL
+
+  # Is the square (r, c) attacked by the side not to move
+  # Looks outward from the square with each piece's attack pattern and intersects it with the enemy pieces
+  def isAttacked(self, r, c):
+    sq = r * 8 + c
+    them = BLACK if self.whiteToMove else WHITE
+    pb = self.pieceBB
+    if KNIGHT_ATTACKS[sq] & pb[them | KNIGHT]:
+      return True
+    if KING_ATTACKS[sq] & pb[them | KING]:
+      return True
+    bit = 1 << sq
+    if them == WHITE:
+      pawnAttackers = ((bit << 9) & NOT_FILE_A) | ((bit << 7) & NOT_FILE_H)
+    else:
+      pawnAttackers = ((bit >> 9) & NOT_FILE_H) | ((bit >> 7) & NOT_FILE_A)
+    if pawnAttackers & FULL & pb[them | PAWN]:
+      return True
+    occupied = self.occupied
+    if rookAttacks(sq, occupied) & (pb[them | ROOK] | pb[them | QUEEN]):
+      return True
+    if bishopAttacks(sq, occupied) & (pb[them | BISHOP] | pb[them | QUEEN]):
+      return True
+    return False
@@ -0,0 +1,220 @@
+# Opening book stored as a sorted file of fixed size records, queried with a binary search over mmap
+# Every record is (position hash, moveID, weight) where the hash is engine's Zobrist hash (board.hash) and
+# the weight is how often the move was played in the games the book was built from
+# Records are sorted by hash so a lookup reads about log2(records) keys and the file is never loaded into memory
+# Usage:
+#   python book.py build GAMES BOOK [--plies N] [--min-count N]   builds a book from a move list or PGN file
+#   python book.py probe BOOK [--fen FEN]                         prints the book moves of a position
+#   python book.py bench BOOK [--count N]                         times lookups of positions in the book
+# Move list files have one game per line, every token that looks like a move in long algebraic notation (e2e4, e7e8q)
+# is played in order and everything else is skipped, so selfplay.py logs can be used as they are
+# Files ending in .pgn are read as PGN
+import argparse
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+import time
+from engine import PROMOTION_IDS, Move, createBoard
+from perft import START_FEN, moveName
+
+# hash, moveID, weight and 4 bytes of padding to keep records 16 bytes long
+BOOK_RECORD = struct.Struct('<QHH4x')
+BOOK_RECORD_SIZE = BOOK_RECORD.size
+BOOK_KEY = struct.Struct('<Q')
+MAX_WEIGHT = 0xFFFF
+
+MOVE_TOKEN = re.compile(r'^[a-h][1-8][a-h][1-8][qrbn]?$')
+# Piece type of the moveID offsets of PROMOTION_IDS
+PROMOTION_OFFSETS = {offset: pieceType for pieceType, offset in PROMOTION_IDS.items()}
+
+class OpeningBook:
+  def __init__(self, path):
+    self.file = open(path, 'rb')
+    size = os.fstat(self.file.fileno()).st_size
+    if size % BOOK_RECORD_SIZE:
+      self.file.close()
+      raise ValueError(path + ' is not a whole number of ' + str(BOOK_RECORD_SIZE) + ' byte records')
+    self.count = size // BOOK_RECORD_SIZE
+    # mmap can't map an empty file
+    self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+  def __len__(self):
+    return self.count
+
+  # Index of the first record with this hash or after where it would be
+  def firstIndex(self, key):
+    data = self.data
+    low, high = 0, self.count
+    while low < high:
+      mid = (low + high) >> 1
+      if BOOK_KEY.unpack_from(data, mid * BOOK_RECORD_SIZE)[0] < key:
+        low = mid + 1
+      else:
+        high = mid
+    return low
+
+  # (moveID, weight) of every book move of the position with this hash, most played first
+  def entries(self, key):
+    result = []
+    for i in range(self.firstIndex(key), self.count):
+      recordKey, moveID, weight = BOOK_RECORD.unpack_from(self.data, i * BOOK_RECORD_SIZE)
+      if recordKey != key:
+        break
+      result.append((moveID, weight))
+    return result
+
+  # (Move, weight) of every book move of the board's position
+  def moves(self, board):
+    return [(moveFromID(board, moveID), weight) for moveID, weight in self.entries(board.hash)]
+
+  # A book move for the board picked at random in proportion to the weights, or the most played one when
+  # rng is None, None when the position is not in the book
+  # The move is built from its moveID without generating the legal moves
+  def bookMove(self, board, rng=None):
+    entries = self.entries(board.hash)
+    if not entries:
+      return None
+    if rng is None:
+      moveID = entries[0][0]
+    else:
+      pick = rng.randrange(sum(weight for moveID, weight in entries))
+      for moveID, weight in entries:
+        pick -= weight
+        if pick < 0:
+          break
+    return moveFromID(board, moveID)
+
+  def close(self):
+    if self.count:
+      self.data.close()
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+# The thousands digit and up of a promotion's moveID also hold the piece it promotes to, see PROMOTION_IDS
+def moveFromID(board, moveID):
+  promotion = PROMOTION_OFFSETS[moveID // 10000 * 10000]
+  moveID %= 10000
+  return Move((moveID // 1000, moveID // 100 % 10), (moveID // 10 % 10, moveID % 10), board, promotion)
+
+# Yields the moves of every game of a move list or PGN file as lists of long algebraic notation moves
+def readMoveLists(path):
+  if path.lower().endswith('.pgn'):
+    yield from readPGNMoveLists(path)
+    return
+  with open(path) as games:
+    for line in games:
+      moves = [token for token in line.split() if MOVE_TOKEN.match(token)]
+      if moves:
+        yield moves
+
+# The moves of the PGN games up to the first one that can't be played, games set up from a FEN are skipped
+def readPGNMoveLists(path):
+  from pgn import parseSAN, readPGN
+  for game in readPGN(path):
+    if 'FEN' in game.headers:
+      continue
+    board = createBoard()
+    moves = []
+    for san in game.moves:
+      move = parseSAN(board, san)
+      if move is None:
+        break
+      moves.append(moveName(move))
+      board.makeMove(move)
+    if moves:
+      yield moves
+
+# Counts how often every move was played from every position of the first plies of the games and writes
+# the book, moves played fewer than minCount times are left out
+# Games stop counting at their first move that is not legal
+# Returns (games, records)
+def buildBook(games, outPath, plies=20, minCount=1, backend='list'):
+  counts = {}
+  gameCount = 0
+  for moves in games:
+    board = createBoard(backend)
+    for text in moves[:plies]:
+      move = board.findMove(text)
+      if move is None:
+        break
+      key = (board.hash, move.moveID)
+      counts[key] = counts.get(key, 0) + 1
+      board.makeMove(move)
+    gameCount += 1
+  records = sorted(((key, moveID, min(count, MAX_WEIGHT)) for (key, moveID), count in counts.items() if count >= minCount),
+                   key=lambda record: (record[0], -record[2], record[1]))
+  with open(outPath, 'wb') as out:
+    for record in records:
+      out.write(BOOK_RECORD.pack(*record))
+  return gameCount, len(records)
+
+# Times lookups of positions that are in the book, found by walking the most played lines
+def bench(path, count):
+  with OpeningBook(path) as book:
+    if not book.bookMove(createBoard()):
+      print('the start position is not in the book')
+      return
+    board = createBoard()
+    rng = random.Random(0)
+    boards = []
+    while len(boards) < count:
+      move = book.bookMove(board, rng)
+      if move is None or len(board.moveLog) >= 20:
+        board = createBoard()
+        continue
+      boards.append((board.hash, board.toFEN()))
+      board.makeMove(move)
+    start = time.perf_counter()
+    for key, fen in boards:
+      book.entries(key)
+    seconds = time.perf_counter() - start
+    print('{:,} records, {:,} lookups: {:.2f} us per lookup'.format(len(book), count, seconds * 1e6 / count))
+    lookupBoards = [createBoard('list', fen) for key, fen in boards[:1000]]
+    start = time.perf_counter()
+    for board in lookupBoards:
+      book.bookMove(board)
+    seconds = time.perf_counter() - start
+    print('bookMove: {:.2f} us per move'.format(seconds * 1e6 / len(lookupBoards)))
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Builds and queries opening books')
+  commands = parser.add_subparsers(dest='command', required=True)
+  build = commands.add_parser('build', help='builds a book from a move list or PGN file')
+  build.add_argument('games')
+  build.add_argument('book')
+  build.add_argument('--plies', type=int, default=20, help='plies of every game added to the book')
+  build.add_argument('--min-count', type=int, default=1, help='moves played fewer times are left out')
+  probe = commands.add_parser('probe', help='prints the book moves of a position')
+  probe.add_argument('book')
+  probe.add_argument('--fen', default=START_FEN)
+  benchParser = commands.add_parser('bench', help='times lookups')
+  benchParser.add_argument('book')
+  benchParser.add_argument('--count', type=int, default=10000)
+  args = parser.parse_args(argv)
+
+  if args.command == 'build':
+    start = time.perf_counter()
+    games, records = buildBook(readMoveLists(args.games), args.book, args.plies, args.min_count)
+    print('{} games, {} records ({:,} bytes) in {:.2f}s'.format(games, records, records * BOOK_RECORD_SIZE, time.perf_counter() - start))
+  elif args.command == 'probe':
+    board = createBoard('list', args.fen)
+    with OpeningBook(args.book) as book:
+      moves = book.moves(board)
+      for move, weight in moves:
+        print('{} {}'.format(moveName(move), weight))
+      if not moves:
+        print('not in book')
+  else:
+    bench(args.book, args.count)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
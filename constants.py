@@ -1,12 +1,14 @@
-import pygame
-
+# Settings of the gui, plain values so headless tools and workers import them without pygame
 # Game
 FPS = 60
+BACKEND = 'list' # Move generation backend, see engine.BACKENDS
+SHOW_STATS = True # FPS / frame time overlay, toggled with the F key
+ANALYSIS = True # Analyses the position in a background process and shows the best line in the bottom left corner
 
 # Colors
 DARKCOL = (169, 122, 101) # Dark tile color
-LIGHTCOL = pygame.Color(241, 217, 192) # light tile color
-HIGHLIGHTCOL = pygame.Color(255, 0, 0) 
+LIGHTCOL = (241, 217, 192) # light tile color
+HIGHLIGHTCOL = (255, 0, 0) 
 
 # Dimensions
 WIDTH, HEIGHT = 800, 800
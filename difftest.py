@@ -0,0 +1,77 @@
+# Differential test for the move generation backends
+# Plays random games on the list backend and a second backend side by side and checks
+# that both produce the same move sets and attacked squares in every position reached
+# Usage: python difftest.py [backend] [games] [seed]
+import random
+import sys
+from engine import Board, createBoard
+
+# The parts of a move both backends have to agree on
+def moveSet(moves):
+  return {(m.moveID, m.pieceMoved, m.pieceCaptured) for m in moves}
+
+def attackedSquares(board):
+  return [(r, c) for r in range(8) for c in range(8) if board.isAttacked(r, c)]
+
+# Returns a description of the first difference between the two boards or None
+def comparePositions(reference, other):
+  # Compared row by row as lists, the mailbox backend's rows are memoryviews
+  if [list(row) for row in reference.board] != [list(row) for row in other.board]:
+    return 'boards differ'
+  if (reference.castlingRights, reference.enpassantSquare, reference.halfmoveClock) != \
+     (other.castlingRights, other.enpassantSquare, other.halfmoveClock):
+    return 'castling, en passant or halfmove clock differs'
+  if reference.hash != reference.computeHash() or other.hash != reference.hash:
+    return 'incremental hash differs'
+  if moveSet(reference.generateAllMoves()) != moveSet(other.generateAllMoves()):
+    return 'generateAllMoves differs'
+  if attackedSquares(reference) != attackedSquares(other):
+    return 'isAttacked differs'
+  if reference.enemyAttacks() != other.enemyAttacks():
+    return 'enemyAttacks differs'
+  if moveSet(reference.getValidMoves()) != moveSet(other.getValidMoves()):
+    return 'getValidMoves differs'
+  return None
+
+# Plays the given number of random games and returns (positions compared, list of failures)
+def runDifferential(backend, games=50, maxPlies=120, seed=0):
+  rng = random.Random(seed)
+  positions = 0
+  failures = []
+  for game in range(games):
+    reference = Board()
+    other = createBoard(backend)
+    for ply in range(maxPlies):
+      problem = comparePositions(reference, other)
+      positions += 1
+      if problem:
+        failures.append((game, ply, problem, [m.getChessNotation() for m in reference.moveLog]))
+        break
+      moves = reference.getValidMoves()
+      # Stop once the game is over or a king has been taken
+      if not moves or not any(9 in row for row in reference.board) or not any(17 in row for row in reference.board):
+        break
+      move = rng.choice(moves)
+      reference.makeMove(move)
+      other.makeMove(move)
+    # Undo the whole game on both boards and make sure they end up back at the start
+    while reference.moveLog:
+      reference.undoMove()
+      other.undoMove()
+    problem = comparePositions(reference, other)
+    if problem:
+      failures.append((game, 'undo', problem, []))
+  return positions, failures
+
+def main(argv):
+  backend = argv[0] if argv else 'bitboard'
+  games = int(argv[1]) if len(argv) > 1 else 50
+  seed = int(argv[2]) if len(argv) > 2 else 0
+  positions, failures = runDifferential(backend, games, seed=seed)
+  for game, ply, problem, line in failures:
+    print('game', game, 'ply', ply, problem, ' '.join(line))
+  print(backend + ': ' + str(positions) + ' positions compared, ' + str(len(failures)) + ' failures')
+  return 1 if failures else 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
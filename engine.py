@@ -1,35 +1,143 @@
 # Import Statement
-import pygame
+import importlib
+import random
+import struct
+import sys
 
-# This Class is responsible for the piece representation and loading of images. 
-class Pieces:
-  def __init__(self):
-    # The Numbers represent Binary
-    self.empty = 0 # 00000
-    self.king = 1 # 00001
-    self.pawn = 2 # 00010
-    self.knight = 3 # 00011
-    self.bishop = 4 # 00100
-    self.rook = 5 # 00101
-    self.queen = 6 # 00110
-    # These are added to each binary number to represent the color (the last 2 bits)
-    self.white = 8 # 01000
-    self.black = 16 # 10000
-    # Here the images are loaded ONCE in memory and scaled to 100*100 to match the square size
-    self.images = {
-      9: pygame.transform.scale(pygame.image.load('images\\wK.png'), (100,100)),
-      17: pygame.transform.scale(pygame.image.load('images\\bK.png'),(100,100)),
-      10: pygame.transform.scale(pygame.image.load('images\\wP.png'),(100,100)),
-      18: pygame.transform.scale(pygame.image.load('images\\bP.png'),(100,100)),
-      11: pygame.transform.scale(pygame.image.load('images\\wN.png'),(100,100)),
-      19: pygame.transform.scale(pygame.image.load('images\\bN.png'),(100,100)),
-      12: pygame.transform.scale(pygame.image.load('images\\wB.png'),(100,100)),
-      20: pygame.transform.scale(pygame.image.load('images\\bB.png'),(100,100)),
-      13: pygame.transform.scale(pygame.image.load('images\\wR.png'),(100,100)),
-      21: pygame.transform.scale(pygame.image.load('images\\bR.png'),(100,100)),
-      14: pygame.transform.scale(pygame.image.load('images\\wQ.png'),(100,100)),
-      22: pygame.transform.scale(pygame.image.load('images\\bQ.png'),(100,100))
-    }
+# Move generation backends that can sit behind the Board interface, name: (module, class)
+BACKENDS = {
+  'list': ('engine', 'Board'),
+  'bitboard': ('bitboard', 'BitboardBoard'),
+  'attackmap': ('attackmap', 'AttackMapBoard'),
+  'mailbox': ('mailbox', 'MailboxBoard')
+}
+
+# Debug records of the move generator, see profiling.configureLogging for a JSON formatter
+# Importing logging takes longer than importing the rest of the engine, so the logger is only looked up once something
+# else has imported logging, a program that never did has no handler for the records anyway
+LOG_DEBUG = 10 # logging.DEBUG
+log = None
+
+def engineLog():
+  global log
+  if log is None and 'logging' in sys.modules:
+    log = sys.modules['logging'].getLogger('engine')
+  return log
+
+# Creates a Board in the starting position (or the given FEN) using the given backend
+# The backend module is only imported when it is asked for
+def createBoard(backend='list', fen=None):
+  if backend not in BACKENDS:
+    raise ValueError('unknown backend ' + repr(backend) + ', choose from: ' + ', '.join(BACKENDS))
+  moduleName, className = BACKENDS[backend]
+  board = getattr(importlib.import_module(moduleName), className)()
+  if fen is not None:
+    board.loadFEN(fen)
+  return board
+
+# Zobrist keys, one random 64 bit number per (piece, square) and one for black to move
+# The position hash is the xor of the keys of everything in the position so a move only has to xor a few keys in and out
+# A fixed seed keeps the hashes the same between runs so they can be stored in files
+zobristRandom = random.Random(20240101)
+# Indexed by the binary piece code then by square (row * 8 + col), the empty square (0) has all zero keys
+ZOBRIST_PIECES = []
+for piece in range(23):
+  if 1 <= piece & 7 <= 6 and piece & 24 in (8, 16):
+    ZOBRIST_PIECES.append([zobristRandom.getrandbits(64) for sq in range(64)])
+  else:
+    ZOBRIST_PIECES.append([0] * 64)
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+# One key per castling right, ZOBRIST_CASTLING is indexed by the whole rights bitmask and xors the keys of its rights
+castlingKeys = [zobristRandom.getrandbits(64) for right in range(4)]
+ZOBRIST_CASTLING = [0] * 16
+for rights in range(16):
+  for right in range(4):
+    if rights >> right & 1:
+      ZOBRIST_CASTLING[rights] ^= castlingKeys[right]
+# Indexed by the file of the en passant square
+ZOBRIST_ENPASSANT = [zobristRandom.getrandbits(64) for col in range(8)]
+del zobristRandom, piece, castlingKeys, rights, right
+
+# Castling rights, a bitmask in Board.castlingRights, in the order of the FEN letters KQkq
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+CASTLING_LETTERS = 'KQkq'
+# Rights kept when a piece moves from or to the square (row * 8 + col): moving a king or rook off its square or
+# capturing a rook on it loses the rights that need it
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[0] = 15 ^ BLACK_QUEENSIDE
+CASTLING_MASKS[4] = 15 ^ (BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[7] = 15 ^ BLACK_KINGSIDE
+CASTLING_MASKS[56] = 15 ^ WHITE_QUEENSIDE
+CASTLING_MASKS[60] = 15 ^ (WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[63] = 15 ^ WHITE_KINGSIDE
+
+# Translates the binary representation of the pieces to a string, ex: 9 -> 'wK', and the other way around
+# Module constants shared by every Board and Move, nothing is copied when a Board is cloned or sent to a worker
+BINARY_TO_PIECES = {
+  0: '--',
+  9: 'wK',
+  17: 'bK',
+  10: 'wP',
+  18: 'bP',
+  11: 'wN',
+  19: 'bN',
+  12: 'wB',
+  20: 'bB',
+  13: 'wR',
+  21: 'bR',
+  14: 'wQ',
+  22: 'bQ'
+}
+PIECES_TO_BINARY = {v: k for k, v in BINARY_TO_PIECES.items()}
+# Ranks and files of the notation to rows and columns of Board.board, row 0 is the 8th rank
+RANKS_TO_ROWS = {
+  '1': 7,
+  '2': 6,
+  '3': 5,
+  '4': 4,
+  '5': 3,
+  '6': 2,
+  '7': 1,
+  '8': 0
+}
+ROWS_TO_RANKS = {v: k for k, v in RANKS_TO_ROWS.items()}
+FILES_TO_COLS = {
+  'a': 0,
+  'b': 1,
+  'c': 2,
+  'd': 3,
+  'e': 4,
+  'f': 5,
+  'g': 6,
+  'h': 7
+}
+COLS_TO_FILES = {v: k for k, v in FILES_TO_COLS.items()}
+# Added to the moveID of a promotion to anything but a queen, indexed by the piece type promoted to
+PROMOTION_IDS = {6: 0, 5: 10000, 4: 20000, 3: 30000}
+LETTERS_TO_PROMOTIONS = {'q': 6, 'r': 5, 'b': 4, 'n': 3}
+PROMOTIONS_TO_LETTERS = {v: k for k, v in LETTERS_TO_PROMOTIONS.items()}
+
+# Piece types a pawn can promote to, the queen first
+PROMOTIONS = (6, 5, 4, 3)
+
+# Fixed size binary position, 32 bytes little endian:
+# 8 bytes   occupancy, bit row * 8 + col is set for every occupied square
+# 16 bytes  one 4 bit code per occupied square in square order, low nibble first: piece type (1-6) + 8 for black
+# 1 byte    flags, bit 0 is set when black is to move, bits 1-4 are the castling rights (Board.castlingRights << 1)
+# 1 byte    en passant file + 1 (0 when there is no en passant square), 1 byte halfmove clock (capped at 255),
+#           2 bytes fullmove number
+# 3 bytes   padding
+PACKED_POSITION = struct.Struct('<Q16sBBBH3x')
+PACKED_SIZE = PACKED_POSITION.size
+
+# Step offsets (row, col) used by the move generators
+KNIGHT_OFFSETS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+KING_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+ORTHOGONALS = [(-1, 0), (0, -1), (1, 0), (0, 1)]
+DIAGONALS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
 
 # This class is responsible for the board.
 # Generates moves
@@ -50,24 +158,6 @@ class Board:
       [10,10,10,10,10,10,10,10],
       [13,11,12,14,9,12,11,13]
     ]
-    # Translates the Binary representation of the pieces to a string
-    self.BinaryToPieces = {
-      0: '--',
-      9: 'wK',
-      17: 'bK',
-      10: 'wP',
-      18: 'bP',
-      11: 'wN',
-      19: 'bN',
-      12: 'wB',
-      20: 'bB',
-      13: 'wR',
-      21: 'bR',
-      14: 'wQ',
-      22: 'bQ'
-    }
-    # Translates the other way around
-    self.PiecesToBinary = {v: k for k,v in self.BinaryToPieces.items()}
     # Boolean flag indicating who to move
     self.whiteToMove = True
     # Keeps a list of Move objects used in undoing a move or several
@@ -80,19 +170,261 @@ class Board:
     self.inCheck = False
     self.pins = []
     self.checks = []
+    # Bitmask of WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE and BLACK_QUEENSIDE, cleared by CASTLING_MASKS
+    self.castlingRights = 15
+    # (row, col) a pawn can capture en passant on, only set when a pawn of the side to move is next to the pawn that
+    # moved two squares so positions that differ in nothing else hash the same
+    self.enpassantSquare = None
+    # Plies since the last capture or pawn move, for the 50 move rule, and the number of the full move being played
+    self.halfmoveClock = 0
+    self.fullmoveNumber = 1
+    # (castlingRights, enpassantSquare, halfmoveClock, hash) before every move of the moveLog
+    # The state a move can't be undone from is pushed by makeMove and popped by undoMove so undoing costs the same
+    # whatever the position, and the hashes are the position history used to find repetitions
+    self.stateLog = []
+    # 64 bit Zobrist hash of the position, updated in makeMove and undoMove
+    self.hash = self.computeHash()
+    # Cache of getValidMoves for the position with this hash
+    self.validMovesHash = None
+    self.validMoves = []
+    self.validMovesChecks = (False, [], [])
+    self.validMovesBySquare = None
+    self.validMoveIDs = None
    
    
+  # Creates a Board from a FEN string
+  @classmethod
+  def fromFEN(cls, fen):
+    board = cls()
+    board.loadFEN(fen)
+    return board
+
+  # Replaces the current position with the one described by the FEN string
+  # Only the piece placement is required, the missing fields default to white to move, no castling, no en passant
+  # square and move 1. Raises ValueError for a FEN that can't be read, without one king of each color or with a pawn
+  # on the first or last rank
+  def loadFEN(self, fen):
+    fields = fen.split()
+    rows = fields[0].split('/') if fields else []
+    if len(rows) != 8:
+      raise ValueError('FEN needs 8 ranks: ' + repr(fen))
+    if len(fields) > 1 and fields[1] not in ('w', 'b'):
+      raise ValueError('FEN side to move must be w or b: ' + repr(fen))
+    castling = fields[2] if len(fields) > 2 else '-'
+    castlingRights = 0
+    if castling != '-':
+      for letter in castling:
+        if letter not in CASTLING_LETTERS:
+          raise ValueError('bad FEN castling field ' + repr(castling) + ' in ' + repr(fen))
+        castlingRights |= 1 << CASTLING_LETTERS.index(letter)
+    enpassant = fields[3] if len(fields) > 3 else '-'
+    enpassantSquare = None
+    if enpassant != '-':
+      if len(enpassant) != 2 or enpassant[0] not in FILES_TO_COLS or enpassant[1] not in '36':
+        raise ValueError('bad FEN en passant square ' + repr(enpassant) + ' in ' + repr(fen))
+      enpassantSquare = (RANKS_TO_ROWS[enpassant[1]], FILES_TO_COLS[enpassant[0]])
+    try:
+      halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+      fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+    except ValueError:
+      raise ValueError('FEN move counters must be numbers: ' + repr(fen))
+    board = [[0 for i in range(8)] for j in range(8)]
+    for r in range(8):
+      f = 0
+      for symbol in rows[r]:
+        if symbol.isdigit():
+          f += int(symbol)
+        elif symbol.upper() in 'KPNBRQ' and f < 8:
+          color = 'w' if symbol.isupper() else 'b'
+          board[r][f] = PIECES_TO_BINARY[color + symbol.upper()]
+          f += 1
+        else:
+          raise ValueError('bad FEN rank ' + repr(rows[r]) + ' in ' + repr(fen))
+      if f != 8:
+        raise ValueError('FEN rank ' + repr(rows[r]) + ' does not have 8 squares in ' + repr(fen))
+    # Move generation needs both kings, without one it would generate moves of the empty square it expects it on
+    if sum(row.count(9) for row in board) != 1 or sum(row.count(17) for row in board) != 1:
+      raise ValueError('FEN needs one king of each color: ' + repr(fen))
+    if any(piece & 7 == 2 for piece in board[0] + board[7]):
+      raise ValueError('FEN has a pawn on the first or last rank: ' + repr(fen))
+    self.setPosition(board, len(fields) < 2 or fields[1] == 'w', castlingRights, enpassantSquare,
+                     max(halfmoveClock, 0), max(fullmoveNumber, 1))
+
+  # Replaces the current position with the given 8*8 board, side to move and game state, the move log is cleared
+  # Every way of loading a position ends here so backends only have to override this to rebuild their own state
+  # Castling rights without the king and rook on their squares and an en passant square no pawn can capture on are
+  # dropped, so the same position always has the same hash
+  def setPosition(self, board, whiteToMove, castlingRights=0, enpassantSquare=None, halfmoveClock=0, fullmoveNumber=1):
+    self.board = board
+    self.whiteToMove = whiteToMove
+    for r in range(8):
+      for f in range(8):
+        if board[r][f] == 9:
+          self.wKingPos = (r, f)
+        elif board[r][f] == 17:
+          self.bKingPos = (r, f)
+    for right, (row, rookCol, king) in enumerate(((7, 7, 9), (7, 0, 9), (0, 7, 17), (0, 0, 17))):
+      if board[row][4] != king or board[row][rookCol] != (king & 24) | 5:
+        castlingRights &= ~(1 << right)
+    self.castlingRights = castlingRights
+    if enpassantSquare is not None:
+      r, c = enpassantSquare
+      # The pawn that moved two squares stands behind the en passant square, seen from the side to move
+      pawnRow = r + 1 if whiteToMove else r - 1
+      ownPawn = 10 if whiteToMove else 18
+      if r != (2 if whiteToMove else 5) or board[r][c] != 0 or board[pawnRow][c] != ownPawn ^ 24 or \
+         not any(0 <= col < 8 and board[pawnRow][col] == ownPawn for col in (c - 1, c + 1)):
+        enpassantSquare = None
+    self.enpassantSquare = enpassantSquare
+    self.halfmoveClock = halfmoveClock
+    self.fullmoveNumber = fullmoveNumber
+    self.moveLog = []
+    self.stateLog = []
+    self.hash = self.computeHash()
+
+  # Packs the position into PACKED_SIZE (32) bytes, see PACKED_POSITION
+  def pack(self):
+    occupancy = 0
+    pieces = bytearray(16)
+    count = 0
+    for sq in range(64):
+      piece = self.board[sq >> 3][sq & 7]
+      if piece != 0:
+        if count == 32:
+          raise ValueError('only positions with at most 32 pieces can be packed')
+        occupancy |= 1 << sq
+        # 4 bits per piece: the type in the low 3 bits and 8 for black
+        pieces[count >> 1] |= ((piece & 7) | (8 if piece & 16 else 0)) << ((count & 1) * 4)
+        count += 1
+    flags = (0 if self.whiteToMove else 1) | self.castlingRights << 1
+    epFile = self.enpassantSquare[1] + 1 if self.enpassantSquare is not None else 0
+    return PACKED_POSITION.pack(occupancy, bytes(pieces), flags, epFile, min(self.halfmoveClock, 255),
+                                min(self.fullmoveNumber, 0xFFFF))
+
+  # Creates a Board from bytes made by pack()
+  @classmethod
+  def fromPacked(cls, data):
+    board = cls()
+    board.loadPacked(data)
+    return board
+
+  def loadPacked(self, data):
+    occupancy, pieces, flags, epFile, halfmoveClock, fullmoveNumber = PACKED_POSITION.unpack(data)
+    board = [[0 for i in range(8)] for j in range(8)]
+    count = 0
+    while occupancy:
+      low = occupancy & -occupancy
+      sq = low.bit_length() - 1
+      occupancy ^= low
+      code = (pieces[count >> 1] >> ((count & 1) * 4)) & 15
+      board[sq >> 3][sq & 7] = (code & 7) | (16 if code & 8 else 8)
+      count += 1
+    whiteToMove = not flags & 1
+    enpassantSquare = ((2 if whiteToMove else 5), epFile - 1) if 1 <= epFile <= 8 else None
+    self.setPosition(board, whiteToMove, flags >> 1 & 15, enpassantSquare, halfmoveClock, max(fullmoveNumber, 1))
+
+  # An independent Board of the same backend in the same position, for workers and speculative searches
+  # The instance dict is copied in one go and only what makeMove changes in place is copied again: the rows of the
+  # board and the two logs. The Move objects and state tuples in the logs are never changed so they are shared, and
+  # with history=False the clone starts with empty logs (it can't undo past the position or see repetitions before it)
+  def clone(self, history=True):
+    board = object.__new__(type(self))
+    board.__dict__ = self.__dict__.copy()
+    board.board = [row[:] for row in self.board]
+    board.moveLog = self.moveLog[:] if history else []
+    board.stateLog = self.stateLog[:] if history else []
+    return board
+
+  # Returns the FEN string of the position
+  def toFEN(self):
+    rows = []
+    for r in range(8):
+      row = ''
+      empty = 0
+      for f in range(8):
+        piece = self.board[r][f]
+        if piece == 0:
+          empty += 1
+          continue
+        if empty:
+          row += str(empty)
+          empty = 0
+        color, pieceType = self.getPieceData(piece)
+        row += pieceType if color == 'w' else pieceType.lower()
+      if empty:
+        row += str(empty)
+      rows.append(row)
+    castling = ''.join(letter for i, letter in enumerate(CASTLING_LETTERS) if self.castlingRights >> i & 1) or '-'
+    enpassant = '-'
+    if self.enpassantSquare is not None:
+      enpassant = COLS_TO_FILES[self.enpassantSquare[1]] + ROWS_TO_RANKS[self.enpassantSquare[0]]
+    return '{} {} {} {} {} {}'.format('/'.join(rows), 'w' if self.whiteToMove else 'b', castling, enpassant,
+                                      self.halfmoveClock, self.fullmoveNumber)
+
+  # Computes the Zobrist hash from scratch, used when a position is loaded and to verify the incremental updates
+  def computeHash(self):
+    h = (0 if self.whiteToMove else ZOBRIST_BLACK_TO_MOVE) ^ ZOBRIST_CASTLING[self.castlingRights]
+    if self.enpassantSquare is not None:
+      h ^= ZOBRIST_ENPASSANT[self.enpassantSquare[1]]
+    for r in range(8):
+      for c in range(8):
+        h ^= ZOBRIST_PIECES[self.board[r][c]][r * 8 + c]
+    return h
+
   # Returns the Color, Type of a piece ex: 'w', 'P'
   def getPieceData(self, piece):
-    data = self.BinaryToPieces[piece]
+    data = BINARY_TO_PIECES[piece]
     return data[0], data[1]
     
   # A Move is made by drawing nothing in the staring square and redrawing the piece in the target square
   def makeMove(self, move):
-    self.board[move.startRow][move.startCol] = 0 # places an empty space in the initial position of the piece to move
-    self.board[move.endRow][move.endCol] = move.pieceMoved # places the piece to move in the target square
+    board = self.board
+    # The state the move can't be undone from is kept for undoMove
+    self.stateLog.append((self.castlingRights, self.enpassantSquare, self.halfmoveClock, self.hash))
+    board[move.startRow][move.startCol] = 0 # places an empty space in the initial position of the piece to move
+    board[move.endRow][move.endCol] = move.promotion or move.pieceMoved # places the piece to move (or the piece it promotes to) in the target square
     self.moveLog.append(move) # appends the move to the move log used for undoMove()
+    # Xors the moved piece out of its start square and into its end square, the captured piece out and flips the side to move
+    start = move.startRow * 8 + move.startCol
+    end = move.endRow * 8 + move.endCol
+    h = self.hash ^ ZOBRIST_PIECES[move.pieceMoved][start] ^ ZOBRIST_PIECES[move.promotion or move.pieceMoved][end] ^ ZOBRIST_BLACK_TO_MOVE
+    if move.isEnpassant:
+      # The captured pawn is next to the start square, not on the end square
+      board[move.startRow][move.endCol] = 0
+      h ^= ZOBRIST_PIECES[move.pieceCaptured][move.startRow * 8 + move.endCol]
+    else:
+      h ^= ZOBRIST_PIECES[move.pieceCaptured][end]
+    if move.isCastle:
+      # The rook jumps over the king: h1 to f1, a1 to d1 and the same on the 8th rank
+      rook = board[move.endRow][7 if move.endCol == 6 else 0]
+      rookStart, rookEnd = (7, 5) if move.endCol == 6 else (0, 3)
+      board[move.endRow][rookStart] = 0
+      board[move.endRow][rookEnd] = rook
+      h ^= ZOBRIST_PIECES[rook][move.endRow * 8 + rookStart] ^ ZOBRIST_PIECES[rook][move.endRow * 8 + rookEnd]
+    rights = self.castlingRights & CASTLING_MASKS[start] & CASTLING_MASKS[end]
+    if rights != self.castlingRights:
+      h ^= ZOBRIST_CASTLING[self.castlingRights] ^ ZOBRIST_CASTLING[rights]
+      self.castlingRights = rights
+    if self.enpassantSquare is not None:
+      h ^= ZOBRIST_ENPASSANT[self.enpassantSquare[1]]
+      self.enpassantSquare = None
+    if move.pieceMoved & 7 == 2:
+      self.halfmoveClock = 0
+      # A pawn that moved two squares can be taken en passant when an enemy pawn stands next to it
+      if abs(move.endRow - move.startRow) == 2:
+        row = board[move.endRow]
+        enemyPawn = move.pieceMoved ^ 24
+        if (move.endCol > 0 and row[move.endCol - 1] == enemyPawn) or (move.endCol < 7 and row[move.endCol + 1] == enemyPawn):
+          self.enpassantSquare = ((move.startRow + move.endRow) >> 1, move.endCol)
+          h ^= ZOBRIST_ENPASSANT[move.endCol]
+    elif move.pieceCaptured:
+      self.halfmoveClock = 0
+    else:
+      self.halfmoveClock += 1
+    if not self.whiteToMove:
+      self.fullmoveNumber += 1
     self.whiteToMove = not self.whiteToMove # switches the turn
+    self.hash = h
     # Update Kings location
     if move.pieceMoved == 9:
       self.wKingPos = (move.endRow, move.endCol)
@@ -100,21 +432,52 @@ class Board:
       self.bKingPos = (move.endRow, move.endCol)
       
   # A Move is undone by drawing whatever was on the target square and return the piece to the starting square
+  # Undoing with an empty move log does nothing
   def undoMove(self):
-    try:
-      undo = self.moveLog[-1] # Gets last item in moveLog
-      self.board[undo.startRow][undo.startCol] = undo.pieceMoved # redraws the piece moved in its initial position
-      self.board[undo.endRow][undo.endCol] = undo.pieceCaptured # redraws the piece captured in its initial position
-      self.moveLog.pop() # removes the last move after its undone
-      self.whiteToMove = not self.whiteToMove # switches the turn
-      # Update Kings location
-      if undo.pieceMoved == 9:
-        self.wKingPos = (undo.endRow, undo.endCol)
-      elif undo.pieceMoved == 17:
-        self.bKingPos = (undo.endRow, undo.endCol)  
-    except:
-      return  
-  
+    if not self.moveLog:
+      return
+    undo = self.moveLog.pop() # Gets and removes the last item in moveLog
+    board = self.board
+    board[undo.startRow][undo.startCol] = undo.pieceMoved # redraws the piece moved in its initial position
+    if undo.isEnpassant:
+      board[undo.endRow][undo.endCol] = 0
+      board[undo.startRow][undo.endCol] = undo.pieceCaptured
+    else:
+      board[undo.endRow][undo.endCol] = undo.pieceCaptured # redraws the piece captured in its initial position
+    if undo.isCastle:
+      rookStart, rookEnd = (7, 5) if undo.endCol == 6 else (0, 3)
+      board[undo.endRow][rookStart] = board[undo.endRow][rookEnd]
+      board[undo.endRow][rookEnd] = 0
+    self.whiteToMove = not self.whiteToMove # switches the turn
+    if not self.whiteToMove:
+      self.fullmoveNumber -= 1
+    # The hash and the rest of the state come back from the state log instead of being worked out again
+    self.castlingRights, self.enpassantSquare, self.halfmoveClock, self.hash = self.stateLog.pop()
+    # Update Kings location
+    if undo.pieceMoved == 9:
+      self.wKingPos = (undo.startRow, undo.startCol)
+    elif undo.pieceMoved == 17:
+      self.bKingPos = (undo.startRow, undo.startCol)
+
+  # How many times the current position has been on the board, this time included
+  # Only the positions since the last capture or pawn move, with the same side to move, can be the same
+  def repetitionCount(self):
+    count = 1
+    stateLog = self.stateLog
+    h = self.hash
+    last = len(stateLog)
+    for i in range(last - 2, max(last - self.halfmoveClock, 0) - 1, -2):
+      if stateLog[i][3] == h:
+        count += 1
+    return count
+
+  def isThreefoldRepetition(self):
+    return self.repetitionCount() >= 3
+
+  # 50 moves by each side without a capture or a pawn move
+  def isFiftyMoveDraw(self):
+    return self.halfmoveClock >= 100
+
   # This generates all possible moves in a given board without concerning checks
   def generateAllMoves(self):
     moves = []
@@ -134,6 +497,9 @@ class Board:
     return moves 
 
   def generatePawnMoves(self, r, f, color, moves):
+    # Pawns never stand on the last rank, they promote when they get there
+    if (color == 'w' and r == 0) or (color == 'b' and r == 7):
+      return
     # Checks to see which color is the pawn
     if color == 'w':
       # White pawns start on row 6 on the board
@@ -141,25 +507,27 @@ class Board:
       if r == 6 and (self.board[r - 2][f] == 0) and (self.board[r - 1][f] == 0):
         moves.append(Move((r, f), (r - 2, f), self))
       # Checks the square infront of the pawn to move
-      try:
-        if self.board[r - 1][f] == 0:
-          moves.append(Move((r, f), (r - 1, f), self))
-      except:
-        pass
+      if self.board[r - 1][f] == 0:
+        self.addPawnMove((r, f), (r - 1, f), moves)
         
     elif color == 'b':
       # Black pawns start on row 1 on the board
       # checks to see if 2 squares ahead are available for a move
       if r == 1 and (self.board[r + 2][f] == 0) and (self.board[r + 1][f] == 0):
         moves.append(Move((r, f), (r + 2, f), self))
-      try:  
-        # Checks the square infront of the pawn to move
-        if self.board[r + 1][f] == 0:
-          moves.append(Move((r, f), (r + 1, f), self))
-      except:
-        pass      
+      # Checks the square infront of the pawn to move
+      if self.board[r + 1][f] == 0:
+        self.addPawnMove((r, f), (r + 1, f), moves)
     
     self.lookForCaptures(r, f, color, moves)
+
+  # A pawn move to the last rank is one move per piece the pawn can promote to
+  def addPawnMove(self, startSQ, targetSQ, moves):
+    if targetSQ[0] == 0 or targetSQ[0] == 7:
+      for promotion in PROMOTIONS:
+        moves.append(Move(startSQ, targetSQ, self, promotion))
+    else:
+      moves.append(Move(startSQ, targetSQ, self))
     
   def generateKnightMoves(self, r, f, moves):
     targets = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)] # the 8 squares a knight can go to
@@ -173,7 +541,7 @@ class Board:
         targetPiece = self.board[targetRow][targetCol]
         if targetPiece == 0: # Empty Space
           moves.append(Move((r, f), (targetRow, targetCol), self)) # Adds the move to the possible moves
-        elif self.BinaryToPieces[targetPiece][0] == opponentColor: # Checks if the piece is an enemy piece
+        elif BINARY_TO_PIECES[targetPiece][0] == opponentColor: # Checks if the piece is an enemy piece
           moves.append(Move((r, f), (targetRow, targetCol), self)) # Adds the move to the possible moves
           pass 
         else: # Friendly piece
@@ -196,7 +564,7 @@ class Board:
           targetPiece = self.board[targetRow][targetCol]
           if targetPiece == 0: # Empty Space
             moves.append(Move((r, f), (targetRow, targetCol), self)) # Adds the move to the possible moves
-          elif self.BinaryToPieces[targetPiece][0] == opponentColor: # Checks if the piece is an enemy piece
+          elif BINARY_TO_PIECES[targetPiece][0] == opponentColor: # Checks if the piece is an enemy piece
             moves.append(Move((r, f), (targetRow, targetCol), self)) # Adds the move to the possible moves
             break # No need to look beyond a piece
           else: # Friendly piece
@@ -218,7 +586,7 @@ class Board:
           targetPiece = self.board[targetRow][targetCol]
           if targetPiece == 0: # Empty Space
             moves.append(Move((r, f), (targetRow, targetCol), self)) # Adds the move to the possible moves
-          elif self.BinaryToPieces[targetPiece][0] == opponentColor: # Checks if the piece is an enemy piece
+          elif BINARY_TO_PIECES[targetPiece][0] == opponentColor: # Checks if the piece is an enemy piece
             moves.append(Move((r, f), (targetRow, targetCol), self)) # Adds the move to the possible moves
             break # No need to look beyond a piece
           else: # Friendly piece
@@ -226,26 +594,75 @@ class Board:
         else: # The square is off the board
           break
   
-  def generateKingMoves(self, r, f, moves):
-    directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, -1)] # 8 squares around a king
-    opponentColor = 'b' if self.whiteToMove else 'w'
+  # attacked is the enemyAttacks() bitmask, computed once per position by generateValidMoves
+  def generateKingMoves(self, r, f, moves, attacked=None):
+    if attacked is None:
+      attacked = self.enemyAttacks()
+    ownColor = 8 if self.whiteToMove else 16
     
-    for d in directions:
+    for d in KING_OFFSETS: # 8 squares around a king
       # adds the all possible squares in a direction
       targetRow = r + d[0] 
       targetCol = f + d[1]
       if 0 <= targetRow < 8 and 0 <= targetCol < 8: # makes sure the square is on the board
         piece = self.board[targetRow][targetCol]
-        pieceColor, pieceType = self.getPieceData(piece)
-        
-        if not self.isAttacked(targetRow, targetCol):
-          if piece == 0:
-            moves.append(Move((r, f), (targetRow, targetCol), self))
-          elif pieceColor == opponentColor:
-            moves.append(Move((r, f), (targetRow, targetCol), self))
+        # Empty or enemy squares the opponent does not attack
+        if piece & ownColor == 0 and not attacked >> (targetRow * 8 + targetCol) & 1:
+          moves.append(Move((r, f), (targetRow, targetCol), self))
+    rights = self.castlingRights & (WHITE_KINGSIDE | WHITE_QUEENSIDE if self.whiteToMove else BLACK_KINGSIDE | BLACK_QUEENSIDE)
+    if rights and not attacked >> (r * 8 + f) & 1:
+      self.generateCastleMoves(r, f, rights, moves, attacked)
 
-      else: # The square is off the board
-        pass
+  # Castling needs the squares between the king and the rook empty, and the king can't be in check, pass through
+  # an attacked square or land on one
+  # The rights are only kept while the king and the rook are on their squares so those don't have to be checked
+  def generateCastleMoves(self, r, f, rights, moves, attacked):
+    row = self.board[r]
+    if rights & (WHITE_KINGSIDE | BLACK_KINGSIDE) and row[5] == 0 and row[6] == 0 and \
+       not attacked >> (r * 8 + 5) & 1 and not attacked >> (r * 8 + 6) & 1:
+      moves.append(Move((r, f), (r, 6), self))
+    if rights & (WHITE_QUEENSIDE | BLACK_QUEENSIDE) and row[1] == 0 and row[2] == 0 and row[3] == 0 and \
+       not attacked >> (r * 8 + 3) & 1 and not attacked >> (r * 8 + 2) & 1:
+      moves.append(Move((r, f), (r, 2), self))
+
+  # Bitmask (bit row * 8 + col) of every square the side not to move attacks
+  # Our own king is taken off the board while looking so the squares behind it on a checking ray count as attacked
+  def enemyAttacks(self):
+    kingR, kingC = self.wKingPos if self.whiteToMove else self.bKingPos
+    board = self.board
+    king = board[kingR][kingC]
+    board[kingR][kingC] = 0
+    enemyColor = 16 if self.whiteToMove else 8
+    attacks = 0
+    for r in range(8):
+      for c in range(8):
+        piece = board[r][c]
+        if piece & enemyColor == 0:
+          continue
+        pieceType = piece & 7
+        if pieceType == 2: # Pawn, white pawns attack up the board (row - 1) and black pawns down
+          targetRow = r - 1 if enemyColor == 8 else r + 1
+          if 0 <= targetRow < 8:
+            if c > 0:
+              attacks |= 1 << (targetRow * 8 + c - 1)
+            if c < 7:
+              attacks |= 1 << (targetRow * 8 + c + 1)
+        elif pieceType == 3 or pieceType == 1: # Knight or King, single steps
+          for dr, dc in (KNIGHT_OFFSETS if pieceType == 3 else KING_OFFSETS):
+            if 0 <= r + dr < 8 and 0 <= c + dc < 8:
+              attacks |= 1 << ((r + dr) * 8 + c + dc)
+        else: # Sliders, the ray includes the first piece it runs into
+          for dr, dc in (DIAGONALS if pieceType == 4 else ORTHOGONALS if pieceType == 5 else KING_OFFSETS):
+            targetRow = r + dr
+            targetCol = c + dc
+            while 0 <= targetRow < 8 and 0 <= targetCol < 8:
+              attacks |= 1 << (targetRow * 8 + targetCol)
+              if board[targetRow][targetCol] != 0:
+                break
+              targetRow += dr
+              targetCol += dc
+    board[kingR][kingC] = king
+    return attacks
       
   def lookForCaptures(self, r, f, color, moves):
     # Pawn Captures
@@ -253,36 +670,38 @@ class Board:
       # Checks if the pawn is on any edge 
       if f == 0:
         if self.board[r - 1][f + 1] > 16:
-          moves.append(Move((r, f), (r - 1, f + 1), self))
+          self.addPawnMove((r, f), (r - 1, f + 1), moves)
       elif f == 7:
         if self.board[r - 1][f - 1] > 16:
-          moves.append(Move((r, f), (r - 1, f - 1), self))
+          self.addPawnMove((r, f), (r - 1, f - 1), moves)
       else:
         # looks at both diagonal squares for captures
         if self.board[r - 1][f + 1] > 16:
-          moves.append(Move((r, f), (r - 1, f + 1), self))
+          self.addPawnMove((r, f), (r - 1, f + 1), moves)
         if self.board[r - 1][f - 1] > 16:
-          moves.append(Move((r, f), (r - 1, f - 1), self))
+          self.addPawnMove((r, f), (r - 1, f - 1), moves)
+      forward = -1
             
     elif color == 'b':
-        if r == 0:
-          pass
         # Checks if the pawn is on any edge
-        elif f == 0:
+        if f == 0:
           if self.board[r + 1][f + 1] < 16 and self.board[r + 1][f + 1] != 0:
-            moves.append(Move((r, f), (r + 1, f + 1), self))
+            self.addPawnMove((r, f), (r + 1, f + 1), moves)
         elif f == 7:
           if self.board[r + 1][f - 1] < 16 and self.board[r + 1][f - 1] != 0:
-            moves.append(Move((r, f), (r + 1, f - 1), self))
+            self.addPawnMove((r, f), (r + 1, f - 1), moves)
         else: 
-          try:
-            # looks at both diagonal squares for captures
-            if self.board[r + 1][f + 1] < 16 and self.board[r + 1][f + 1] != 0:
-              moves.append(Move((r, f), (r + 1, f + 1), self))
-            if self.board[r + 1][f - 1] < 16 and self.board[r + 1][f - 1] != 0:
-              moves.append(Move((r, f), (r + 1, f - 1), self))
-          except:
-            pass
+          # looks at both diagonal squares for captures
+          if self.board[r + 1][f + 1] < 16 and self.board[r + 1][f + 1] != 0:
+            self.addPawnMove((r, f), (r + 1, f + 1), moves)
+          if self.board[r + 1][f - 1] < 16 and self.board[r + 1][f - 1] != 0:
+            self.addPawnMove((r, f), (r + 1, f - 1), moves)
+        forward = 1
+
+    # En passant, the square behind the pawn that just moved two squares
+    ep = self.enpassantSquare
+    if ep is not None and ep[0] == r + forward and (ep[1] == f - 1 or ep[1] == f + 1):
+      moves.append(Move((r, f), ep, self))
   
   def generatePieceMoves(self, r, f, pieceColor, pieceType, moves):
     if pieceType == 'P':
@@ -298,9 +717,63 @@ class Board:
       
     return []
 
+  # Returns the legal moves of the current position
+  # The list is cached for the last position it was generated for, keyed by the Zobrist hash, so asking
+  # again before the position changes (or after making and undoing moves back to it) costs nothing
+  # The returned list is shared with the cache and must not be modified
   def getValidMoves(self):
+    if self.validMovesHash == self.hash:
+      self.inCheck, self.pins, self.checks = self.validMovesChecks
+      return self.validMoves
+    moves = self.generateValidMoves()
+    self.validMovesHash = self.hash
+    self.validMoves = moves
+    self.validMovesChecks = (self.inCheck, self.pins, self.checks)
+    # The lookups by square and by id are only built when they are asked for
+    self.validMovesBySquare = None
+    self.validMoveIDs = None
+    return moves
+
+  # Legal moves of the piece on (r, c) in the current position
+  def legalMovesFrom(self, r, c):
+    self.getValidMoves()
+    if self.validMovesBySquare is None:
+      bySquare = {}
+      for move in self.validMoves:
+        bySquare.setdefault((move.startRow, move.startCol), []).append(move)
+      self.validMovesBySquare = bySquare
+    return self.validMovesBySquare.get((r, c), [])
+
+  # Is the move legal in the current position, a set lookup instead of scanning the move list
+  def isLegal(self, move):
+    self.getValidMoves()
+    if self.validMoveIDs is None:
+      self.validMoveIDs = {move.moveID for move in self.validMoves}
+    return move.moveID in self.validMoveIDs
+
+  # Finds the legal move written in long algebraic notation (ex: e2e4, e7e8q), None if it is not legal or can't be read
+  # A promotion without the piece letter promotes to a queen
+  def findMove(self, text):
+    if len(text) not in (4, 5) or text[0] not in FILES_TO_COLS or text[2] not in FILES_TO_COLS or \
+       text[1] not in RANKS_TO_ROWS or text[3] not in RANKS_TO_ROWS:
+      return None
+    promotion = 6
+    if len(text) == 5:
+      if text[4].lower() not in LETTERS_TO_PROMOTIONS:
+        return None
+      promotion = LETTERS_TO_PROMOTIONS[text[4].lower()]
+    endRow, endCol = RANKS_TO_ROWS[text[3]], FILES_TO_COLS[text[2]]
+    for move in self.legalMovesFrom(RANKS_TO_ROWS[text[1]], FILES_TO_COLS[text[0]]):
+      if move.endRow == endRow and move.endCol == endCol:
+        if move.promotion == 0:
+          return move if len(text) == 4 else None
+        if move.promotion & 7 == promotion:
+          return move
+    return None
+
+  # Generates the legal moves without looking at the cache
+  def generateValidMoves(self):
     self.inCheck, self.pins, self.checks = self.lookForChecksPins()
-    print(self.inCheck, self.pins, self.checks)
     if self.whiteToMove:
       kingR = self.wKingPos[0]
       kingC = self.wKingPos[1]
@@ -308,39 +781,59 @@ class Board:
       kingR = self.bKingPos[0]
       kingC = self.bKingPos[1]
     
-    if self.inCheck:
-      if len(self.checks) == 1:
-        moves = self.generateAllMoves()
-        check = self.checks[0]
-        checkR = check[0]
-        checkC = check[1]
-        checkPiece = self.board[checkR][checkC]
-        checkPieceColor, checkPieceType = self.getPieceData(checkPiece)
-        validSquares = []
-        
-        if checkPieceType == 'N':
-          validSquares = [(checkR, checkC)]
+    if len(self.checks) > 1:
+      # Double check, only the king can move
+      moves = []
+    else:
+      moves = self.generateAllMoves()
+      # Pinned pieces may only move along the line through the king and the pinning piece
+      pinned = {(pin[0], pin[1]): (pin[2], pin[3]) for pin in self.pins}
+      # In check a move has to capture the checking piece or block its ray
+      validSquares = None
+      if self.inCheck:
+        checkR, checkC, dr, dc = self.checks[0]
+        if self.board[checkR][checkC] & 7 == 3: # A knight check can't be blocked
+          validSquares = {(checkR, checkC)}
         else:
+          validSquares = set()
           for i in range(1, 8):
-            validSquare = (kingR + check[2] * i, kingC + check[3] * i)
-            validSquares.append(validSquare)
-            if validSquare[0] == checkR and validSquare[1] == checkC:
+            validSquares.add((kingR + dr * i, kingC + dc * i))
+            if kingR + dr * i == checkR and kingC + dc * i == checkC:
               break
-        
-        for i in range(len(moves) - 1, -1, -1):
-          if moves[i].pieceMoved != 9 or moves[i].pieceMoved != 17:
-            if not (moves[i].endRow, moves[i].endCol) in validSquares:
-              moves.remove(moves[i])
-        self.generateKingMoves(kingR, kingC, moves)
-      else:
-        moves = []
-        self.generateKingMoves(kingR, kingC, moves)
-    else:
-      moves = self.generateAllMoves()
-      self.generateKingMoves(kingR, kingC, moves)
-    
+      if pinned or validSquares is not None:
+        # En passant takes a pawn that is not on the end square, those are tried on the board below instead
+        moves = [move for move in moves if move.isEnpassant or self.isAllowed(move, pinned, validSquares)]
+      if self.enpassantSquare is not None:
+        moves = [move for move in moves if not move.isEnpassant or self.isEnpassantLegal(move)]
+    # The king's targets are checked against the enemy attacks, computed once for the position
+    self.generateKingMoves(kingR, kingC, moves, self.enemyAttacks())
+    log = engineLog()
+    if log is not None and log.isEnabledFor(LOG_DEBUG):
+      log.debug('valid moves', extra={'fen': self.toFEN(), 'inCheck': self.inCheck, 'pins': self.pins,
+                                      'checks': self.checks, 'moves': len(moves)})
     return moves
 
+  # En passant takes two pawns off the same row, which can uncover an attack on the king that the pins don't show
+  # (king and enemy rook on that row), so the move is made and the king is looked at
+  def isEnpassantLegal(self, move):
+    self.makeMove(move)
+    self.whiteToMove = not self.whiteToMove
+    kingR, kingC = self.wKingPos if self.whiteToMove else self.bKingPos
+    attacked = self.isAttacked(kingR, kingC)
+    self.whiteToMove = not self.whiteToMove
+    self.undoMove()
+    return not attacked
+
+  # Is a non king move allowed by the pins and the check restrictions of the position
+  def isAllowed(self, move, pinned, validSquares):
+    if validSquares is not None and (move.endRow, move.endCol) not in validSquares:
+      return False
+    pin = pinned.get((move.startRow, move.startCol))
+    if pin is not None:
+      # The move has to be parallel to the pin direction to stay on the pin line
+      return (move.endRow - move.startRow) * pin[1] == (move.endCol - move.startCol) * pin[0]
+    return True
+
   def lookForChecksPins(self):
     pins = []
     checks = []
@@ -388,6 +881,7 @@ class Board:
                     break
                 else:
                   pins.append(maybePinned)
+                  break
               else:
                 break
         else:
@@ -443,66 +937,102 @@ class Board:
         else:
           break
   
-      knightDirections = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+    # Once for the square, after every ray was looked at
+    knightDirections = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+    
+    for n in knightDirections:
+      endRow = r + n[0]
+      endCol = c + n[1]
       
-      for n in knightDirections:
-        endRow = r + n[0]
-        endCol = c + n[1]
+      if 0 <= endRow < 8 and 0 <= endCol < 8:
+        piece = self.board[endRow][endCol]
+        pieceColor, pieceType = self.getPieceData(piece)
         
-        if 0 <= endRow < 8 and 0 <= endCol < 8:
-          piece = self.board[endRow][endCol]
-          pieceColor, pieceType = self.getPieceData(piece)
-          
-          if pieceType == 'N' and pieceColor == opponentColor:
-            return True
+        if pieceType == 'N' and pieceColor == opponentColor:
+          return True
           
     return False
 
-class Move(Board):
-  RanksToRows = {
-    '1': 7,
-    '2': 6,
-    '3': 5,
-    '4': 4,
-    '5': 3,
-    '6': 2,
-    '7': 1,
-    '8': 0
-  }
-  RowsToRanks = {v: k for k,v in RanksToRows.items()}
-  FilesToCols = {
-    'a': 0,
-    'b': 1,
-    'c': 2,
-    'd': 3,
-    'e': 4,
-    'f': 5,
-    'g': 6,
-    'h': 7
-  }
-  ColsToFiles = {v: k for k, v in FilesToCols.items()}
-  
-  def __init__(self, startSQ, targetSQ, board):
-    super().__init__()
-    self.startRow = startSQ[0]
-    self.startCol = startSQ[1]
-    self.endRow = targetSQ[0]
-    self.endCol = targetSQ[1] 
-    self.boardSnapshot = board.board
+# A Move only keeps the two squares and the pieces involved.
+# It used to subclass Board, which built a whole new board for every generated move,
+# __slots__ keeps each instance small and avoids a per-instance __dict__
+# Castling (the king moving two squares), en passant and promotion are worked out from the board when the move is made
+class Move:
+  __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured', 'moveID', 'promotion',
+               'isEnpassant', 'isCastle')
+
+  # promotion is the piece type (Q, R, B or N) a pawn reaching the last rank becomes
+  def __init__(self, startSQ, targetSQ, board, promotion=6):
+    self.startRow, self.startCol = startSQ
+    self.endRow, self.endCol = targetSQ
     
-    # unique ID from 0 - 7777
+    # unique ID from 0 - 7777, promotions to a rook, bishop or knight go up to 37777
     self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
     
-    self.pieceMoved = self.boardSnapshot[self.startRow][self.startCol] 
-    self.pieceCaptured = self.boardSnapshot[self.endRow][self.endCol]
+    self.pieceMoved = board.board[self.startRow][self.startCol] 
+    self.pieceCaptured = board.board[self.endRow][self.endCol]
+    # The piece code put on the end square when a pawn promotes, 0 otherwise
+    self.promotion = 0
+    self.isEnpassant = False
+    self.isCastle = False
+    pieceType = self.pieceMoved & 7
+    if pieceType == 2:
+      if self.endRow == 0 or self.endRow == 7:
+        self.promotion = (self.pieceMoved & 24) | promotion
+        self.moveID += PROMOTION_IDS[promotion]
+      elif self.startCol != self.endCol and self.pieceCaptured == 0:
+        # A pawn moving diagonally to an empty square takes the enemy pawn next to it
+        self.isEnpassant = True
+        self.pieceCaptured = self.pieceMoved ^ 24
+    elif pieceType == 1 and (self.endCol - self.startCol == 2 or self.startCol - self.endCol == 2):
+      self.isCastle = True
   
   def __eq__(self, other):
     if isinstance(other,Move):
       return self.moveID == other.moveID
     return False
-      
   
-  def getChessNotation(self):
-    piece = self.BinaryToPieces[self.pieceMoved][1]
-    endSQ = self.ColsToFiles[self.endCol] + self.RowsToRanks[self.endRow] 
-    return piece + endSQ
\ No newline at end of file
+  # Moves are equal by moveID so they hash by it too, this lets them be used in sets and dicts
+  def __hash__(self):
+    return self.moveID
+  
+  def __repr__(self):
+    return 'Move(' + self.getChessNotation() + ')'
+  
+  # Without a board: the piece and the target square, ex: Pe4
+  # With the board the move is about to be played on: standard algebraic notation (SAN) with captures, the file and / or
+  # rank needed to tell apart pieces of the same type that can reach the same square and + or # for check and mate
+  def getChessNotation(self, board=None):
+    piece = BINARY_TO_PIECES[self.pieceMoved][1]
+    endSQ = COLS_TO_FILES[self.endCol] + ROWS_TO_RANKS[self.endRow] 
+    if board is None:
+      return piece + endSQ
+    capture = 'x' if self.pieceCaptured != 0 else ''
+    if self.isCastle:
+      san = 'O-O' if self.endCol == 6 else 'O-O-O'
+    elif piece == 'P':
+      san = (COLS_TO_FILES[self.startCol] + capture if capture else '') + endSQ
+      if self.promotion:
+        san += '=' + BINARY_TO_PIECES[self.promotion][1]
+    else:
+      sameFile = sameRank = ambiguous = False
+      for other in board.getValidMoves():
+        if other.pieceMoved == self.pieceMoved and other.endRow == self.endRow and other.endCol == self.endCol and \
+           other.moveID != self.moveID:
+          ambiguous = True
+          sameFile = sameFile or other.startCol == self.startCol
+          sameRank = sameRank or other.startRow == self.startRow
+      origin = ''
+      if ambiguous:
+        if not sameFile:
+          origin = COLS_TO_FILES[self.startCol]
+        elif not sameRank:
+          origin = ROWS_TO_RANKS[self.startRow]
+        else:
+          origin = COLS_TO_FILES[self.startCol] + ROWS_TO_RANKS[self.startRow]
+      san = piece + origin + capture + endSQ
+    board.makeMove(self)
+    if board.lookForChecksPins()[0]:
+      san += '+' if board.getValidMoves() else '#'
+    board.undoMove()
+    return san
@@ -0,0 +1,174 @@
+# Evaluation of whole batches of positions at once with NumPy
+# A batch is an (N, 64) int8 array of piece codes (index row * 8 + col, like Board.board flattened) and an (N,)
+# bool array of the side to move. Material, piece square tables and mobility are computed for every position of
+# the batch with array operations instead of one Python loop per position
+# evaluate(board) is the same evaluation for one Board in plain Python and gives the same scores
+# Material and piece square tables are the ones of search.evaluate, mobility adds MOBILITY_WEIGHTS centipawns per
+# square a knight, bishop, rook or queen can move to (empty or enemy, sliders stop at the first piece)
+# Usage: python evaluation.py [COUNT]   compares positions per second of the scalar and the batched evaluation
+import random
+import sys
+import time
+import numpy as np
+from engine import DIAGONALS, KNIGHT_OFFSETS, ORTHOGONALS, createBoard
+from search import PIECE_TABLES, PIECE_VALUES
+
+# Centipawns per reachable square indexed by the piece type: -, King, Pawn, Knight, Bishop, Rook, Queen
+MOBILITY_WEIGHTS = [0, 0, 0, 4, 3, 2, 1]
+
+# Material plus piece square value of every piece code on every square, negative for black
+def buildPieceSquareValues():
+  values = np.zeros((23, 64), dtype=np.int32)
+  for pieceType in range(1, 7):
+    for sq in range(64):
+      r, c = divmod(sq, 8)
+      values[8 | pieceType, sq] = PIECE_VALUES[pieceType] + PIECE_TABLES[pieceType][sq]
+      values[16 | pieceType, sq] = -(PIECE_VALUES[pieceType] + PIECE_TABLES[pieceType][(7 - r) * 8 + c])
+  return values
+
+PIECE_SQUARE_VALUES = buildPieceSquareValues()
+
+# The square at each step of the rays from every square, 64 (a square that is always occupied) once a ray leaves
+# the board, indexed [sq, direction, step - 1]
+def buildSteps(directions, length):
+  steps = np.full((64, len(directions), length), 64, dtype=np.intp)
+  for sq in range(64):
+    r, c = divmod(sq, 8)
+    for d, (dr, dc) in enumerate(directions):
+      for step in range(1, length + 1):
+        if not (0 <= r + dr * step < 8 and 0 <= c + dc * step < 8):
+          break
+        steps[sq, d, step - 1] = (r + dr * step) * 8 + c + dc * step
+  return steps
+
+KNIGHT_STEPS = buildSteps(KNIGHT_OFFSETS, 1)
+DIAGONAL_STEPS = buildSteps(DIAGONALS, 7)
+ORTHOGONAL_STEPS = buildSteps(ORTHOGONALS, 7)
+
+# Weight of the knight, diagonal and orthogonal mobility of every piece code, negative for black
+KNIGHT_WEIGHTS = np.zeros(23, dtype=np.int32)
+DIAGONAL_WEIGHTS = np.zeros(23, dtype=np.int32)
+ORTHOGONAL_WEIGHTS = np.zeros(23, dtype=np.int32)
+for color, sign in ((8, 1), (16, -1)):
+  KNIGHT_WEIGHTS[color | 3] = sign * MOBILITY_WEIGHTS[3]
+  DIAGONAL_WEIGHTS[color | 4] = sign * MOBILITY_WEIGHTS[4]
+  DIAGONAL_WEIGHTS[color | 6] = sign * MOBILITY_WEIGHTS[6]
+  ORTHOGONAL_WEIGHTS[color | 5] = sign * MOBILITY_WEIGHTS[5]
+  ORTHOGONAL_WEIGHTS[color | 6] = sign * MOBILITY_WEIGHTS[6]
+
+# The board as a flat int8 array of 64 piece codes
+# The piece codes fit in a byte so the rows are joined as bytes, which is faster than np.array on nested lists
+def toArray(board):
+  return np.frombuffer(b''.join([bytes(row) for row in board.board]), dtype=np.int8)
+
+# (squares, whiteToMove) arrays of a sequence of boards
+def toBatch(boards):
+  boards = list(boards)
+  squares = np.frombuffer(b''.join([bytes(row) for board in boards for row in board.board]), dtype=np.int8)
+  return squares.reshape(len(boards), 64), np.array([board.whiteToMove for board in boards], dtype=bool)
+
+# Squares reached by the pieces at (positions, squares) along the steps, one count per piece
+# colors is the flattened (N, 65) array of piece colors (8 or 16, 0 for empty) where column 64 is both colors
+def reachedSquares(positions, squares, pieceColors, steps, colors):
+  targets = colors[positions[:, None, None] * 65 + steps[squares]]
+  # A step is reached when no earlier step of its ray is occupied, and counts when it isn't our own piece
+  reached = np.ones(targets.shape, dtype=bool)
+  reached[:, :, 1:] = ~np.logical_or.accumulate(targets != 0, axis=2)[:, :, :-1]
+  return (reached & (targets & pieceColors[:, None, None] == 0)).sum(axis=(1, 2))
+
+# Scores of a batch in centipawns from the point of view of the side to move, (N,) int32
+def evaluateBatch(squares, whiteToMove):
+  squares = np.asarray(squares, dtype=np.int8)
+  count = squares.shape[0]
+  codes = squares.astype(np.intp)
+  scores = PIECE_SQUARE_VALUES[codes, np.arange(64)].sum(axis=1)
+
+  colors = np.concatenate([squares & 24, np.full((count, 1), 24, dtype=np.int8)], axis=1).ravel()
+  # Mobility is only computed for the squares holding a piece that moves along the steps
+  for steps, weights in ((KNIGHT_STEPS, KNIGHT_WEIGHTS), (DIAGONAL_STEPS, DIAGONAL_WEIGHTS), (ORTHOGONAL_STEPS, ORTHOGONAL_WEIGHTS)):
+    pieceWeights = weights[codes]
+    positions, pieceSquares = np.nonzero(pieceWeights)
+    if len(positions) == 0:
+      continue
+    reached = reachedSquares(positions, pieceSquares, squares[positions, pieceSquares] & 24, steps, colors)
+    scores += np.bincount(positions, pieceWeights[positions, pieceSquares] * reached, count).astype(scores.dtype)
+  return np.where(whiteToMove, scores, -scores).astype(np.int32)
+
+# The same evaluation for one board, one square at a time
+def evaluate(board):
+  score = 0
+  for r in range(8):
+    row = board.board[r]
+    for c in range(8):
+      piece = row[c]
+      if piece == 0:
+        continue
+      pieceType = piece & 7
+      sign = 1 if piece & 8 else -1
+      score += sign * (PIECE_VALUES[pieceType] + PIECE_TABLES[pieceType][(r if sign > 0 else 7 - r) * 8 + c])
+      if MOBILITY_WEIGHTS[pieceType]:
+        score += sign * MOBILITY_WEIGHTS[pieceType] * mobility(board.board, r, c, piece)
+  return score if board.whiteToMove else -score
+
+# Squares the knight, bishop, rook or queen on (r, c) can move to, ignoring pins and checks
+def mobility(board, r, c, piece):
+  ownColor = piece & 24
+  pieceType = piece & 7
+  count = 0
+  if pieceType == 3:
+    for dr, dc in KNIGHT_OFFSETS:
+      if 0 <= r + dr < 8 and 0 <= c + dc < 8 and board[r + dr][c + dc] & ownColor == 0:
+        count += 1
+    return count
+  directions = (DIAGONALS if pieceType == 4 else ORTHOGONALS if pieceType == 5 else DIAGONALS + ORTHOGONALS)
+  for dr, dc in directions:
+    targetRow = r + dr
+    targetCol = c + dc
+    while 0 <= targetRow < 8 and 0 <= targetCol < 8:
+      target = board[targetRow][targetCol]
+      if target & ownColor == 0:
+        count += 1
+      if target != 0:
+        break
+      targetRow += dr
+      targetCol += dc
+  return count
+
+# Positions from random games, the boards are copies so they can all be kept
+def randomPositions(count, seed=0):
+  rng = random.Random(seed)
+  board = createBoard()
+  positions = []
+  while len(positions) < count:
+    moves = board.getValidMoves()
+    if not moves or len(board.moveLog) >= 120:
+      board = createBoard()
+      continue
+    board.makeMove(rng.choice(moves))
+    positions.append(board.clone(history=False))
+  return positions
+
+def bench(count):
+  boards = randomPositions(count)
+  start = time.perf_counter()
+  scalar = [evaluate(board) for board in boards]
+  scalarSeconds = time.perf_counter() - start
+  start = time.perf_counter()
+  squares, whiteToMove = toBatch(boards)
+  convertSeconds = time.perf_counter() - start
+  start = time.perf_counter()
+  batched = evaluateBatch(squares, whiteToMove)
+  batchSeconds = time.perf_counter() - start
+  if batched.tolist() != scalar:
+    raise AssertionError('the batched scores differ from the scalar ones')
+  print('{:,} positions, scores match'.format(count))
+  print('scalar:  {:,.0f} positions/s'.format(count / scalarSeconds))
+  print('batched: {:,.0f} positions/s ({:,.0f} positions/s with the conversion to arrays)'.format(
+    count / batchSeconds, count / (batchSeconds + convertSeconds)))
+
+def main(argv):
+  bench(int(argv[0]) if argv else 10000)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,98 @@
+# Load test for server.py: N clients play N / 2 games of random moves at the same time
+# Every client rebuilds the game from the start position and moves it gets when joining, then keeps its own board up
+# to date from the move deltas the server broadcasts
+# Usage: python loadtest.py [--clients N] [--moves N] [--host HOST] [--port PORT] [--spawn] [--backend NAME]
+#   --spawn starts a server inside this process on a free port instead of connecting to a running one
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from engine import BACKENDS, createBoard
+from perft import moveName
+from server import GameServer, LatencyStats
+
+async def send(writer, message):
+  writer.write((json.dumps(message) + '\n').encode())
+  await writer.drain()
+
+async def receive(reader):
+  line = await reader.readline()
+  if not line:
+    raise ConnectionError('server closed the connection')
+  return json.loads(line)
+
+# Joins the game and plays random moves until the game has maxPlies plies or is over
+# Records the time from sending a move until the server broadcasts it back
+async def runClient(host, port, gameName, maxPlies, seed, latency, backend):
+  rng = random.Random(seed)
+  reader, writer = await asyncio.open_connection(host, port)
+  await send(writer, {'op': 'join', 'game': gameName})
+  joined = await receive(reader)
+  color = joined['color']
+  # The opponent may have moved already, the game is replayed from its start so the board has the whole history
+  board = createBoard(backend, joined['startFen'])
+  for text in joined['moves']:
+    board.makeMove(board.findMove(text))
+  status = joined['status']
+  sent = None
+  while status is None and len(board.moveLog) < maxPlies:
+    if sent is None and color == ('w' if board.whiteToMove else 'b'):
+      sent = time.perf_counter()
+      await send(writer, {'op': 'move', 'move': moveName(rng.choice(board.getValidMoves()))})
+    message = await receive(reader)
+    if message['op'] == 'moved':
+      board.makeMove(board.findMove(message['move']))
+      status = message['status']
+      if sent is not None and board.whiteToMove != (color == 'w'):
+        latency.record(time.perf_counter() - sent)
+        sent = None
+    elif message['op'] == 'error':
+      raise RuntimeError(message['error'])
+  await send(writer, {'op': 'stats'})
+  while True:
+    message = await receive(reader)
+    if message['op'] == 'stats':
+      break
+  writer.close()
+  return len(board.moveLog), message
+
+async def runLoadTest(args):
+  port = args.port
+  server = None
+  if args.spawn:
+    server = GameServer(args.backend)
+    await server.start(args.host, 0)
+    port = server.server.sockets[0].getsockname()[1]
+  latency = LatencyStats(1000000)
+  start = time.perf_counter()
+  results = await asyncio.gather(*[runClient(args.host, port, 'game' + str(i // 2), args.moves, i, latency, args.backend)
+                                   for i in range(args.clients)])
+  seconds = time.perf_counter() - start
+  moves = sum(plies for plies, stats in results) // 2 # both players of a game count every ply
+  print('{} clients, {} games, {} moves in {:.2f}s: {:.1f} moves/s'.format(
+    args.clients, (args.clients + 1) // 2, moves, seconds, moves / seconds))
+  print('client move round trip (ms): ' + json.dumps(latency.percentiles()))
+  print('server processing (ms):      ' + json.dumps(results[-1][1]['global']))
+  if server:
+    server.server.close()
+    await server.server.wait_closed()
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Load test for the game server')
+  parser.add_argument('--clients', type=int, default=100)
+  parser.add_argument('--moves', type=int, default=40, help='plies per game')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8765)
+  parser.add_argument('--spawn', action='store_true', help='run the server in this process')
+  parser.add_argument('--backend', default='list', choices=list(BACKENDS),
+                      help='backend of the boards of the clients and of the spawned server')
+  args = parser.parse_args(argv)
+  if args.clients % 2:
+    parser.error('--clients must be even, every game has two players')
+  asyncio.run(runLoadTest(args))
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,250 @@
+# Mailbox move generation backend
+# The position is kept in a one dimensional 10x12 board (a bytearray of 120 squares): the 8x8 board in the middle with
+# two rows of OFFBOARD above and below it and one column on each side, so a pawn step or capture from any square lands
+# on the board or on OFFBOARD and never needs a row and column bounds check
+# Knight and king targets, pawn attacks and the ray of every direction are precomputed lists of mailbox indexes per
+# square, built once at import instead of on every call of the generators
+# Board.board is kept as the (row, col) adapter: 8 memoryviews over the rows of the mailbox, so board[r][c] reads and
+# writes the mailbox itself and the gui, Move and the inherited makeMove/undoMove work unchanged
+from engine import DIAGONALS, KING_OFFSETS, KNIGHT_OFFSETS, ORTHOGONALS, Board, Move
+
+WHITE = 8
+BLACK = 16
+# Has no color or type bit, so it is never own, never enemy and never empty
+OFFBOARD = 32
+
+def mailboxIndex(r, c):
+  return (r + 2) * 10 + c + 1
+
+# Mailbox index of every square (row * 8 + col), and the (row, col) and square of every mailbox index on the board
+MAILBOX = [mailboxIndex(sq >> 3, sq & 7) for sq in range(64)]
+COORDS = [None] * 120
+SQUARE_BITS = [0] * 120
+for sq, m in enumerate(MAILBOX):
+  COORDS[m] = (sq >> 3, sq & 7)
+  SQUARE_BITS[m] = 1 << sq
+ROW_STARTS = MAILBOX[::8]
+
+# Same order as Board.lookForChecksPins, the first 4 are orthogonal and the last 4 diagonal
+DIRECTIONS = ORTHOGONALS + DIAGONALS
+
+def onBoard(r, c):
+  return 0 <= r < 8 and 0 <= c < 8
+
+# Per mailbox index, None off the board
+KNIGHT_TARGETS = [None] * 120
+KING_TARGETS = [None] * 120
+RAYS = [None] * 120
+for m in MAILBOX:
+  r, c = COORDS[m]
+  KNIGHT_TARGETS[m] = [mailboxIndex(r + dr, c + dc) for dr, dc in KNIGHT_OFFSETS if onBoard(r + dr, c + dc)]
+  KING_TARGETS[m] = [mailboxIndex(r + dr, c + dc) for dr, dc in KING_OFFSETS if onBoard(r + dr, c + dc)]
+  RAYS[m] = [[mailboxIndex(r + dr * i, c + dc * i) for i in range(1, 8) if onBoard(r + dr * i, c + dc * i)]
+             for dr, dc in DIRECTIONS]
+del m, r, c, sq
+
+# The attack bitmasks (bit row * 8 + col) of the step pieces
+def targetBits(targets):
+  bits = 0
+  for t in targets:
+    bits |= SQUARE_BITS[t]
+  return bits
+
+KNIGHT_BITS = [targetBits(targets) if targets is not None else 0 for targets in KNIGHT_TARGETS]
+KING_BITS = [targetBits(targets) if targets is not None else 0 for targets in KING_TARGETS]
+# White pawns attack up the board (row - 1) and black pawns down
+PAWN_STEP = {WHITE: -10, BLACK: 10}
+PAWN_BITS = {color: [SQUARE_BITS[m + step - 1] | SQUARE_BITS[m + step + 1] if 20 <= m + step < 100 else 0
+                     for m in range(120)] for color, step in PAWN_STEP.items()}
+# Rows pawns make their double step from
+PAWN_START_ROW = {WHITE: 6, BLACK: 1}
+# Directions each piece type slides in, indexed by piece & 7
+SLIDES = [(), (), (), (), range(4, 8), range(4), range(8)]
+# Directions from the king in which an enemy pawn next to it gives check, indexed by the king's color
+PAWN_CHECKS = {WHITE: (4, 5), BLACK: (6, 7)}
+
+class MailboxBoard(Board):
+  def __init__(self):
+    super().__init__()
+    self.loadMailbox(self.board)
+
+  def setPosition(self, board, whiteToMove, castlingRights=0, enpassantSquare=None, halfmoveClock=0, fullmoveNumber=1):
+    super().setPosition(board, whiteToMove, castlingRights, enpassantSquare, halfmoveClock, fullmoveNumber)
+    self.loadMailbox(board)
+
+  # Fills the mailbox from an 8x8 board and points self.board at it
+  def loadMailbox(self, board):
+    squares = bytearray([OFFBOARD]) * 120
+    for r in range(8):
+      squares[ROW_STARTS[r]:ROW_STARTS[r] + 8] = bytes(board[r])
+    self.squares = squares
+    self.board = rowViews(squares)
+
+  # The mailbox is copied in one go, the row views are made again over the copy
+  def clone(self, history=True):
+    board = super().clone(history)
+    board.squares = bytearray(self.squares)
+    board.board = rowViews(board.squares)
+    return board
+
+  # memoryviews can't be pickled or deep copied, the rows are made again from the mailbox
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    del state['board']
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.board = rowViews(self.squares)
+
+  # Same moves as Board.generateAllMoves (kings are generated separately) using the mailbox tables
+  def generateAllMoves(self):
+    moves = []
+    squares = self.squares
+    us = WHITE if self.whiteToMove else BLACK
+    for m in MAILBOX:
+      piece = squares[m]
+      if not piece & us:
+        continue
+      pieceType = piece & 7
+      if pieceType == 2:
+        self.generatePawnMailboxMoves(m, us, moves)
+      elif pieceType == 3:
+        start = COORDS[m]
+        for t in KNIGHT_TARGETS[m]:
+          if not squares[t] & us:
+            moves.append(Move(start, COORDS[t], self))
+      elif pieceType != 1:
+        start = COORDS[m]
+        rays = RAYS[m]
+        for d in SLIDES[pieceType]:
+          for t in rays[d]:
+            target = squares[t]
+            if target & us:
+              break
+            moves.append(Move(start, COORDS[t], self))
+            if target:
+              break
+    return moves
+
+  # Pushes, captures (the en passant square included) and promotions of the pawn on m
+  def generatePawnMailboxMoves(self, m, us, moves):
+    squares = self.squares
+    start = COORDS[m]
+    step = PAWN_STEP[us]
+    t = m + step
+    if squares[t] == 0:
+      self.addPawnMove(start, COORDS[t], moves)
+      if start[0] == PAWN_START_ROW[us] and squares[t + step] == 0:
+        moves.append(Move(start, COORDS[t + step], self))
+    them = us ^ 24
+    ep = self.enpassantSquare
+    for t in (m + step - 1, m + step + 1):
+      if squares[t] & them:
+        self.addPawnMove(start, COORDS[t], moves)
+      elif ep is not None and COORDS[t] == ep:
+        moves.append(Move(start, ep, self))
+
+  # Same as Board.lookForChecksPins: (inCheck, pins, checks) with pins and checks as (row, col, dr, dc)
+  def lookForChecksPins(self):
+    pins = []
+    checks = []
+    squares = self.squares
+    us = WHITE if self.whiteToMove else BLACK
+    kingR, kingC = self.wKingPos if self.whiteToMove else self.bKingPos
+    king = mailboxIndex(kingR, kingC)
+    rays = RAYS[king]
+    pawnChecks = PAWN_CHECKS[us]
+    for d in range(8):
+      dr, dc = DIRECTIONS[d]
+      maybePinned = None
+      first = True
+      for t in rays[d]:
+        piece = squares[t]
+        if not piece:
+          first = False
+          continue
+        if piece & us:
+          if maybePinned is not None:
+            break
+          maybePinned = COORDS[t] + (dr, dc)
+          first = False
+          continue
+        pieceType = piece & 7
+        if d in SLIDES[pieceType] or (first and (pieceType == 1 or (pieceType == 2 and d in pawnChecks))):
+          if maybePinned is None:
+            checks.append(COORDS[t] + (dr, dc))
+          else:
+            pins.append(maybePinned)
+        break
+    knight = (us ^ 24) | 3
+    for t in KNIGHT_TARGETS[king]:
+      if squares[t] == knight:
+        r, c = COORDS[t]
+        checks.append((r, c, r - kingR, c - kingC))
+    return len(checks) > 0, pins, checks
+
+  # Same as Board.enemyAttacks: every square the side not to move attacks, looking through our own king
+  def enemyAttacks(self):
+    squares = self.squares
+    kingR, kingC = self.wKingPos if self.whiteToMove else self.bKingPos
+    king = mailboxIndex(kingR, kingC)
+    kingPiece = squares[king]
+    squares[king] = 0
+    them = BLACK if self.whiteToMove else WHITE
+    pawnBits = PAWN_BITS[them]
+    attacks = 0
+    for m in MAILBOX:
+      piece = squares[m]
+      if not piece & them:
+        continue
+      pieceType = piece & 7
+      if pieceType == 2:
+        attacks |= pawnBits[m]
+      elif pieceType == 3:
+        attacks |= KNIGHT_BITS[m]
+      elif pieceType == 1:
+        attacks |= KING_BITS[m]
+      else:
+        rays = RAYS[m]
+        for d in SLIDES[pieceType]:
+          for t in rays[d]:
+            attacks |= SQUARE_BITS[t]
+            if squares[t]:
+              break
+    squares[king] = kingPiece
+    return attacks
+
+  # Is the square (r, c) attacked by the side not to move
+  # Looks outward from the square with each piece's attack pattern
+  def isAttacked(self, r, c):
+    squares = self.squares
+    m = mailboxIndex(r, c)
+    them = BLACK if self.whiteToMove else WHITE
+    knight = them | 3
+    for t in KNIGHT_TARGETS[m]:
+      if squares[t] == knight:
+        return True
+    king = them | 1
+    for t in KING_TARGETS[m]:
+      if squares[t] == king:
+        return True
+    # An enemy pawn attacks the square from one row behind it, seen from the pawn
+    pawn = them | 2
+    step = PAWN_STEP[them]
+    if squares[m - step - 1] == pawn or squares[m - step + 1] == pawn:
+      return True
+    rays = RAYS[m]
+    for d in range(8):
+      for t in rays[d]:
+        piece = squares[t]
+        if piece:
+          if piece & them and d in SLIDES[piece & 7]:
+            return True
+          break
+    return False
+
+# The 8 rows of the mailbox as memoryviews, row 0 is the 8th rank like Board.board
+def rowViews(squares):
+  view = memoryview(squares)
+  return [view[start:start + 8] for start in ROW_STARTS]
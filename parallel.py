@@ -0,0 +1,140 @@
+# Splits the root moves of a position across worker processes for perft and analysis
+# Workers get the position as a FEN string and the root move as its moveID, never pickled Board or Move objects
+# Every root move is handled on its own fresh board and search, so the results do not depend on how the
+# moves are split and match the single process run exactly
+# Usage:
+#   python parallel.py perft DEPTH [--fen FEN] [--workers N] [--backend NAME]
+#   python parallel.py search DEPTH [--fen FEN] [--workers N] [--backend NAME]
+#   python parallel.py scaling DEPTH [--fen FEN] [--workers N] [--backend NAME]   perft timings for 1..N workers
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from engine import BACKENDS, createBoard
+from perft import START_FEN, moveName, perft, formatRate
+from search import MATE, MAX_PLY, Search
+
+# Plays the root move with the given id on a new board made from the FEN
+def rootBoard(fen, moveID, backend):
+  board = createBoard(backend, fen)
+  for move in board.getValidMoves():
+    if move.moveID == moveID:
+      board.makeMove(move)
+      return board
+  raise ValueError('move ' + str(moveID) + ' is not legal in ' + fen)
+
+# Worker task: perft below one root move, returns (moveID, nodes)
+def perftTask(task):
+  fen, moveID, depth, backend = task
+  return moveID, perft(rootBoard(fen, moveID, backend), depth - 1)
+
+# Worker task: fixed depth search below one root move, returns (moveID, score for the side to move at the root, nodes)
+def searchTask(task):
+  fen, moveID, depth, backend, hashMegabytes = task
+  board = rootBoard(fen, moveID, backend)
+  search = Search(hashMegabytes)
+  infos = search.search(board, depth - 1) if depth > 1 else []
+  if infos:
+    score = -infos[-1].score
+  else:
+    # The reply side has no moves (or there is no depth left below the root move)
+    score = -search.quiesce(board, -MATE, MATE, 1) if board.getValidMoves() else (MATE if board.inCheck else 0)
+  # A mate found below the root move is one ply further from the root
+  if score >= MATE - MAX_PLY:
+    score -= 1
+  elif score <= -MATE + MAX_PLY:
+    score += 1
+  return moveID, score, search.nodes
+
+# Runs the tasks on a pool of workers (or in this process for 1 worker), results come back in task order
+def runTasks(fn, tasks, workers):
+  if workers <= 1:
+    return [fn(task) for task in tasks]
+  with ProcessPoolExecutor(max_workers=workers) as pool:
+    return list(pool.map(fn, tasks))
+
+# Perft split by root move over the workers, returns a list of (move, nodes) in root move order
+def parallelDivide(board, depth, workers=None, backend='list'):
+  workers = workers or os.cpu_count()
+  fen = board.toFEN()
+  moves = board.getValidMoves()
+  results = dict(runTasks(perftTask, [(fen, move.moveID, depth, backend) for move in moves], workers))
+  return [(move, results[move.moveID]) for move in moves]
+
+def parallelPerft(board, depth, workers=None, backend='list'):
+  if depth <= 1:
+    return perft(board, depth)
+  return sum(nodes for move, nodes in parallelDivide(board, depth, workers, backend))
+
+# Scores every root move with a fixed depth search over the workers
+# Returns (bestMove, [(move, score, nodes)] sorted best first), ties keep the root move order
+def parallelSearch(board, depth, workers=None, backend='list', hashMegabytes=16):
+  workers = workers or os.cpu_count()
+  fen = board.toFEN()
+  moves = board.getValidMoves()
+  if not moves:
+    return None, []
+  results = runTasks(searchTask, [(fen, move.moveID, depth, backend, hashMegabytes) for move in moves], workers)
+  byID = {move.moveID: move for move in moves}
+  scored = [(byID[moveID], score, nodes) for moveID, score, nodes in results]
+  scored.sort(key=lambda result: -result[1]) # sort is stable so equal scores stay in root move order
+  return scored[0][0], scored
+
+def runPerft(args):
+  board = createBoard(args.backend, args.fen)
+  start = time.perf_counter()
+  results = parallelDivide(board, args.depth, args.workers, args.backend)
+  seconds = time.perf_counter() - start
+  for move, nodes in sorted(results, key=lambda result: moveName(result[0])):
+    print(moveName(move) + ': ' + str(nodes))
+  print()
+  print(str(args.workers) + ' workers, ' + formatRate(sum(nodes for move, nodes in results), seconds))
+
+def runSearch(args):
+  board = createBoard(args.backend, args.fen)
+  start = time.perf_counter()
+  bestMove, scored = parallelSearch(board, args.depth, args.workers, args.backend)
+  seconds = time.perf_counter() - start
+  for move, score, nodes in scored:
+    print('{} score {} nodes {:,}'.format(moveName(move), score, nodes))
+  nodes = sum(result[2] for result in scored)
+  print()
+  if bestMove:
+    print('bestmove ' + moveName(bestMove))
+  print(str(args.workers) + ' workers, ' + formatRate(nodes, seconds))
+
+# Times the same perft with 1, 2, 4 ... workers and checks every run gives the same per move counts
+def runScaling(args):
+  board = createBoard(args.backend, args.fen)
+  counts = [1]
+  while counts[-1] * 2 <= args.workers:
+    counts.append(counts[-1] * 2)
+  if counts[-1] != args.workers:
+    counts.append(args.workers)
+  reference = None
+  baseSeconds = None
+  for workers in counts:
+    start = time.perf_counter()
+    results = [(move.moveID, nodes) for move, nodes in parallelDivide(board, args.depth, workers, args.backend)]
+    seconds = time.perf_counter() - start
+    if reference is None:
+      reference = results
+      baseSeconds = seconds
+    same = 'same counts' if results == reference else 'DIFFERENT COUNTS'
+    print('{:>3} workers: {:.2f}s speedup {:.2f}x, {}'.format(workers, seconds, baseSeconds / seconds, same))
+  print('cpu count: ' + str(os.cpu_count()))
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Parallel perft and root move analysis')
+  parser.add_argument('mode', choices=['perft', 'search', 'scaling'])
+  parser.add_argument('depth', type=int)
+  parser.add_argument('--fen', default=START_FEN)
+  parser.add_argument('--workers', type=int, default=os.cpu_count())
+  parser.add_argument('--backend', default='list', choices=list(BACKENDS))
+  args = parser.parse_args(argv)
+  {'perft': runPerft, 'search': runSearch, 'scaling': runScaling}[args.mode](args)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
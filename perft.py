@@ -0,0 +1,115 @@
+# Perft: counts the leaf nodes of the legal move tree to a fixed depth
+# The counts are compared with the published ones to catch move generation bugs
+# and the node rate is used to spot performance regressions
+# Usage:
+#   python perft.py [depth] [--fen FEN] [--backend NAME]   per root move breakdown of one position
+#   python perft.py --suite [--max-nodes N] [--backend NAME] runs the reference positions
+import sys
+import time
+from engine import BACKENDS, COLS_TO_FILES, PROMOTIONS_TO_LETTERS, ROWS_TO_RANKS, createBoard
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# Reference positions with their known node counts per depth (index 0 is depth 1)
+# https://www.chessprogramming.org/Perft_Results
+POSITIONS = [
+  ('start', START_FEN,
+    [20, 400, 8902, 197281, 4865609, 119060324]),
+  ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    [48, 2039, 97862, 4085603, 193690690]),
+  ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    [14, 191, 2812, 43238, 674624, 11030083]),
+  ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+    [6, 264, 9467, 422333, 15833292]),
+  ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+    [44, 1486, 62379, 2103487, 89941194]),
+  ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+    [46, 2079, 89890, 3894594, 164075551]),
+]
+
+# Number of leaf nodes depth plies below the current position
+def perft(board, depth):
+  moves = board.getValidMoves()
+  if depth <= 1:
+    return len(moves) if depth == 1 else 1
+  nodes = 0
+  for move in moves:
+    board.makeMove(move)
+    nodes += perft(board, depth - 1)
+    board.undoMove()
+  return nodes
+
+# Perft split by root move, returns a list of (move, nodes)
+def divide(board, depth):
+  results = []
+  for move in board.getValidMoves():
+    board.makeMove(move)
+    results.append((move, perft(board, depth - 1)))
+    board.undoMove()
+  return results
+
+# Long algebraic notation of a move, ex: e2e4, e7e8q
+def moveName(move):
+  return (COLS_TO_FILES[move.startCol] + ROWS_TO_RANKS[move.startRow] +
+          COLS_TO_FILES[move.endCol] + ROWS_TO_RANKS[move.endRow] +
+          (PROMOTIONS_TO_LETTERS[move.promotion & 7] if move.promotion else ''))
+
+# Runs perft and returns (nodes, seconds)
+def timedPerft(board, depth):
+  start = time.perf_counter()
+  nodes = perft(board, depth)
+  return nodes, time.perf_counter() - start
+
+def formatRate(nodes, seconds):
+  return '{:,} nodes in {:.3f}s ({:,.0f} nodes/s)'.format(nodes, seconds, nodes / seconds if seconds > 0 else 0)
+
+# Prints the per root move breakdown of one position
+def runDivide(fen, depth, backend):
+  board = createBoard(backend, fen)
+  start = time.perf_counter()
+  results = divide(board, depth)
+  seconds = time.perf_counter() - start
+  for move, nodes in sorted(results, key=lambda result: moveName(result[0])):
+    print(moveName(move) + ': ' + str(nodes))
+  print()
+  print('moves: ' + str(len(results)))
+  print(formatRate(sum(nodes for move, nodes in results), seconds))
+
+# Runs every reference position up to the deepest depth whose expected count is at most maxNodes
+# Returns the number of mismatches
+def runSuite(backend, maxNodes):
+  failures = 0
+  totalNodes = 0
+  totalSeconds = 0
+  for name, fen, expected in POSITIONS:
+    for depth in range(1, len(expected) + 1):
+      if expected[depth - 1] > maxNodes:
+        break
+      nodes, seconds = timedPerft(createBoard(backend, fen), depth)
+      totalNodes += nodes
+      totalSeconds += seconds
+      ok = nodes == expected[depth - 1]
+      if not ok:
+        failures += 1
+      print('{:<10} depth {} {:<4} expected {:,}, {}'.format(name, depth, 'ok' if ok else 'FAIL', expected[depth - 1], formatRate(nodes, seconds)))
+  print()
+  print('total: ' + formatRate(totalNodes, totalSeconds) + ', ' + str(failures) + ' failures')
+  return failures
+
+def main(argv):
+  import argparse
+  parser = argparse.ArgumentParser(description='Counts leaf nodes of the legal move tree')
+  parser.add_argument('depth', type=int, nargs='?', default=3)
+  parser.add_argument('--fen', default=START_FEN)
+  parser.add_argument('--backend', default='list', choices=list(BACKENDS))
+  parser.add_argument('--suite', action='store_true', help='run the reference positions')
+  parser.add_argument('--max-nodes', type=int, default=100000, help='deepest suite depth to run, by expected node count')
+  args = parser.parse_args(argv)
+
+  if args.suite:
+    return 1 if runSuite(args.backend, args.max_nodes) else 0
+  runDivide(args.fen, args.depth, args.backend)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,402 @@
+# PGN import and export
+# readGames is a generator over the lines of a PGN file that yields one game at a time, so files of any size are read
+# with the memory of one game. replay plays the SAN moves of a game on a Board without generating the legal moves of
+# every position: the piece making the move is found from the target square and only when two pieces of the same type
+# could get there is the list of legal moves asked for
+# Usage:
+#   python pgn.py replay FILE [--validate] [--backend NAME]   replays every game and prints games per minute
+#   python pgn.py fromlog LOG FILE                           converts a selfplay.py log to PGN
+#   python pgn.py bench [GAMES]                              writes random games as PGN and times reading them back
+#   python pgn.py check [--games N] [--seed N]               compares validated replay with the legal move lists
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from engine import BACKENDS, DIAGONALS, FILES_TO_COLS, KING_OFFSETS, KNIGHT_OFFSETS, ORTHOGONALS, RANKS_TO_ROWS, Move, createBoard
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+# The Seven Tag Roster, written first and in this order
+ROSTER = [('Event', '?'), ('Site', '?'), ('Date', '????.??.??'), ('Round', '?'), ('White', '?'), ('Black', '?'), ('Result', '*')]
+
+TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Comments, variation brackets, NAGs and everything else separated by spaces
+TOKEN = re.compile(r'\{[^}]*\}?|;.*|[()]|\$\d+|[^\s{};()]+')
+MOVE_NUMBER = re.compile(r'^\d+\.+')
+# e8=Q, also e8Q from older files
+PROMOTION = re.compile(r'=?([QRBN])$')
+
+PIECE_TYPES = {'K': 1, 'N': 3, 'B': 4, 'R': 5, 'Q': 6}
+CASTLES = {'O-O': 6, 'O-O-O': 2, '0-0': 6, '0-0-0': 2} # the column the king ends on
+
+class Game:
+  def __init__(self, headers=None, moves=None, result='*'):
+    self.headers = headers if headers is not None else {}
+    self.moves = moves if moves is not None else [] # SAN
+    self.result = result
+
+  # The board the game starts from, the FEN tag when there is one
+  def startBoard(self, backend='list'):
+    return createBoard(backend, self.headers.get('FEN'))
+
+# Yields the games of an iterable of PGN lines (ex: an open file)
+# A game whose movetext doesn't end in a result gets the one of its Result tag
+def readGames(lines):
+  headers = {}
+  moves = []
+  variations = 0
+  inComment = False
+  for line in lines:
+    if inComment:
+      end = line.find('}')
+      if end < 0:
+        continue
+      line = line[end + 1:]
+      inComment = False
+    stripped = line.strip()
+    if not stripped or stripped[0] == '%':
+      continue
+    if stripped[0] == '[' and variations == 0:
+      # A tag after movetext without a result starts the next game
+      if moves:
+        yield Game(headers, moves, headers.get('Result', '*'))
+        headers, moves = {}, []
+      match = TAG.match(stripped)
+      if match:
+        headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+      continue
+    for token in TOKEN.findall(stripped):
+      first = token[0]
+      if first == '{':
+        inComment = not token.endswith('}')
+      elif first == ';' or first == '$':
+        continue
+      elif first == '(':
+        variations += 1
+      elif first == ')':
+        variations -= 1
+      elif variations:
+        continue
+      elif token in RESULTS:
+        yield Game(headers, moves, token)
+        headers, moves = {}, []
+      else:
+        token = MOVE_NUMBER.sub('', token)
+        if token:
+          moves.append(token)
+  if moves or headers:
+    yield Game(headers, moves, headers.get('Result', '*'))
+
+def readPGN(path):
+  with open(path) as lines:
+    yield from readGames(lines)
+
+# Plays the SAN moves of the game and returns the board, raises ValueError at the first move that can't be played
+# With validate every move is also checked to be legal, otherwise the moves are trusted to be legal
+def replay(game, backend='list', validate=False):
+  board = game.startBoard(backend)
+  for ply, san in enumerate(game.moves):
+    move = parseSAN(board, san)
+    if move is None or (validate and not isPlayable(board, move)):
+      raise ValueError('illegal move {} at ply {}'.format(san, ply + 1))
+    board.makeMove(move)
+    if validate and leftKingAttacked(board):
+      board.undoMove()
+      raise ValueError('illegal move {} at ply {}'.format(san, ply + 1))
+  return board
+
+# What parseSAN doesn't check about a move, without generating the legal moves of the position: parseSAN found a piece
+# of the side to move that reaches the end square, the end square must not hold an own piece or a king and a pawn only
+# moves two squares from its starting row. Castling asks the legal moves of the king, rights and attacked squares
+# included. Whether the king is left in check is looked at once the move is made, see leftKingAttacked
+def isPlayable(board, move):
+  if move.pieceCaptured & (8 if board.whiteToMove else 16) or move.pieceCaptured & 7 == 1:
+    return False
+  if move.isCastle:
+    return board.isLegal(move)
+  if move.pieceMoved & 7 == 2 and abs(move.endRow - move.startRow) == 2:
+    return move.startRow == (6 if board.whiteToMove else 1)
+  return True
+
+# Is the king of the side that just moved attacked
+def leftKingAttacked(board):
+  board.whiteToMove = not board.whiteToMove
+  kingR, kingC = board.wKingPos if board.whiteToMove else board.bKingPos
+  attacked = board.isAttacked(kingR, kingC)
+  board.whiteToMove = not board.whiteToMove
+  return attacked
+
+# The move of a SAN string in the board's position, None when no piece can make it
+def parseSAN(board, san):
+  text = san.rstrip('+#!?')
+  color = 8 if board.whiteToMove else 16
+  squares = board.board
+  if text in CASTLES:
+    row = 7 if board.whiteToMove else 0
+    if squares[row][4] != color | 1:
+      return None
+    return Move((row, 4), (row, CASTLES[text]), board)
+  promotion = 6
+  match = PROMOTION.search(text)
+  if match:
+    promotion = PIECE_TYPES[match.group(1)]
+    text = text[:match.start()]
+  if len(text) < 2 or text[-2] not in FILES_TO_COLS or text[-1] not in RANKS_TO_ROWS:
+    return None
+  endRow, endCol = RANKS_TO_ROWS[text[-1]], FILES_TO_COLS[text[-2]]
+  if text[0] in PIECE_TYPES:
+    piece = color | PIECE_TYPES[text[0]]
+    origin = text[1:-2].replace('x', '')
+    candidates = []
+    for r in range(8):
+      row = squares[r]
+      for c in range(8):
+        if row[c] == piece and reaches(squares, piece & 7, r, c, endRow, endCol) and \
+           all((FILES_TO_COLS.get(o) == c if o in FILES_TO_COLS else RANKS_TO_ROWS.get(o) == r) for o in origin):
+          candidates.append((r, c))
+    if len(candidates) > 1:
+      # Two pieces see the square but one of them is pinned, only the legal move counts
+      candidates = [square for square in candidates
+                    if any(move.endRow == endRow and move.endCol == endCol for move in board.legalMovesFrom(*square))]
+    if len(candidates) != 1:
+      return None
+    return Move(candidates[0], (endRow, endCol), board)
+  # Pawn moves: exd5 names the start file (an empty d5 is en passant), e4 is a push of one or two squares
+  back = 1 if board.whiteToMove else -1
+  if 'x' in text:
+    startCol = FILES_TO_COLS.get(text[0])
+    startRow = endRow + back
+    if startCol is None or abs(startCol - endCol) != 1 or not 0 <= startRow < 8 or \
+       squares[startRow][startCol] != color | 2:
+      return None
+    if squares[endRow][endCol] == 0 and board.enpassantSquare != (endRow, endCol):
+      return None
+    return Move((startRow, startCol), (endRow, endCol), board, promotion)
+  if len(text) != 2 or squares[endRow][endCol] != 0:
+    return None
+  startRow = endRow + back
+  if 0 <= startRow < 8 and squares[startRow][endCol] == 0:
+    startRow += back
+  if not 0 <= startRow < 8 or squares[startRow][endCol] != color | 2:
+    return None
+  return Move((startRow, endCol), (endRow, endCol), board, promotion)
+
+# Can the piece of this type on (r, c) move to (endRow, endCol) on an otherwise unchanged board
+def reaches(squares, pieceType, r, c, endRow, endCol):
+  dr = endRow - r
+  dc = endCol - c
+  if pieceType == 3:
+    return (dr, dc) in KNIGHT_OFFSETS
+  if pieceType == 1:
+    return (dr, dc) in KING_OFFSETS
+  if dr != 0 and dc != 0 and abs(dr) != abs(dc):
+    return False
+  stepR = (dr > 0) - (dr < 0)
+  stepC = (dc > 0) - (dc < 0)
+  if (stepR, stepC) not in (DIAGONALS if pieceType == 4 else ORTHOGONALS if pieceType == 5 else KING_OFFSETS):
+    return False
+  r += stepR
+  c += stepC
+  while (r, c) != (endRow, endCol):
+    if squares[r][c] != 0:
+      return False
+    r += stepR
+    c += stepC
+  return True
+
+# SAN of moves played one after the other from the board's position, the board is left where it was
+def sanMoves(board, moves):
+  sans = []
+  for move in moves:
+    sans.append(move.getChessNotation(board))
+    board.makeMove(move)
+  for move in moves:
+    board.undoMove()
+  return sans
+
+# The game as PGN text, the Seven Tag Roster first and the movetext wrapped below 80 columns
+def formatGame(game):
+  headers = dict(ROSTER)
+  headers.update(game.headers)
+  headers['Result'] = game.result
+  lines = ['[{} "{}"]'.format(key, str(headers.pop(key)).replace('\\', '\\\\').replace('"', '\\"')) for key, default in ROSTER]
+  lines += ['[{} "{}"]'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in headers.items()]
+  lines.append('')
+  blackFirst = 'FEN' in game.headers and game.headers['FEN'].split()[1:2] == ['b']
+  tokens = []
+  for i, san in enumerate(game.moves):
+    ply = i + (1 if blackFirst else 0)
+    if ply % 2 == 0:
+      tokens.append('{}.'.format(ply // 2 + 1))
+    elif i == 0:
+      tokens.append('{}...'.format(ply // 2 + 1))
+    tokens.append(san)
+  tokens.append(game.result)
+  line = ''
+  for token in tokens:
+    if line and len(line) + 1 + len(token) >= 80:
+      lines.append(line)
+      line = token
+    else:
+      line = line + ' ' + token if line else token
+  lines.append(line)
+  return '\n'.join(lines) + '\n\n'
+
+def writePGN(path, games):
+  count = 0
+  with open(path, 'w') as out:
+    for game in games:
+      out.write(formatGame(game))
+      count += 1
+  return count
+
+# Games of a selfplay.py log (index result plies ms ms moves...) with their moves turned into SAN
+def gamesFromLog(path):
+  with open(path) as log:
+    for line in log:
+      fields = line.split()
+      if len(fields) < 5:
+        continue
+      board = createBoard()
+      moves = []
+      for text in fields[5:]:
+        move = board.findMove(text)
+        if move is None:
+          break
+        moves.append(move)
+        board.makeMove(move)
+      for move in moves:
+        board.undoMove()
+      yield Game({'Event': 'selfplay', 'Round': fields[0]}, sanMoves(board, moves), fields[1])
+
+# Replays every game of the file, returns (games, plies, errors, seconds)
+def replayFile(path, backend='list', validate=False):
+  games = plies = errors = 0
+  start = time.perf_counter()
+  for game in readPGN(path):
+    try:
+      board = replay(game, backend, validate)
+      plies += len(board.moveLog)
+    except ValueError:
+      errors += 1
+    games += 1
+  return games, plies, errors, time.perf_counter() - start
+
+def printRate(games, plies, errors, seconds):
+  print('{:,} games, {:,} plies, {} errors in {:.2f}s: {:,.0f} games/min, {:,.0f} plies/s'.format(
+    games, plies, errors, seconds, games * 60 / seconds, plies / seconds))
+
+# Random games, written as PGN, read back and replayed; the final positions must be the ones the games ended in
+def bench(count, maxPlies=120, seed=0):
+  rng = random.Random(seed)
+  path = 'pgn_bench.pgn'
+  games = []
+  hashes = []
+  for i in range(count):
+    board = createBoard()
+    moves = []
+    while len(moves) < maxPlies and board.getValidMoves():
+      move = rng.choice(board.getValidMoves())
+      moves.append(move.getChessNotation(board))
+      board.makeMove(move)
+    hashes.append(board.hash)
+    games.append(Game({'Round': str(i + 1)}, moves, '*'))
+  writePGN(path, games)
+  print('wrote {:,} games ({:,} bytes)'.format(count, os.path.getsize(path)))
+  for i, game in enumerate(readPGN(path)):
+    if replay(game).hash != hashes[i]:
+      raise AssertionError('game {} replays to a different position'.format(i + 1))
+  for validate in (False, True):
+    print('validate ' if validate else 'trusted  ', end='')
+    printRate(*replayFile(path, validate=validate))
+  os.remove(path)
+
+# Games replay with validate must refuse, and the ply of the illegal move
+ILLEGAL_GAMES = [
+  (['a4', 'h5', 'axh5'], 3), # a pawn taking on a file that isn't next to its own
+  (['e4', 'e5', 'exe5'], 3), # a pawn taking straight ahead
+  (['e4', 'e5', 'e3'], 3), # a pawn moving back
+  (['f3', 'e5', 'g4', 'Qh4', 'Nf3'], 5), # the king left in check
+  (['e4', 'e5', 'Nf3', 'Nc6', 'Bc4', 'Bc5', 'Nxe5', 'Qh4', 'O-O', 'Qxf2', 'O-O'], 11), # castling twice
+]
+
+# Every SAN string that could name a move, parseSAN sorts out which of them a piece of the side to move can play
+def candidateSANs():
+  squares = [f + r for f in 'abcdefgh' for r in '12345678']
+  sans = squares + [f + 'x' + sq for f in 'abcdefgh' for sq in squares]
+  sans += [piece + capture + sq for piece in 'KNBRQ' for capture in ('', 'x') for sq in squares]
+  return sans + ['O-O', 'O-O-O']
+
+# Plays random games and checks, in every position, that the checks of a validated replay accept exactly the legal
+# moves among the moves parseSAN reads from every candidate SAN, then that the illegal games are refused
+# Returns (moves compared, list of failures)
+def checkValidation(games=10, maxPlies=60, seed=0):
+  rng = random.Random(seed)
+  sans = candidateSANs()
+  compared = 0
+  failures = []
+  for game in range(games):
+    board = createBoard()
+    for ply in range(maxPlies):
+      legal = board.getValidMoves()
+      if not legal:
+        break
+      legalIDs = {move.moveID for move in legal}
+      for san in sans:
+        move = parseSAN(board, san)
+        if move is None:
+          continue
+        accepted = isPlayable(board, move)
+        if accepted:
+          board.makeMove(move)
+          accepted = not leftKingAttacked(board)
+          board.undoMove()
+        compared += 1
+        if accepted != (move.moveID in legalIDs):
+          failures.append((board.toFEN(), san, 'accepted' if accepted else 'refused'))
+      board.makeMove(rng.choice(legal))
+  for moves, illegalPly in ILLEGAL_GAMES:
+    try:
+      replay(Game({}, moves), validate=True)
+      failures.append((' '.join(moves), 'accepted'))
+    except ValueError as e:
+      if not str(e).endswith('at ply {}'.format(illegalPly)):
+        failures.append((' '.join(moves), str(e)))
+  return compared, failures
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='PGN import and export')
+  commands = parser.add_subparsers(dest='command', required=True)
+  replayParser = commands.add_parser('replay', help='replays every game of a PGN file')
+  replayParser.add_argument('file')
+  replayParser.add_argument('--validate', action='store_true', help='check that every move is legal')
+  replayParser.add_argument('--backend', default='list', choices=list(BACKENDS))
+  fromLog = commands.add_parser('fromlog', help='converts a selfplay log to PGN')
+  fromLog.add_argument('log')
+  fromLog.add_argument('file')
+  benchParser = commands.add_parser('bench', help='writes random games and times reading them back')
+  benchParser.add_argument('games', type=int, nargs='?', default=1000)
+  check = commands.add_parser('check', help='compares validated replay with the legal move lists in random games')
+  check.add_argument('--games', type=int, default=10)
+  check.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args(argv)
+
+  if args.command == 'replay':
+    printRate(*replayFile(args.file, args.backend, args.validate))
+  elif args.command == 'fromlog':
+    print('wrote {} games'.format(writePGN(args.file, gamesFromLog(args.log))))
+  elif args.command == 'check':
+    start = time.perf_counter()
+    compared, failures = checkValidation(args.games, seed=args.seed)
+    print('{:,} moves compared and {} illegal games in {:.1f}s, {} failures'.format(
+      compared, len(ILLEGAL_GAMES), time.perf_counter() - start, len(failures)))
+    for failure in failures[:10]:
+      print(failure)
+    return 1 if failures else 0
+  else:
+    bench(args.games)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,132 @@
+# Files of packed positions: engine.PACKED_SIZE bytes per position, back to back with no header
+# Files are read through mmap so millions of positions can be scanned without reading the file into memory
+# Usage:
+#   python positions.py pack FENFILE OUTFILE   packs a text file with one FEN per line
+#   python positions.py unpack FILE            prints the FEN of every position
+#   python positions.py bench [COUNT]          writes COUNT random positions and times reading them back
+import mmap
+import os
+import random
+import sys
+import time
+from engine import PACKED_SIZE, createBoard
+
+class PositionFile:
+  def __init__(self, path):
+    self.file = open(path, 'rb')
+    size = os.fstat(self.file.fileno()).st_size
+    if size % PACKED_SIZE:
+      self.file.close()
+      raise ValueError(path + ' is not a whole number of ' + str(PACKED_SIZE) + ' byte positions')
+    self.count = size // PACKED_SIZE
+    # mmap can't map an empty file
+    self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+  def __len__(self):
+    return self.count
+
+  # The packed bytes of position i, only these bytes are read from the mapped file
+  def record(self, i):
+    if not 0 <= i < self.count:
+      raise IndexError('position ' + str(i) + ' out of range')
+    return self.data[i * PACKED_SIZE:(i + 1) * PACKED_SIZE]
+
+  # Yields the packed bytes of every position, the operating system pages the file in as it is read
+  def records(self):
+    data = self.data
+    for offset in range(0, self.count * PACKED_SIZE, PACKED_SIZE):
+      yield data[offset:offset + PACKED_SIZE]
+
+  # Position i as a new Board
+  def board(self, i, backend='list'):
+    board = createBoard(backend)
+    board.loadPacked(self.record(i))
+    return board
+
+  # Yields every position loaded into the same Board, copy anything that has to outlive the next iteration
+  def boards(self, backend='list'):
+    board = createBoard(backend)
+    for record in self.records():
+      board.loadPacked(record)
+      yield board
+
+  def close(self):
+    if self.count:
+      self.data.close()
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+# Writes the boards to a position file, returns the number written
+def writePositions(path, boards):
+  count = 0
+  with open(path, 'wb') as out:
+    for board in boards:
+      out.write(board.pack())
+      count += 1
+  return count
+
+# Packs a text file with one FEN per line, blank lines are skipped
+def packFENFile(fenPath, outPath):
+  board = createBoard()
+  def loaded():
+    with open(fenPath) as fens:
+      for line in fens:
+        if line.strip():
+          board.loadFEN(line)
+          yield board
+  return writePositions(outPath, loaded())
+
+# Random placements of both kings and up to 30 other pieces, for the benchmark
+# They don't have to be legal positions to measure packing and unpacking
+def randomBoards(count, seed=0):
+  rng = random.Random(seed)
+  board = createBoard()
+  others = [10, 11, 12, 13, 14, 18, 19, 20, 21, 22]
+  for i in range(count):
+    squares = rng.sample(range(64), rng.randrange(2, 33))
+    position = [[0 for c in range(8)] for r in range(8)]
+    for n, sq in enumerate(squares):
+      position[sq >> 3][sq & 7] = 9 if n == 0 else 17 if n == 1 else rng.choice(others)
+    board.setPosition(position, rng.random() < 0.5)
+    yield board
+
+def bench(count):
+  path = 'positions_bench.bin'
+  start = time.perf_counter()
+  writePositions(path, randomBoards(count))
+  print('wrote {:,} positions ({:,} bytes) in {:.2f}s'.format(count, os.path.getsize(path), time.perf_counter() - start))
+  with PositionFile(path) as positions:
+    start = time.perf_counter()
+    checksum = 0
+    for record in positions.records():
+      checksum ^= record[0]
+    seconds = time.perf_counter() - start
+    print('raw records: {:,.0f} positions/s'.format(len(positions) / seconds))
+    start = time.perf_counter()
+    for board in positions.boards():
+      pass
+    seconds = time.perf_counter() - start
+    print('decoded into a Board: {:,.0f} positions/s'.format(len(positions) / seconds))
+  os.remove(path)
+
+def main(argv):
+  if len(argv) == 3 and argv[0] == 'pack':
+    print('packed ' + str(packFENFile(argv[1], argv[2])) + ' positions')
+  elif len(argv) == 2 and argv[0] == 'unpack':
+    with PositionFile(argv[1]) as positions:
+      for board in positions.boards():
+        print(board.toFEN())
+  elif argv and argv[0] == 'bench':
+    bench(int(argv[1]) if len(argv) > 1 else 100000)
+  else:
+    print('usage: positions.py pack FENFILE OUTFILE | unpack FILE | bench [COUNT]')
+    return 1
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,211 @@
+# Opt-in instrumentation of the move generator
+# Profiler.enable() replaces the instrumented Board methods (on every backend class that defines them) with timing
+# wrappers and disable() puts the original functions back, so while it is off the engine runs its own code with
+# no checks at all
+# Per method it counts calls and keeps the total time and the time spent outside other instrumented methods, and
+# per call stack the self time, which is exported as JSON, as a pstats file (python -m pstats, snakeviz, gprof2dot)
+# or as collapsed stacks for flamegraph.pl / speedscope
+# Usage: python profiling.py [depth] [--fen FEN] [--backend NAME] [--json FILE] [--pstats FILE] [--collapsed FILE]
+#                            [--log-level LEVEL]
+import argparse
+import importlib
+import json
+import logging
+import marshal
+import sys
+import time
+from contextlib import contextmanager
+from bench import measure
+from engine import BACKENDS, createBoard
+from perft import START_FEN, perft
+
+# Methods wrapped when they are defined by a backend class
+INSTRUMENTED = [
+  'getValidMoves', 'generateValidMoves', 'generateAllMoves', 'generatePawnMoves', 'generatePawnBitboardMoves',
+  'generatePawnMailboxMoves', 'generateKnightMoves', 'generateSlidingMoves', 'generateDiagonalMoves', 'generateKingMoves', 'enemyAttacks',
+  'lookForChecksPins', 'isAttacked', 'makeMove', 'undoMove',
+]
+
+def backendClasses():
+  return [getattr(importlib.import_module(module), name) for module, name in BACKENDS.values()]
+
+class Profiler:
+  def __init__(self, classes=None, methods=INSTRUMENTED):
+    self.classes = classes
+    self.methods = methods
+    self.originals = [] # (class, name, function) to put back
+    self.functions = {} # label -> original function, for file and line numbers
+    self.reset()
+
+  def reset(self):
+    self.stats = {} # name -> [calls, total seconds, self seconds]
+    self.edges = {} # (caller, callee) -> [calls, total seconds, self seconds]
+    self.paths = {} # 'a;b;c' -> self seconds
+    self.stack = [] # [name, seconds spent in instrumented callees] of the calls in progress
+
+  def enable(self):
+    if self.originals:
+      return
+    wrapped = set() # names wrapped on an earlier class by this call, the same labels every time it is enabled
+    for cls in self.classes or backendClasses():
+      for name in self.methods:
+        function = cls.__dict__.get(name)
+        if function is not None:
+          # A method also defined by an earlier class (a base class an override calls) is labelled with its class
+          label = cls.__name__ + '.' + name if name in wrapped else name
+          wrapped.add(name)
+          self.originals.append((cls, name, function))
+          self.functions[label] = function
+          setattr(cls, name, self.wrap(label, function))
+
+  def disable(self):
+    for cls, name, function in self.originals:
+      setattr(cls, name, function)
+    self.originals = []
+
+  @contextmanager
+  def enabled(self):
+    self.enable()
+    try:
+      yield self
+    finally:
+      self.disable()
+
+  def wrap(self, name, function):
+    profiler = self
+    clock = time.perf_counter
+    def wrapper(*args, **kwargs):
+      stack = profiler.stack
+      frame = [name, 0.0]
+      stack.append(frame)
+      start = clock()
+      try:
+        return function(*args, **kwargs)
+      finally:
+        elapsed = clock() - start
+        stack.pop()
+        profiler.record(name, elapsed, elapsed - frame[1])
+        if stack:
+          stack[-1][1] += elapsed
+    wrapper.__wrapped__ = function
+    wrapper.__name__ = function.__name__
+    return wrapper
+
+  # Called after every instrumented call with the call already popped off the stack
+  def record(self, name, elapsed, selfTime):
+    stat = self.stats.get(name)
+    if stat is None:
+      stat = self.stats[name] = [0, 0.0, 0.0]
+    stat[0] += 1
+    stat[1] += elapsed
+    stat[2] += selfTime
+    caller = self.stack[-1][0] if self.stack else None
+    edge = self.edges.get((caller, name))
+    if edge is None:
+      edge = self.edges[(caller, name)] = [0, 0.0, 0.0]
+    edge[0] += 1
+    edge[1] += elapsed
+    edge[2] += selfTime
+    path = ';'.join([frame[0] for frame in self.stack] + [name])
+    self.paths[path] = self.paths.get(path, 0.0) + selfTime
+
+  def toJSON(self):
+    return {
+      'methods': {name: {'calls': calls, 'seconds': total, 'selfSeconds': selfTime}
+                  for name, (calls, total, selfTime) in self.stats.items()},
+      'stacks': self.paths,
+    }
+
+  def writeJSON(self, path):
+    with open(path, 'w') as out:
+      json.dump(self.toJSON(), out, indent=2)
+
+  # Collapsed stacks, one 'a;b;c microseconds' line per call stack
+  def writeCollapsed(self, path):
+    with open(path, 'w') as out:
+      for stack, seconds in sorted(self.paths.items()):
+        out.write('{} {}\n'.format(stack, round(seconds * 1e6)))
+
+  # The marshalled dict pstats.Stats reads: (file, line, name) -> (primitive calls, calls, self time, total time, callers)
+  def writePstats(self, path):
+    keys = {}
+    for label, function in self.functions.items():
+      code = function.__code__
+      keys[label] = (code.co_filename, code.co_firstlineno, label)
+    stats = {}
+    for name, (calls, total, selfTime) in self.stats.items():
+      callers = {keys[caller]: (edge[0], edge[0], edge[2], edge[1])
+                 for (caller, callee), edge in self.edges.items() if callee == name and caller is not None}
+      stats[keys[name]] = (calls, calls, selfTime, total, callers)
+    with open(path, 'wb') as out:
+      marshal.dump(stats, out)
+
+  def report(self):
+    lines = ['{:<26} {:>10} {:>10} {:>10} {:>10}'.format('method', 'calls', 'total ms', 'self ms', 'us/call')]
+    for name, (calls, total, selfTime) in sorted(self.stats.items(), key=lambda item: -item[1][2]):
+      lines.append('{:<26} {:>10,} {:>10.1f} {:>10.1f} {:>10.2f}'.format(name, calls, total * 1000, selfTime * 1000, total * 1e6 / calls))
+    return '\n'.join(lines)
+
+# Log records as one JSON object per line with the fields passed in extra
+class JSONFormatter(logging.Formatter):
+  STANDARD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+  def format(self, record):
+    data = {'time': record.created, 'level': record.levelname, 'logger': record.name, 'message': record.getMessage()}
+    for key, value in vars(record).items():
+      if key not in self.STANDARD:
+        data[key] = value
+    return json.dumps(data, default=str)
+
+def configureLogging(level='DEBUG', stream=None):
+  handler = logging.StreamHandler(stream or sys.stderr)
+  handler.setFormatter(JSONFormatter())
+  logger = logging.getLogger('engine')
+  logger.addHandler(handler)
+  logger.setLevel(level)
+  return handler
+
+# Perft nodes per second without instrumentation, with it and after turning it off again
+def measureOverhead(board, depth, seconds=1.0):
+  rates = []
+  profiler = Profiler(type(board).__mro__[:-1])
+  for phase in ('off', 'on', 'off again'):
+    if phase == 'on':
+      profiler.enable()
+    rates.append((phase, measure(lambda: perft(board, depth), seconds)))
+    profiler.disable()
+  return rates
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Runs perft with the move generator instrumented')
+  parser.add_argument('depth', type=int, nargs='?', default=3)
+  parser.add_argument('--fen', default=START_FEN)
+  parser.add_argument('--backend', default='list', choices=list(BACKENDS))
+  parser.add_argument('--json', help='write the stats as JSON')
+  parser.add_argument('--pstats', help='write the stats as a pstats file')
+  parser.add_argument('--collapsed', help='write collapsed stacks for flame graphs')
+  parser.add_argument('--log-level', help='log the move generator as JSON lines on stderr, ex: DEBUG')
+  args = parser.parse_args(argv)
+  if args.log_level:
+    configureLogging(args.log_level)
+
+  board = createBoard(args.backend, args.fen)
+  profiler = Profiler(type(board).__mro__[:-1])
+  with profiler.enabled():
+    start = time.perf_counter()
+    nodes = perft(board, args.depth)
+    seconds = time.perf_counter() - start
+  print('perft {}: {:,} nodes in {:.2f}s'.format(args.depth, nodes, seconds))
+  print(profiler.report())
+  for phase, rate in measureOverhead(board, args.depth):
+    print('instrumentation {}: {:,.0f} nodes/s'.format(phase, rate))
+  if args.json:
+    profiler.writeJSON(args.json)
+  if args.pstats:
+    profiler.writePstats(args.pstats)
+  if args.collapsed:
+    profiler.writeCollapsed(args.collapsed)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
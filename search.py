@@ -0,0 +1,460 @@
+# Alpha-beta search on top of engine.Board
+# Negamax with iterative deepening, a fixed size transposition table and move ordering from
+# the transposition table move, MVV-LVA for captures, killer moves and the history heuristic
+# Usage: python search.py [--fen FEN] [--time SECONDS] [--nodes N] [--depth N] [--hash MB] [--backend NAME]
+#                        [--book FILE]
+#        python search.py --suite [--backend NAME]   searches the positions of POSITIONS and checks the best moves
+import sys
+import time
+from array import array
+from engine import BACKENDS, createBoard
+from perft import START_FEN, moveName
+
+MATE = 100000 # Score of being mated at the root, mates further away score closer to 0
+INFINITY = 1000000
+MAX_PLY = 128
+
+# Material values indexed by the piece type (piece & 7): -, King, Pawn, Knight, Bishop, Rook, Queen
+PIECE_VALUES = [0, 0, 100, 320, 330, 500, 900]
+# Used only for ordering, the king as the attacker is tried last
+ORDER_VALUES = [0, 2000, 100, 320, 330, 500, 900]
+
+# Piece square tables from white's point of view, index row * 8 + col with row 0 being rank 8
+# Black uses the same tables mirrored vertically
+PAWN_TABLE = [
+   0,  0,  0,  0,  0,  0,  0,  0,
+  50, 50, 50, 50, 50, 50, 50, 50,
+  10, 10, 20, 30, 30, 20, 10, 10,
+   5,  5, 10, 25, 25, 10,  5,  5,
+   0,  0,  0, 20, 20,  0,  0,  0,
+   5, -5,-10,  0,  0,-10, -5,  5,
+   5, 10, 10,-20,-20, 10, 10,  5,
+   0,  0,  0,  0,  0,  0,  0,  0
+]
+KNIGHT_TABLE = [
+  -50,-40,-30,-30,-30,-30,-40,-50,
+  -40,-20,  0,  0,  0,  0,-20,-40,
+  -30,  0, 10, 15, 15, 10,  0,-30,
+  -30,  5, 15, 20, 20, 15,  5,-30,
+  -30,  0, 15, 20, 20, 15,  0,-30,
+  -30,  5, 10, 15, 15, 10,  5,-30,
+  -40,-20,  0,  5,  5,  0,-20,-40,
+  -50,-40,-30,-30,-30,-30,-40,-50
+]
+BISHOP_TABLE = [
+  -20,-10,-10,-10,-10,-10,-10,-20,
+  -10,  0,  0,  0,  0,  0,  0,-10,
+  -10,  0,  5, 10, 10,  5,  0,-10,
+  -10,  5,  5, 10, 10,  5,  5,-10,
+  -10,  0, 10, 10, 10, 10,  0,-10,
+  -10, 10, 10, 10, 10, 10, 10,-10,
+  -10,  5,  0,  0,  0,  0,  5,-10,
+  -20,-10,-10,-10,-10,-10,-10,-20
+]
+ROOK_TABLE = [
+   0,  0,  0,  0,  0,  0,  0,  0,
+   5, 10, 10, 10, 10, 10, 10,  5,
+  -5,  0,  0,  0,  0,  0,  0, -5,
+  -5,  0,  0,  0,  0,  0,  0, -5,
+  -5,  0,  0,  0,  0,  0,  0, -5,
+  -5,  0,  0,  0,  0,  0,  0, -5,
+  -5,  0,  0,  0,  0,  0,  0, -5,
+   0,  0,  0,  5,  5,  0,  0,  0
+]
+QUEEN_TABLE = [
+  -20,-10,-10, -5, -5,-10,-10,-20,
+  -10,  0,  0,  0,  0,  0,  0,-10,
+  -10,  0,  5,  5,  5,  5,  0,-10,
+   -5,  0,  5,  5,  5,  5,  0, -5,
+    0,  0,  5,  5,  5,  5,  0, -5,
+  -10,  5,  5,  5,  5,  5,  0,-10,
+  -10,  0,  5,  0,  0,  0,  0,-10,
+  -20,-10,-10, -5, -5,-10,-10,-20
+]
+KING_TABLE = [
+  -30,-40,-40,-50,-50,-40,-40,-30,
+  -30,-40,-40,-50,-50,-40,-40,-30,
+  -30,-40,-40,-50,-50,-40,-40,-30,
+  -30,-40,-40,-50,-50,-40,-40,-30,
+  -20,-30,-30,-40,-40,-30,-30,-20,
+  -10,-20,-20,-20,-20,-20,-20,-10,
+   20, 20,  0,  0,  0,  0, 20, 20,
+   20, 30, 10,  0,  0, 10, 30, 20
+]
+# Indexed by piece type like PIECE_VALUES
+PIECE_TABLES = [None, KING_TABLE, PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE]
+
+# Static evaluation in centipawns from the point of view of the side to move
+def evaluate(board):
+  score = 0
+  for r in range(8):
+    row = board.board[r]
+    for c in range(8):
+      piece = row[c]
+      if piece != 0:
+        pieceType = piece & 7
+        if piece & 8: # White
+          score += PIECE_VALUES[pieceType] + PIECE_TABLES[pieceType][r * 8 + c]
+        else: # Black, mirrored
+          score -= PIECE_VALUES[pieceType] + PIECE_TABLES[pieceType][(7 - r) * 8 + c]
+  return score if board.whiteToMove else -score
+
+# Transposition table bound types
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# Fixed size hash table of search results indexed by the low bits of the Zobrist hash
+# The entries live in flat typed arrays so the memory used is fixed when the table is created
+class TranspositionTable:
+  # key (8) + score (4) + move id (2) + depth (1) + bound (1) + generation (1)
+  ENTRY_BYTES = 17
+
+  def __init__(self, megabytes=16):
+    # The number of entries is the largest power of 2 that fits the budget so the index is a mask
+    entries = 1
+    while entries * 2 * self.ENTRY_BYTES <= megabytes * 1024 * 1024:
+      entries *= 2
+    self.size = entries
+    self.mask = entries - 1
+    self.keys = array('Q', bytes(8 * entries))
+    self.scores = array('i', bytes(4 * entries))
+    # Unsigned, the ids of underpromotions go past 32767
+    self.moves = array('H', bytes(2 * entries))
+    self.depths = array('b', bytes(entries))
+    self.bounds = array('b', bytes(entries))
+    self.generations = array('B', bytes(entries))
+    # Entries written by earlier searches are always replaceable, generation 0 marks a slot that was never written
+    self.generation = 1
+
+  # Called at the start of every search so entries from older searches can be told apart
+  def newSearch(self):
+    self.generation = self.generation % 255 + 1
+
+  # Returns (depth, score, bound, moveID) or None
+  def probe(self, key):
+    i = key & self.mask
+    if self.keys[i] != key or self.generations[i] == 0:
+      return None
+    return self.depths[i], self.scores[i], self.bounds[i], self.moves[i]
+
+  # Replacement policy: the slot is overwritten if it holds the same position, was written by an older search
+  # or the new result is searched at least as deep, so deep results of the current search survive
+  def store(self, key, depth, score, bound, moveID):
+    i = key & self.mask
+    if self.keys[i] == key or self.generations[i] != self.generation or depth >= self.depths[i]:
+      self.keys[i] = key
+      self.scores[i] = score
+      self.moves[i] = moveID
+      self.depths[i] = depth
+      self.bounds[i] = bound
+      self.generations[i] = self.generation
+
+  def clear(self):
+    for i in range(self.size):
+      self.generations[i] = 0
+
+  # Permille of a sample of entries written by the current search
+  def hashfull(self):
+    sample = min(1000, self.size)
+    used = sum(1 for i in range(sample) if self.generations[i] == self.generation)
+    return used * 1000 // sample
+
+  def megabytes(self):
+    return self.size * self.ENTRY_BYTES / (1024 * 1024)
+
+# Raised inside the search when the time or node budget runs out
+class SearchStopped(Exception):
+  pass
+
+# The result of one iterative deepening iteration
+class SearchInfo:
+  def __init__(self, depth, score, bestMove, pv, nodes, iterationNodes, seconds, ebf):
+    self.depth = depth
+    self.score = score
+    self.bestMove = bestMove
+    self.pv = pv
+    self.nodes = nodes # Total nodes searched so far
+    self.iterationNodes = iterationNodes # Nodes searched by this iteration
+    self.seconds = seconds
+    self.ebf = ebf # Effective branching factor: nodes of this iteration / nodes of the previous one
+
+  def nps(self):
+    return self.nodes / self.seconds if self.seconds > 0 else 0
+
+  def __str__(self):
+    return 'depth {} score {} nodes {:,} nps {:,.0f} ebf {:.2f} time {:.2f}s pv {}'.format(
+      self.depth, self.score, self.nodes, self.nps(), self.ebf, self.seconds, ' '.join(moveName(m) for m in self.pv))
+
+class Search:
+  def __init__(self, hashMegabytes=16):
+    self.tt = TranspositionTable(hashMegabytes)
+    self.killers = [[0, 0] for i in range(MAX_PLY)] # Two quiet move ids per ply that caused a beta cutoff
+    self.history = {} # (pieceMoved, endSquare): score of quiet moves that caused cutoffs
+    self.nodes = 0
+    self.stopTime = None
+    self.nodeLimit = None
+    self.stop = None
+
+  # Searches the position with iterative deepening until maxDepth, the time limit (seconds) or the node limit
+  # report is called with a SearchInfo after every completed iteration
+  # stop is called every 1024 nodes and ends the search as soon as it returns True, even in the first iteration
+  # Returns the list of SearchInfo, the last one holds the best move
+  def search(self, board, maxDepth=MAX_PLY - 1, timeLimit=None, nodeLimit=None, report=None, stop=None):
+    self.stop = stop
+    self.tt.newSearch()
+    self.killers = [[0, 0] for i in range(MAX_PLY)]
+    # Old history is kept but halved so the new search can overrule it
+    for k in self.history:
+      self.history[k] //= 2
+    self.nodes = 0
+    start = time.perf_counter()
+    deadline = start + timeLimit if timeLimit is not None else None
+
+    infos = []
+    logLength = len(board.moveLog)
+    previousNodes = 0
+    for depth in range(1, maxDepth + 1):
+      # The first iteration always finishes so there is a move to play however small the budget is
+      self.stopTime = deadline if depth > 1 else None
+      self.nodeLimit = nodeLimit if depth > 1 else None
+      iterationStart = self.nodes
+      try:
+        score, bestMove = self.searchRoot(board, depth)
+      except SearchStopped:
+        # Unwind the moves the interrupted iteration left on the board
+        while len(board.moveLog) > logLength:
+          board.undoMove()
+        break
+      if bestMove is None: # No legal moves
+        break
+      iterationNodes = self.nodes - iterationStart
+      info = SearchInfo(depth, score, bestMove, self.principalVariation(board, depth), self.nodes, iterationNodes,
+                        time.perf_counter() - start, iterationNodes / previousNodes if previousNodes else 0)
+      previousNodes = iterationNodes
+      infos.append(info)
+      if report:
+        report(info)
+      if abs(score) >= MATE - MAX_PLY: # A forced mate was found, deeper searches can't improve on it
+        break
+    return infos
+
+  def checkBudget(self):
+    if self.nodeLimit is not None and self.nodes >= self.nodeLimit:
+      raise SearchStopped()
+    if self.nodes & 1023 == 0:
+      if self.stopTime is not None and time.perf_counter() >= self.stopTime:
+        raise SearchStopped()
+      if self.stop is not None and self.stop():
+        raise SearchStopped()
+
+  def searchRoot(self, board, depth):
+    moves = board.getValidMoves()
+    if not moves:
+      return (-MATE if board.inCheck else 0), None
+    entry = self.tt.probe(board.hash)
+    moves = self.orderMoves(moves, entry[3] if entry else -1, 0)
+    alpha = -INFINITY
+    bestMove = None
+    for move in moves:
+      board.makeMove(move)
+      score = -self.negamax(board, depth - 1, -INFINITY, -alpha, 1)
+      board.undoMove()
+      if score > alpha:
+        alpha = score
+        bestMove = move
+    self.tt.store(board.hash, depth, alpha, EXACT, bestMove.moveID)
+    return alpha, bestMove
+
+  def negamax(self, board, depth, alpha, beta, ply):
+    if depth <= 0 or ply >= MAX_PLY - 1:
+      return self.quiesce(board, alpha, beta, ply)
+    self.nodes += 1
+    self.checkBudget()
+    # Repeating a position once is already a draw for the search, playing for the third time can't do better,
+    # and the transposition table can't know how a position was reached so this comes first
+    if board.halfmoveClock >= 100 or board.repetitionCount() > 1:
+      return 0
+
+    key = board.hash
+    ttMoveID = -1
+    entry = self.tt.probe(key)
+    if entry:
+      ttDepth, ttScore, bound, ttMoveID = entry
+      if ttDepth >= depth:
+        ttScore = scoreFromTT(ttScore, ply)
+        if bound == EXACT:
+          return ttScore
+        if bound == LOWER and ttScore >= beta:
+          return ttScore
+        if bound == UPPER and ttScore <= alpha:
+          return ttScore
+
+    moves = board.getValidMoves()
+    if not moves:
+      return -MATE + ply if board.inCheck else 0 # Checkmate or stalemate
+
+    alphaStart = alpha
+    best = -INFINITY
+    bestMove = None
+    for move in self.orderMoves(moves, ttMoveID, ply):
+      board.makeMove(move)
+      score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+      board.undoMove()
+      if score > best:
+        best = score
+        bestMove = move
+        if score > alpha:
+          alpha = score
+          if alpha >= beta:
+            if move.pieceCaptured == 0 and not move.promotion:
+              self.rememberCutoff(move, depth, ply)
+            break
+
+    if best <= alphaStart:
+      bound = UPPER
+    elif best >= beta:
+      bound = LOWER
+    else:
+      bound = EXACT
+    self.tt.store(key, depth, scoreToTT(best, ply), bound, bestMove.moveID)
+    return best
+
+  # Only captures and queen promotions are searched until the position is quiet so the evaluation isn't taken in the middle of an exchange
+  def quiesce(self, board, alpha, beta, ply):
+    self.nodes += 1
+    self.checkBudget()
+    moves = board.getValidMoves()
+    if not moves:
+      return -MATE + ply if board.inCheck else 0 # Checkmate or stalemate at the horizon
+    standPat = evaluate(board)
+    if standPat >= beta or ply >= MAX_PLY - 1:
+      return standPat
+    if standPat > alpha:
+      alpha = standPat
+    captures = [move for move in moves if move.pieceCaptured != 0 or move.promotion & 7 == 6]
+    captures.sort(key=mvvLva, reverse=True)
+    for move in captures:
+      board.makeMove(move)
+      score = -self.quiesce(board, -beta, -alpha, ply + 1)
+      board.undoMove()
+      if score >= beta:
+        return score
+      if score > alpha:
+        alpha = score
+    return alpha
+
+  # A quiet move that caused a cutoff becomes a killer for this ply and gains history
+  def rememberCutoff(self, move, depth, ply):
+    killers = self.killers[ply]
+    if killers[0] != move.moveID:
+      killers[1] = killers[0]
+      killers[0] = move.moveID
+    key = (move.pieceMoved, move.endRow * 8 + move.endCol)
+    self.history[key] = self.history.get(key, 0) + depth * depth
+
+  # Transposition table move first, then captures and promotions by MVV-LVA, then killers, then quiet moves by history
+  def orderMoves(self, moves, ttMoveID, ply):
+    killers = self.killers[ply]
+    history = self.history
+    def priority(move):
+      if move.moveID == ttMoveID:
+        return 3000000
+      if move.pieceCaptured != 0 or move.promotion:
+        return 2000000 + mvvLva(move)
+      if move.moveID == killers[0]:
+        return 1000002
+      if move.moveID == killers[1]:
+        return 1000001
+      return history.get((move.pieceMoved, move.endRow * 8 + move.endCol), 0)
+    return sorted(moves, key=priority, reverse=True)
+
+  # Follows the best moves stored in the transposition table
+  def principalVariation(self, board, depth):
+    pv = []
+    for i in range(depth):
+      entry = self.tt.probe(board.hash)
+      if not entry:
+        break
+      move = next((m for m in board.getValidMoves() if m.moveID == entry[3]), None)
+      if move is None:
+        break
+      pv.append(move)
+      board.makeMove(move)
+    for move in pv:
+      board.undoMove()
+    return pv
+
+# Most valuable victim, least valuable attacker
+# A promotion adds the value of the piece it promotes to
+def mvvLva(move):
+  return (ORDER_VALUES[move.pieceCaptured & 7] + ORDER_VALUES[move.promotion & 7]) * 10 - ORDER_VALUES[move.pieceMoved & 7] // 10
+
+# Mate scores are stored relative to the node so they stay correct when the position is reached at another ply
+def scoreToTT(score, ply):
+  if score >= MATE - MAX_PLY:
+    return score + ply
+  if score <= -MATE + MAX_PLY:
+    return score - ply
+  return score
+
+def scoreFromTT(score, ply):
+  if score >= MATE - MAX_PLY:
+    return score - ply
+  if score <= -MATE + MAX_PLY:
+    return score + ply
+  return score
+
+# Positions with one right move at the given depth: (name, FEN, depth, best move)
+POSITIONS = [
+  ('mate at depth 1', 'k7/8/1K6/8/8/8/8/2Q5 w - - 0 1', 1, 'c1c8'),
+  ('mate at depth 1 (black)', '2q5/8/8/8/8/1k6/8/K7 b - - 0 1', 1, 'c8c1'),
+  ('mate at depth 2', 'k7/8/1K6/8/8/8/8/2Q5 w - - 0 1', 2, 'c1c8'),
+]
+
+# Searches every position of POSITIONS, returns the number of wrong best moves
+def runSuite(backend):
+  failures = 0
+  for name, fen, depth, expected in POSITIONS:
+    infos = Search(1).search(createBoard(backend, fen), depth)
+    found = moveName(infos[-1].bestMove) if infos else None
+    ok = found == expected
+    if not ok:
+      failures += 1
+    print('{:<24} depth {} {:<4} expected {}, found {} (score {})'.format(
+      name, depth, 'ok' if ok else 'FAIL', expected, found, infos[-1].score if infos else None))
+  print(str(failures) + ' failures')
+  return failures
+
+def main(argv):
+  import argparse
+  parser = argparse.ArgumentParser(description='Searches a position for the best move')
+  parser.add_argument('--fen', default=START_FEN)
+  parser.add_argument('--time', type=float, default=None, help='time budget in seconds')
+  parser.add_argument('--nodes', type=int, default=None, help='node budget')
+  parser.add_argument('--depth', type=int, default=None)
+  parser.add_argument('--hash', type=int, default=16, help='transposition table size in MB')
+  parser.add_argument('--backend', default='list', choices=list(BACKENDS))
+  parser.add_argument('--book', default=None, help='opening book file, a book move is played without searching')
+  parser.add_argument('--suite', action='store_true', help='search the positions of POSITIONS and check the best moves')
+  args = parser.parse_args(argv)
+  if args.suite:
+    return 1 if runSuite(args.backend) else 0
+  if args.time is None and args.nodes is None and args.depth is None:
+    args.time = 5.0
+
+  board = createBoard(args.backend, args.fen)
+  if args.book:
+    from book import OpeningBook
+    with OpeningBook(args.book) as book:
+      move = book.bookMove(board)
+    if move is not None:
+      print('bestmove ' + moveName(move) + ' (book)')
+      return 0
+  search = Search(args.hash)
+  infos = search.search(board, args.depth or MAX_PLY - 1, args.time, args.nodes, report=print)
+  if infos:
+    print('bestmove ' + moveName(infos[-1].bestMove))
+  print('hash: {:.1f}MB, {:,} entries, {} permille used'.format(search.tt.megabytes(), search.tt.size, search.tt.hashfull()))
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,122 @@
+# Headless engine vs engine games for throughput and stability testing
+# Games are played with engine.Board only, in worker processes, and every finished game is
+# appended to the log as soon as it comes back
+# Usage: python selfplay.py [--games N] [--workers N] [--white NAME] [--black NAME] [--max-plies N]
+#                           [--seed N] [--log FILE] [--backend NAME]
+# Log format, one line per game: index result plies milliseconds getValidMoves-milliseconds moves...
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from engine import BACKENDS, createBoard
+from perft import moveName
+
+# Move selectors get the board, its legal moves and a random generator and return the move to play
+def selectRandom(board, moves, rng):
+  return rng.choice(moves)
+
+def selectFirst(board, moves, rng):
+  return moves[0]
+
+# Takes the most valuable piece it can, otherwise plays a random move
+def selectCapture(board, moves, rng):
+  captures = [move for move in moves if move.pieceCaptured != 0]
+  if captures:
+    # The piece type codes go up with the value of the piece, from pawn (2) to queen (6)
+    return max(captures, key=lambda move: move.pieceCaptured & 7)
+  return rng.choice(moves)
+
+# A small fixed node search
+def selectSearch(board, moves, rng):
+  from search import Search
+  infos = Search(1).search(board, nodeLimit=300)
+  return infos[-1].bestMove if infos else rng.choice(moves)
+
+SELECTORS = {
+  'random': selectRandom,
+  'first': selectFirst,
+  'capture': selectCapture,
+  'search': selectSearch,
+}
+
+# Plays one game and returns its record
+# (index, result, plies, seconds, seconds inside getValidMoves, moves in long algebraic notation)
+def playGame(task):
+  index, white, black, seed, maxPlies, backend = task
+  rng = random.Random(seed)
+  board = createBoard(backend)
+  selectors = (SELECTORS[white], SELECTORS[black])
+  moveGenSeconds = 0
+  start = time.perf_counter()
+  result = '*' # Unfinished when the ply limit is reached
+  for ply in range(maxPlies):
+    t = time.perf_counter()
+    moves = board.getValidMoves()
+    moveGenSeconds += time.perf_counter() - t
+    if not moves:
+      if board.inCheck:
+        result = '0-1' if board.whiteToMove else '1-0'
+      else:
+        result = '1/2-1/2'
+      break
+    if board.isThreefoldRepetition() or board.isFiftyMoveDraw():
+      result = '1/2-1/2'
+      break
+    board.makeMove(selectors[ply % 2](board, moves, rng))
+  return (index, result, len(board.moveLog), time.perf_counter() - start, moveGenSeconds,
+          [moveName(move) for move in board.moveLog])
+
+def formatRecord(record):
+  index, result, plies, seconds, moveGenSeconds, moves = record
+  return '{} {} {} {:.0f} {:.0f} {}'.format(index, result, plies, seconds * 1000, moveGenSeconds * 1000, ' '.join(moves))
+
+# Yields game records as they finish, in completion order
+def runGames(tasks, workers):
+  if workers <= 1:
+    for task in tasks:
+      yield playGame(task)
+    return
+  with ProcessPoolExecutor(max_workers=workers) as pool:
+    for future in as_completed([pool.submit(playGame, task) for task in tasks]):
+      yield future.result()
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Plays engine vs engine games without a window')
+  parser.add_argument('--games', type=int, default=100)
+  parser.add_argument('--workers', type=int, default=os.cpu_count())
+  parser.add_argument('--white', default='random', choices=list(SELECTORS))
+  parser.add_argument('--black', default='random', choices=list(SELECTORS))
+  parser.add_argument('--max-plies', type=int, default=300)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--log', default='selfplay.log')
+  parser.add_argument('--backend', default='list', choices=list(BACKENDS))
+  args = parser.parse_args(argv)
+
+  tasks = [(i, args.white, args.black, args.seed + i, args.max_plies, args.backend) for i in range(args.games)]
+  results = {}
+  plies = 0
+  gameSeconds = 0
+  moveGenSeconds = 0
+  start = time.perf_counter()
+  with open(args.log, 'w') as log:
+    for record in runGames(tasks, args.workers):
+      log.write(formatRecord(record) + '\n')
+      log.flush()
+      results[record[1]] = results.get(record[1], 0) + 1
+      plies += record[2]
+      gameSeconds += record[3]
+      moveGenSeconds += record[4]
+  seconds = time.perf_counter() - start
+
+  print('{} games in {:.2f}s with {} workers: {:.1f} games/s'.format(args.games, seconds, args.workers, args.games / seconds))
+  print('average plies: {:.1f}'.format(plies / args.games if args.games else 0))
+  print('results: ' + ', '.join('{} {}'.format(result, count) for result, count in sorted(results.items())))
+  if gameSeconds:
+    print('getValidMoves: {:.2f}s of {:.2f}s game time ({:.0f}%)'.format(moveGenSeconds, gameSeconds, moveGenSeconds * 100 / gameSeconds))
+  print('log: ' + args.log)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,195 @@
+# Asyncio game server, one engine.Board per game
+# Clients speak JSON lines over TCP:
+#   {"op": "join", "game": "name"}   first two clients of a game play white and black, the others watch
+#   {"op": "move", "move": "e2e4"}   a move in long algebraic notation for the game joined
+#   {"op": "stats"}                  latency percentiles of this game and of the whole server
+# Moves are broadcast to everyone in the game as small deltas ({"op": "moved", "move": "e2e4", ...}), boards are
+# only sent as FEN when a client joins: "fen" is the current position, "startFen" the one the game started from and
+# "moves" the moves played since, so a client can rebuild the game with its history
+# The legal moves of every game are generated in a worker thread right after each move so validating the next move
+# is a set lookup and the event loop never runs move generation itself
+# Usage: python server.py [--host HOST] [--port PORT] [--backend NAME]
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from engine import BACKENDS, createBoard
+from perft import moveName
+
+# Keeps the last samples of a latency and reports percentiles over them
+class LatencyStats:
+  def __init__(self, size=5000):
+    self.samples = deque(maxlen=size)
+    self.count = 0
+
+  def record(self, seconds):
+    self.samples.append(seconds)
+    self.count += 1
+
+  # Percentiles in milliseconds
+  def percentiles(self, points=(50, 90, 99)):
+    ordered = sorted(self.samples)
+    result = {'count': self.count}
+    for point in points:
+      result['p' + str(point)] = round(ordered[min(len(ordered) - 1, len(ordered) * point // 100)] * 1000, 3) if ordered else None
+    return result
+
+class Game:
+  def __init__(self, name, backend, executor):
+    self.name = name
+    self.board = createBoard(backend)
+    self.startFEN = self.board.toFEN()
+    self.executor = executor
+    self.players = {'w': None, 'b': None}
+    self.watchers = set()
+    self.latency = LatencyStats()
+    # Every use of the board waits for the lock and for the legal moves of the position to be ready
+    self.lock = asyncio.Lock()
+    self.ready = self.prepareMoves()
+
+  # Generates the legal moves of the current position in a worker thread, they are cached on the board
+  def prepareMoves(self):
+    return asyncio.get_running_loop().run_in_executor(self.executor, self.board.getValidMoves)
+
+  def clients(self):
+    return [writer for writer in self.players.values() if writer is not None] + list(self.watchers)
+
+  def colorOf(self, writer):
+    for color, player in self.players.items():
+      if player is writer:
+        return color
+    return None
+
+  def status(self):
+    if not self.board.getValidMoves(): # cached
+      return 'checkmate' if self.board.inCheck else 'stalemate'
+    if self.board.isThreefoldRepetition():
+      return 'repetition'
+    if self.board.isFiftyMoveDraw():
+      return 'fifty moves'
+    return None
+
+class GameServer:
+  def __init__(self, backend='list', threads=4):
+    self.backend = backend
+    self.executor = ThreadPoolExecutor(max_workers=threads)
+    self.games = {}
+    self.latency = LatencyStats()
+
+  async def start(self, host='127.0.0.1', port=8765):
+    self.server = await asyncio.start_server(self.handleClient, host, port)
+    return self.server
+
+  def send(self, writer, message):
+    writer.write((json.dumps(message, separators=(',', ':')) + '\n').encode())
+
+  async def handleClient(self, reader, writer):
+    game = None
+    try:
+      while True:
+        line = await reader.readline()
+        if not line:
+          break
+        start = time.perf_counter()
+        try:
+          message = json.loads(line)
+          op = message.get('op')
+          if op == 'join':
+            game = await self.join(writer, message, game)
+          elif op == 'move':
+            await self.move(writer, message, game)
+          elif op == 'stats':
+            self.send(writer, self.stats(game))
+          else:
+            self.send(writer, {'op': 'error', 'error': 'unknown op ' + repr(op)})
+        except (ValueError, AttributeError) as e:
+          self.send(writer, {'op': 'error', 'error': str(e)})
+        await writer.drain()
+        seconds = time.perf_counter() - start
+        self.latency.record(seconds)
+        if game is not None:
+          game.latency.record(seconds)
+    except ConnectionError:
+      pass
+    finally:
+      self.leave(writer, game)
+      writer.close()
+
+  async def join(self, writer, message, current):
+    if current is not None:
+      raise ValueError('already in game ' + current.name)
+    name = str(message.get('game', 'default'))
+    if name not in self.games:
+      self.games[name] = Game(name, self.backend, self.executor)
+    game = self.games[name]
+    async with game.lock:
+      await game.ready
+      color = 'watch'
+      for side in ('w', 'b'):
+        if game.players[side] is None:
+          game.players[side] = writer
+          color = side
+          break
+      if color == 'watch':
+        game.watchers.add(writer)
+      self.send(writer, {'op': 'joined', 'game': name, 'color': color, 'fen': game.board.toFEN(),
+                         'startFen': game.startFEN, 'moves': [moveName(move) for move in game.board.moveLog], 'status': game.status()})
+    return game
+
+  async def move(self, writer, message, game):
+    if game is None:
+      raise ValueError('join a game first')
+    async with game.lock:
+      await game.ready
+      board = game.board
+      color = game.colorOf(writer)
+      if color != ('w' if board.whiteToMove else 'b'):
+        raise ValueError('not your turn')
+      move = board.findMove(str(message.get('move', '')))
+      if move is None:
+        raise ValueError('illegal move ' + repr(message.get('move')))
+      board.makeMove(move)
+      game.ready = game.prepareMoves()
+      await game.ready
+      delta = {'op': 'moved', 'game': game.name, 'move': moveName(move), 'ply': len(board.moveLog), 'status': game.status()}
+      for client in game.clients():
+        self.send(client, delta)
+
+  def leave(self, writer, game):
+    if game is None:
+      return
+    for color in game.players:
+      if game.players[color] is writer:
+        game.players[color] = None
+    game.watchers.discard(writer)
+    if not game.clients():
+      self.games.pop(game.name, None)
+
+  def stats(self, game):
+    return {'op': 'stats', 'games': len(self.games), 'global': self.latency.percentiles(),
+            'game': game.latency.percentiles() if game else None}
+
+async def serve(host, port, backend):
+  server = GameServer(backend)
+  await server.start(host, port)
+  print('serving on ' + host + ':' + str(port))
+  async with server.server:
+    await server.server.serve_forever()
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Online chess game server')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8765)
+  parser.add_argument('--backend', default='list', choices=list(BACKENDS))
+  args = parser.parse_args(argv)
+  try:
+    asyncio.run(serve(args.host, args.port, args.backend))
+  except KeyboardInterrupt:
+    pass
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,235 @@
+# Asyncio analysis service: legal moves and best moves of FEN positions for tools, many clients at a time
+# Clients speak JSON lines over TCP, every request may carry an "id" that is sent back with its answer:
+#   {"op": "moves", "fen": FEN}                   the legal moves in long algebraic notation and the game status
+#   {"op": "bestmove", "fen": FEN, "depth": N}    fixed depth search: best move, score for the side to move, pv, nodes
+#   {"op": "stats"}                               cache and coalescing counters, latency percentiles per op
+# Answers are kept in a bounded LRU cache keyed by the position's Zobrist hash (pieces, side to move, castling rights
+# and en passant file) and the request's parameters, so the same position asked with different move counters is one
+# entry. A bestmove request for a position that is being searched already waits for that search instead of starting
+# the same one again
+# Searches run in a process pool, the event loop only parses requests and generates legal moves
+# Usage: python service.py [--host HOST] [--port PORT] [--workers N] [--cache N] [--backend NAME]
+#   servicebench.py is the benchmark client
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from engine import BACKENDS, createBoard
+from perft import moveName
+from search import Search
+from server import LatencyStats
+
+# Deepest search a client can ask for, the pool would be busy for minutes past it
+MAX_DEPTH = 6
+DEFAULT_DEPTH = 3
+# Transposition table of every search, every search gets a new one so the same request always gets the same answer
+SEARCH_HASH_MEGABYTES = 4
+
+# Least recently used entries are dropped once there are more than maxSize
+class LRUCache:
+  def __init__(self, maxSize=10000):
+    self.maxSize = maxSize
+    self.entries = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  # The cached value or None, a hit makes the entry the most recently used
+  def get(self, key):
+    value = self.entries.get(key)
+    if value is None:
+      self.misses += 1
+      return None
+    self.entries.move_to_end(key)
+    self.hits += 1
+    return value
+
+  def put(self, key, value):
+    self.entries[key] = value
+    self.entries.move_to_end(key)
+    if len(self.entries) > self.maxSize:
+      self.entries.popitem(last=False)
+
+  def __len__(self):
+    return len(self.entries)
+
+# Game status of the position on its own, None while it goes on
+def statusOf(board):
+  if not board.getValidMoves():
+    return 'checkmate' if board.inCheck else 'stalemate'
+  if board.isFiftyMoveDraw():
+    return 'fifty moves'
+  return None
+
+# Why the board can't be a position of a game, None when it can
+# The FEN reader already refuses boards without one king of each color and pawns on the first or last rank
+def positionError(board):
+  board.whiteToMove = not board.whiteToMove
+  kingR, kingC = board.wKingPos if board.whiteToMove else board.bKingPos
+  attacked = board.isAttacked(kingR, kingC)
+  board.whiteToMove = not board.whiteToMove
+  return 'the side not to move is in check' if attacked else None
+
+# Pool task: a fixed depth search of the position
+def bestMoveTask(fen, depth, backend):
+  board = createBoard(backend, fen)
+  search = Search(SEARCH_HASH_MEGABYTES)
+  infos = search.search(board, depth)
+  if not infos:
+    return {'bestMove': None, 'score': None, 'depth': 0, 'pv': [], 'nodes': search.nodes, 'status': statusOf(board)}
+  info = infos[-1]
+  return {'bestMove': moveName(info.bestMove), 'score': info.score, 'depth': info.depth,
+          'pv': [moveName(move) for move in info.pv], 'nodes': info.nodes, 'status': None}
+
+class AnalysisService:
+  def __init__(self, backend='list', workers=None, cacheSize=10000):
+    self.backend = backend
+    self.workers = workers or os.cpu_count()
+    self.pool = self.newPool()
+    self.cache = LRUCache(cacheSize)
+    # key -> future of the answer being worked out
+    self.inFlight = {}
+    self.coalesced = 0
+    self.latency = {'moves': LatencyStats(), 'bestmove': LatencyStats()}
+    # Tasks of the connected clients
+    self.clients = set()
+
+  # Spawned rather than forked: forked workers would hold copies of the sockets open when they start, and a client
+  # that hangs up would never be seen to
+  def newPool(self):
+    return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+  async def start(self, host='127.0.0.1', port=8766):
+    self.server = await asyncio.start_server(self.handleClient, host, port)
+    return self.server
+
+  # Stops accepting clients and gives the connected ones a second to hang up
+  async def close(self):
+    self.server.close()
+    if self.clients:
+      await asyncio.wait(self.clients, timeout=1.0)
+    await self.server.wait_closed()
+    self.pool.shutdown(cancel_futures=True)
+
+  def send(self, writer, message):
+    writer.write((json.dumps(message, separators=(',', ':')) + '\n').encode())
+
+  async def handleClient(self, reader, writer):
+    task = asyncio.current_task()
+    self.clients.add(task)
+    try:
+      while True:
+        line = await reader.readline()
+        if not line:
+          break
+        start = time.perf_counter()
+        message = op = None
+        try:
+          message = json.loads(line)
+          op = message.get('op')
+          if op == 'moves' or op == 'bestmove':
+            answer = await self.answer(op, message)
+          elif op == 'stats':
+            answer = self.stats()
+          else:
+            raise ValueError('unknown op ' + repr(op))
+          answer = dict(answer, op=op)
+        except (ValueError, AttributeError) as e:
+          answer = {'op': 'error', 'error': str(e)}
+        except Exception as e:
+          # The search task failed, every client waiting for it gets the error instead of losing its connection
+          answer = {'op': 'error', 'error': 'search failed: ' + (str(e) or type(e).__name__)}
+        if isinstance(message, dict) and 'id' in message:
+          answer['id'] = message['id']
+        self.send(writer, answer)
+        await writer.drain()
+        if op in self.latency and answer['op'] != 'error':
+          self.latency[op].record(time.perf_counter() - start)
+    except ConnectionError:
+      pass
+    finally:
+      self.clients.discard(task)
+      writer.close()
+
+  # The answer of a moves or bestmove request, from the cache, from the same request in flight or worked out
+  async def answer(self, op, message):
+    fen = message.get('fen')
+    if not isinstance(fen, str):
+      raise ValueError('fen missing')
+    board = createBoard(self.backend, fen)
+    error = positionError(board)
+    if error:
+      raise ValueError(error)
+    # The move counters are not part of the hash, the legal moves only depend on whether the 50 move rule already ends
+    # the game
+    key = (op, board.hash, board.isFiftyMoveDraw())
+    if op == 'bestmove':
+      depth = message.get('depth', DEFAULT_DEPTH)
+      if not isinstance(depth, int) or not 1 <= depth <= MAX_DEPTH:
+        raise ValueError('depth must be 1 to ' + str(MAX_DEPTH))
+      # The search scores positions at a halfmove clock of 100 as draws down to depth - 1 plies from the root, clocks
+      # that can't get there in the search give the same answer and share an entry
+      key += (depth, max(board.halfmoveClock, 100 - depth))
+    cached = self.cache.get(key)
+    if cached is not None:
+      return cached
+    if op == 'moves':
+      # Cheap enough for the event loop, a trip to the pool would cost more than the generation
+      result = {'moves': [moveName(move) for move in board.getValidMoves()], 'status': statusOf(board)}
+      self.cache.put(key, result)
+      return result
+    future = self.inFlight.get(key)
+    if future is not None:
+      self.coalesced += 1
+      # Shielded so a client that disconnects doesn't cancel the search the others wait for
+      return await asyncio.shield(future)
+    pool = self.pool
+    future = asyncio.get_running_loop().run_in_executor(pool, bestMoveTask, board.toFEN(), depth, self.backend)
+    self.inFlight[key] = future
+    try:
+      result = await asyncio.shield(future)
+    except BrokenProcessPool:
+      # A worker died and the pool takes no more tasks, the next searches go to a new one
+      if self.pool is pool:
+        pool.shutdown(wait=False)
+        self.pool = self.newPool()
+      raise
+    finally:
+      del self.inFlight[key]
+    self.cache.put(key, result)
+    return result
+
+  def stats(self):
+    return {'cache': {'size': len(self.cache), 'maxSize': self.cache.maxSize, 'hits': self.cache.hits,
+                      'misses': self.cache.misses},
+            'coalesced': self.coalesced, 'inFlight': len(self.inFlight),
+            'latency': {op: stats.percentiles() for op, stats in self.latency.items()}}
+
+async def serve(host, port, backend, workers, cacheSize):
+  service = AnalysisService(backend, workers, cacheSize)
+  await service.start(host, port)
+  print('serving on ' + host + ':' + str(port))
+  async with service.server:
+    await service.server.serve_forever()
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Analysis service for FEN positions')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8766)
+  parser.add_argument('--workers', type=int, default=None, help='search processes, one per cpu by default')
+  parser.add_argument('--cache', type=int, default=10000, help='answers kept in the cache')
+  parser.add_argument('--backend', default='list', choices=list(BACKENDS))
+  args = parser.parse_args(argv)
+  try:
+    asyncio.run(serve(args.host, args.port, args.backend, args.workers, args.cache))
+  except KeyboardInterrupt:
+    pass
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
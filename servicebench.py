@@ -0,0 +1,115 @@
+# Benchmark client for service.py
+# Every client sends its share of the requests one after the other, picking positions at random from a fixed set
+# taken from random games, so clients often ask for the same position at the same time. The whole run is made twice:
+# cold, with an empty cache, then warm, with the answers of the first run cached
+# Usage: python servicebench.py [--clients N] [--requests N] [--positions N] [--op OP] [--depth N]
+#                              [--host HOST] [--port PORT] [--spawn] [--workers N]
+#   --spawn starts the service inside this process on a free port instead of connecting to a running one, the cold
+#   run is only cold against a service that was just started
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from engine import createBoard
+from server import LatencyStats
+from service import AnalysisService
+
+async def send(writer, message):
+  writer.write((json.dumps(message) + '\n').encode())
+  await writer.drain()
+
+async def receive(reader):
+  line = await reader.readline()
+  if not line:
+    raise ConnectionError('service closed the connection')
+  return json.loads(line)
+
+# FENs of positions reached in random games, all different
+def randomFENs(count, seed=0, maxPlies=60):
+  rng = random.Random(seed)
+  fens = {}
+  board = createBoard()
+  while len(fens) < count:
+    moves = board.getValidMoves()
+    if not moves or len(board.moveLog) >= maxPlies:
+      board = createBoard()
+      continue
+    board.makeMove(rng.choice(moves))
+    fens.setdefault(board.hash, board.toFEN())
+  return list(fens.values())
+
+async def runClient(host, port, requests, latency):
+  reader, writer = await asyncio.open_connection(host, port)
+  for i, request in enumerate(requests):
+    start = time.perf_counter()
+    await send(writer, dict(request, id=i))
+    answer = await receive(reader)
+    if answer['op'] == 'error':
+      raise RuntimeError(answer['error'])
+    latency.record(time.perf_counter() - start)
+  writer.close()
+  await writer.wait_closed()
+
+async def stats(host, port):
+  reader, writer = await asyncio.open_connection(host, port)
+  await send(writer, {'op': 'stats'})
+  answer = await receive(reader)
+  writer.close()
+  await writer.wait_closed()
+  return answer
+
+# Sends the requests of every client at the same time, prints the throughput and latency percentiles
+async def runPass(name, host, port, workload):
+  latency = LatencyStats(1000000)
+  start = time.perf_counter()
+  await asyncio.gather(*[runClient(host, port, requests, latency) for requests in workload])
+  seconds = time.perf_counter() - start
+  count = sum(len(requests) for requests in workload)
+  percentiles = latency.percentiles((50, 99))
+  service = await stats(host, port)
+  print('{:<5} {:,} requests in {:.2f}s: {:,.0f} requests/s, p50 {} ms, p99 {} ms, cache hits {:,}, coalesced {:,}'.format(
+    name, count, seconds, count / seconds, percentiles['p50'], percentiles['p99'], service['cache']['hits'],
+    service['coalesced']))
+
+async def runBenchmark(args):
+  port = args.port
+  service = None
+  if args.spawn:
+    service = AnalysisService(args.backend, args.workers, args.cache)
+    await service.start(args.host, 0)
+    port = service.server.sockets[0].getsockname()[1]
+  fens = randomFENs(args.positions)
+  rng = random.Random(1)
+  request = {'op': args.op}
+  if args.op == 'bestmove':
+    request['depth'] = args.depth
+  workload = [[dict(request, fen=rng.choice(fens)) for i in range(args.requests // args.clients)]
+              for client in range(args.clients)]
+  print('{} clients, {} positions, op {}{}'.format(args.clients, args.positions, args.op,
+                                                   ' depth ' + str(args.depth) if args.op == 'bestmove' else ''))
+  await runPass('cold', args.host, port, workload)
+  await runPass('warm', args.host, port, workload)
+  if service:
+    await service.close()
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Benchmark client for the analysis service')
+  parser.add_argument('--clients', type=int, default=50)
+  parser.add_argument('--requests', type=int, default=2000, help='requests per pass, split over the clients')
+  parser.add_argument('--positions', type=int, default=200, help='different positions asked for')
+  parser.add_argument('--op', default='bestmove', choices=('moves', 'bestmove'))
+  parser.add_argument('--depth', type=int, default=3)
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8766)
+  parser.add_argument('--spawn', action='store_true', help='run the service in this process')
+  parser.add_argument('--workers', type=int, default=None, help='search processes of the spawned service')
+  parser.add_argument('--cache', type=int, default=10000, help='cache size of the spawned service')
+  parser.add_argument('--backend', default='list', help='backend of the spawned service')
+  args = parser.parse_args(argv)
+  asyncio.run(runBenchmark(args))
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
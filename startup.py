@@ -0,0 +1,93 @@
+# Startup cost of the modules for headless tools and worker processes
+# importtime runs python -X importtime -c "import MODULE" in a new interpreter and reports how long importing the
+# module took, its slowest imports and whether pygame got loaded
+# spawn starts a pool of worker processes with the spawn method (the default on macOS and Windows, and what
+# service.py uses) whose main module is MODULE, the way every analysis worker of the gui imports main.py again,
+# and times how long until they all started and stopped
+# Usage:
+#   python startup.py importtime [MODULE ...] [--runs N] [--top N]
+#   python startup.py spawn [MODULE ...] [--workers N] [--runs N]
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MODULES = ['engine', 'constants', 'main', 'analysis']
+
+# Runs the code in a new interpreter from the root of the repository, returns its stderr
+def runPython(code, *options):
+  env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+  result = subprocess.run([sys.executable, *options, '-c', code], cwd=ROOT, env=env, check=True,
+                          capture_output=True, text=True)
+  return result.stderr
+
+# (cumulative microseconds of the module, {imported name: cumulative microseconds}) of one -X importtime run
+def importTimes(module):
+  times = {}
+  for line in runPython('import ' + module, '-X', 'importtime').splitlines():
+    if not line.startswith('import time:') or 'cumulative' in line:
+      continue
+    fields = line[len('import time:'):].split('|')
+    times[fields[2].strip()] = int(fields[1])
+  return times.get(module, 0), times
+
+def printImportTimes(modules, runs, top):
+  # Imported by the interpreter before the module is, not part of its cost
+  startup = set(importTimes('sys')[1])
+  for module in modules:
+    results = [importTimes(module) for i in range(runs)]
+    total = statistics.median(cumulative for cumulative, times in results)
+    times = results[-1][1]
+    # Only the packages imported at the top level of the run, their cumulative time includes their own imports
+    slowest = sorted(((us, name) for name, us in times.items()
+                     if '.' not in name and name != module and name not in startup), reverse=True)[:top]
+    print('{:<12} {:8.1f} ms  pygame {:<3}  slowest: {}'.format(
+      module, total / 1000, 'yes' if 'pygame' in times else 'no',
+      ', '.join('{} {:.1f} ms'.format(name, us / 1000) for us, name in slowest)))
+
+# Seconds to start a pool of spawn workers running the module as their main module and shut it down again
+SPAWN_CODE = '''
+import __main__, multiprocessing, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+# Workers started with spawn import the parent's main module again under the name __mp_main__
+__main__.__file__ = {path!r}
+start = time.perf_counter()
+with ProcessPoolExecutor({workers}, mp_context=multiprocessing.get_context('spawn')) as pool:
+  for future in [pool.submit(os.getpid) for i in range({workers})]:
+    future.result()
+sys.stderr.write(str(time.perf_counter() - start))
+'''
+
+def spawnSeconds(module, workers):
+  path = os.path.join(ROOT, *module.split('.')) + '.py'
+  return float(runPython(SPAWN_CODE.format(path=path, workers=workers)))
+
+def printSpawnTimes(modules, workers, runs):
+  for module in modules:
+    seconds = statistics.median(spawnSeconds(module, workers) for i in range(runs))
+    print('{:<12} {} workers in {:7.1f} ms, {:6.1f} ms per worker'.format(module, workers, seconds * 1000,
+                                                                          seconds * 1000 / workers))
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Measures import and worker start times')
+  commands = parser.add_subparsers(dest='command', required=True)
+  importParser = commands.add_parser('importtime', help='import time of every module in a new interpreter')
+  importParser.add_argument('modules', nargs='*', default=MODULES)
+  importParser.add_argument('--runs', type=int, default=5, help='runs per module, the median is printed')
+  importParser.add_argument('--top', type=int, default=3, help='slowest imports shown per module')
+  spawnParser = commands.add_parser('spawn', help='start time of spawn workers with the module as their main module')
+  spawnParser.add_argument('modules', nargs='*', default=['main', 'service'])
+  spawnParser.add_argument('--workers', type=int, default=4)
+  spawnParser.add_argument('--runs', type=int, default=5, help='runs per module, the median is printed')
+  args = parser.parse_args(argv)
+
+  if args.command == 'importtime':
+    printImportTimes(args.modules, args.runs, args.top)
+  else:
+    printSpawnTimes(args.modules, args.workers, args.runs)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
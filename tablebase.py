@@ -0,0 +1,379 @@
+# Endgame tablebases for small material sets (KQK, KRK, KPK, ...) built by retrograde analysis
+# Positions are enumerated by index, their legal moves come from engine.Board and the results are spread back
+# from the mates through the predecessors of every position, one ply at a time
+# Every table is one byte per position, indexed by a perfect index of (side to move, strong king, other pieces):
+#   0           draw
+#   1 to 254    distance to mate in plies + 1, odd distances are wins and even ones losses for the side to move
+#               (1 is mated, 2 mates in one ply, 3 is mated in two plies...)
+#   255         not a legal position
+# Tables are written as <material>.tb in the table directory and read back through mmap
+# Usage:
+#   python tablebase.py generate [MATERIAL...] [--dir DIR]   generates the tables, KQK KRK KPK by default
+#   python tablebase.py probe FEN [--dir DIR]                prints the result, distance and best move
+import argparse
+import mmap
+import os
+import sys
+import time
+from array import array
+from engine import createBoard
+from perft import moveName
+
+DRAW = 0
+INVALID = 255
+MAX_DISTANCE = 253
+
+# The piece letters of a material string and the order they are listed in
+PIECE_LETTERS = 'QRBNP'
+PIECE_TYPES = {'K': 1, 'P': 2, 'N': 3, 'B': 4, 'R': 5, 'Q': 6}
+TYPE_LETTERS = {pieceType: letter for letter, pieceType in PIECE_TYPES.items()}
+LETTER_VALUES = {'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
+
+# Symmetries of the board as square maps (sq = row * 8 + col): bit 1 mirrors the files, bit 2 mirrors the ranks
+# and bit 4 swaps ranks and files
+def transformSquare(sq, t):
+  rank, file = 7 - (sq >> 3), sq & 7
+  if t & 1:
+    file = 7 - file
+  if t & 2:
+    rank = 7 - rank
+  if t & 4:
+    rank, file = file, rank
+  return (7 - rank) * 8 + file
+
+TRANSFORMS = [[transformSquare(sq, t) for sq in range(64)] for t in range(8)]
+
+# Squares the strong king is moved to by the symmetries: the a1-d1-d4 triangle without pawns and the a-d files
+# with pawns, which only allow mirroring the files
+def kingRegion(pawns):
+  if pawns:
+    return [sq for sq in range(64) if sq & 7 <= 3]
+  return [sq for sq in range(64) if sq & 7 <= 3 and 7 - (sq >> 3) <= (sq & 7)]
+
+def kingTransforms(pawns):
+  region = set(kingRegion(pawns))
+  allowed = (0, 1) if pawns else range(8)
+  return [next(t for t in allowed if TRANSFORMS[t][sq] in region) for sq in range(64)]
+
+# 'KQK' -> ('Q', ''), 'KQKR' -> ('Q', 'R')
+def parseMaterial(material):
+  material = material.upper()
+  second = material.find('K', 1)
+  if not material.startswith('K') or second < 0 or any(letter not in PIECE_LETTERS for letter in material[1:second] + material[second + 1:]):
+    raise ValueError('material must look like KQK or KRKP: ' + repr(material))
+  return sortLetters(material[1:second]), sortLetters(material[second + 1:])
+
+def sortLetters(letters):
+  return ''.join(sorted(letters, key=PIECE_LETTERS.index))
+
+# The material string of (white letters, black letters) with the stronger side as white, and whether the colors
+# had to be swapped for it
+def canonicalMaterial(white, black):
+  swap = (sum(LETTER_VALUES[l] for l in black), black) > (sum(LETTER_VALUES[l] for l in white), white)
+  if swap:
+    white, black = black, white
+  return 'K' + white + 'K' + black, swap
+
+def distanceOf(value):
+  return value - 1
+
+# 'win', 'loss' or 'draw' for the side to move
+def resultOf(value):
+  if value == DRAW:
+    return 'draw'
+  return 'loss' if distanceOf(value) % 2 == 0 else 'win'
+
+class Table:
+  def __init__(self, material):
+    self.material = material
+    white, black = parseMaterial(material)
+    # Piece codes in index order: white king, black king, the other white pieces, the other black pieces
+    self.pieces = [9, 17] + [8 | PIECE_TYPES[l] for l in white] + [16 | PIECE_TYPES[l] for l in black]
+    self.pawns = 'P' in white + black
+    self.region = kingRegion(self.pawns)
+    self.kingSlot = {sq: i for i, sq in enumerate(self.region)}
+    self.kingTransform = kingTransforms(self.pawns)
+    self.size = 2 * len(self.region) * 64 ** (len(self.pieces) - 1)
+    self.data = None
+    self.file = None
+
+  # Index of the squares of the pieces (in self.pieces order) with this side to move
+  def index(self, squares, whiteToMove):
+    transform = TRANSFORMS[self.kingTransform[squares[0]]]
+    index = (0 if whiteToMove else 1) * len(self.region) + self.kingSlot[transform[squares[0]]]
+    for sq in squares[1:]:
+      index = index * 64 + transform[sq]
+    return index
+
+  # (squares, whiteToMove) of an index
+  def position(self, index):
+    squares = []
+    for i in range(len(self.pieces) - 1):
+      index, sq = divmod(index, 64)
+      squares.append(sq)
+    side, king = divmod(index, len(self.region))
+    squares.append(self.region[king])
+    squares.reverse()
+    return squares, side == 0
+
+  def value(self, index):
+    return self.data[index]
+
+  def load(self, path):
+    self.file = open(path, 'rb')
+    if os.fstat(self.file.fileno()).st_size != self.size:
+      self.file.close()
+      raise ValueError(path + ' is not a ' + self.material + ' table of ' + str(self.size) + ' bytes')
+    self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+  def close(self):
+    if self.file is not None:
+      self.data.close()
+      self.file.close()
+      self.file = None
+    self.data = None
+
+class Tablebases:
+  def __init__(self, directory='tablebases', generate=True):
+    self.directory = directory
+    self.generate = generate
+    self.tables = {}
+    self.reports = []
+
+  # The table of a material string, read from the directory or generated (and written) when it is missing
+  # Returns None when the table is not there and generating is off
+  def table(self, material):
+    table = self.tables.get(material)
+    if table is not None:
+      return table
+    table = Table(material)
+    path = os.path.join(self.directory, material + '.tb')
+    if os.path.exists(path):
+      table.load(path)
+    elif self.generate:
+      data = generateTable(table, self)
+      os.makedirs(self.directory, exist_ok=True)
+      with open(path, 'wb') as out:
+        out.write(data)
+      table.load(path)
+    else:
+      return None
+    self.tables[material] = table
+    return table
+
+  # Value of a position given as (piece, sq) pairs with this side to move
+  # Positions with only the kings left, or a lone bishop or knight against them, are draws, None when the table is
+  # not available
+  def value(self, pieces, whiteToMove):
+    white = sortLetters(''.join(TYPE_LETTERS[piece & 7] for piece, sq in pieces if piece & 8 and piece != 9))
+    black = sortLetters(''.join(TYPE_LETTERS[piece & 7] for piece, sq in pieces if piece & 16 and piece != 17))
+    if white + black in ('', 'B', 'N'):
+      return DRAW
+    material, swap = canonicalMaterial(white, black)
+    table = self.table(material)
+    if table is None:
+      return None
+    if swap:
+      # Swaps the colors and mirrors the ranks so the pawns still move the right way
+      pieces = [(piece ^ 24, sq ^ 56) for piece, sq in pieces]
+      whiteToMove = not whiteToMove
+    squares = []
+    used = [False] * len(pieces)
+    for code in table.pieces:
+      for i, (piece, sq) in enumerate(pieces):
+        if not used[i] and piece == code:
+          used[i] = True
+          squares.append(sq)
+          break
+    return table.value(table.index(squares, whiteToMove))
+
+  # (result, distance to mate in plies, best move) for the side to move of the board, None when its material has
+  # no table, the distance and the move are None for draws without legal moves
+  def probe(self, board):
+    pieces = boardPieces(board)
+    value = self.value(pieces, board.whiteToMove)
+    if value is None or value == INVALID:
+      return None
+    best = None
+    bestKey = None
+    for move in board.getValidMoves():
+      after = self.value(piecesAfter(pieces, move), not board.whiteToMove)
+      # Wins go to the quickest loss of the opponent, losses to the slowest win and draws to any draw
+      if after == DRAW:
+        key = (1, 0)
+      elif resultOf(after) == 'loss':
+        key = (2, -after)
+      else:
+        key = (0, after)
+      if bestKey is None or key > bestKey:
+        best, bestKey = move, key
+    return resultOf(value), (distanceOf(value) if value != DRAW else None), best
+
+  def close(self):
+    for table in self.tables.values():
+      table.close()
+    self.tables = {}
+
+def boardPieces(board):
+  return [(board.board[sq >> 3][sq & 7], sq) for sq in range(64) if board.board[sq >> 3][sq & 7] != 0]
+
+# The (piece, sq) pairs after the move
+def piecesAfter(pieces, move):
+  start = move.startRow * 8 + move.startCol
+  end = move.endRow * 8 + move.endCol
+  # The pawn taken en passant is next to the start square
+  captured = move.startRow * 8 + move.endCol if move.isEnpassant else end
+  return [(p, sq) for p, sq in pieces if sq != start and sq != captured] + [(move.promotion or move.pieceMoved, end)]
+
+# Runs the retrograde analysis of a table and returns its bytes
+# Positions leaving the table (captures and promotions) take their values from the smaller tables
+def generateTable(table, tablebases):
+  start = time.perf_counter()
+  size = table.size
+  values = bytearray(size)
+  remaining = bytearray(size) # Moves of the position not yet known to lose
+  slowestWin = bytearray(size) # Longest distance of the opponent's wins reached by leaving the table
+  sources = array('I')
+  targets = array('I')
+  buckets = {} # distance -> positions that get this distance unless they were decided already
+  board = createBoard()
+  for index in range(size):
+    squares, whiteToMove = table.position(index)
+    if not validSquares(table, squares):
+      values[index] = INVALID
+      continue
+    position = [[0] * 8 for r in range(8)]
+    for piece, sq in zip(table.pieces, squares):
+      position[sq >> 3][sq & 7] = piece
+    board.setPosition(position, whiteToMove)
+    # The side that just moved can't be left in check
+    board.whiteToMove = not whiteToMove
+    king = board.bKingPos if whiteToMove else board.wKingPos
+    illegal = board.enemyAttacks() >> (king[0] * 8 + king[1]) & 1
+    board.whiteToMove = whiteToMove
+    if illegal:
+      values[index] = INVALID
+      continue
+    moves = board.generateValidMoves()
+    if not moves:
+      if board.inCheck:
+        buckets.setdefault(0, []).append(index)
+      continue
+    pieces = list(zip(table.pieces, squares))
+    for move in moves:
+      if move.pieceCaptured != 0 or move.promotion:
+        after = tablebases.value(piecesAfter(pieces, move), not whiteToMove)
+        if after == DRAW:
+          remaining[index] += 1
+        elif resultOf(after) == 'loss':
+          buckets.setdefault(distanceOf(after) + 1, []).append(index)
+          remaining[index] += 1
+        else:
+          slowestWin[index] = max(slowestWin[index], distanceOf(after))
+        continue
+      moved = squares.index(move.startRow * 8 + move.startCol)
+      after = squares[:]
+      after[moved] = move.endRow * 8 + move.endCol
+      remaining[index] += 1
+      sources.append(index)
+      targets.append(table.index(after, not whiteToMove))
+    if remaining[index] == 0:
+      buckets.setdefault(slowestWin[index] + 1, []).append(index)
+
+  # Predecessor lists in one flat array, first[i]:first[i + 1] are the predecessors of position i
+  first = array('I', bytes(4 * (size + 1)))
+  for target in targets:
+    first[target + 1] += 1
+  for i in range(size):
+    first[i + 1] += first[i]
+  fill = first[:-1]
+  predecessors = array('I', bytes(4 * len(targets)))
+  for source, target in zip(sources, targets):
+    predecessors[fill[target]] = source
+    fill[target] += 1
+  del sources, targets, fill
+
+  distance = 0
+  while buckets:
+    positions = buckets.pop(distance, [])
+    for index in positions:
+      if values[index] != DRAW:
+        continue
+      if distance > MAX_DISTANCE:
+        raise ValueError(table.material + ' has mates longer than ' + str(MAX_DISTANCE) + ' plies')
+      values[index] = distance + 1
+      for p in range(first[index], first[index + 1]):
+        previous = predecessors[p]
+        if values[previous] != DRAW:
+          continue
+        if distance % 2 == 0:
+          # The position loses so the positions moving to it win one ply later
+          buckets.setdefault(distance + 1, []).append(previous)
+        else:
+          remaining[previous] -= 1
+          if remaining[previous] == 0:
+            buckets.setdefault(max(distance, slowestWin[previous]) + 1, []).append(previous)
+    distance += 1
+
+  tablebases.reports.append(tableReport(table.material, values, time.perf_counter() - start))
+  return bytes(values)
+
+# Squares of different pieces, no pawns on the first or last rank
+def validSquares(table, squares):
+  if len(set(squares)) != len(squares):
+    return False
+  for piece, sq in zip(table.pieces, squares):
+    if piece & 7 == 2 and sq >> 3 in (0, 7):
+      return False
+  return True
+
+def tableReport(material, values, seconds):
+  wins = losses = draws = invalid = longest = 0
+  for value in values:
+    if value == INVALID:
+      invalid += 1
+    elif value == DRAW:
+      draws += 1
+    else:
+      if distanceOf(value) % 2:
+        wins += 1
+      else:
+        losses += 1
+      longest = max(longest, distanceOf(value))
+  return {'material': material, 'seconds': seconds, 'bytes': len(values), 'positions': len(values) - invalid,
+          'wins': wins, 'losses': losses, 'draws': draws, 'longest': longest}
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Generates and probes endgame tablebases')
+  commands = parser.add_subparsers(dest='command', required=True)
+  generate = commands.add_parser('generate', help='generates tables')
+  generate.add_argument('materials', nargs='*', default=['KQK', 'KRK', 'KPK'])
+  generate.add_argument('--dir', default='tablebases')
+  probe = commands.add_parser('probe', help='probes a position')
+  probe.add_argument('fen')
+  probe.add_argument('--dir', default='tablebases')
+  args = parser.parse_args(argv)
+
+  tablebases = Tablebases(args.dir)
+  if args.command == 'generate':
+    for material in args.materials:
+      white, black = parseMaterial(material)
+      tablebases.table(canonicalMaterial(white, black)[0])
+    if not tablebases.reports:
+      print('all tables were already generated')
+    for report in tablebases.reports:
+      print('{material}: {seconds:.1f}s, {bytes:,} bytes, {positions:,} positions, {wins:,} wins, {losses:,} losses, '
+            '{draws:,} draws, longest mate {longest} plies'.format(**report))
+  else:
+    board = createBoard('list', args.fen)
+    result = tablebases.probe(board)
+    if result is None:
+      print('no table for this position')
+    else:
+      outcome, distance, move = result
+      print('{} {} {}'.format(outcome, '-' if distance is None else distance, moveName(move) if move else '-'))
+  tablebases.close()
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
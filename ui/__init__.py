@@ -0,0 +1,3 @@
+# The pygame gui: game (the window and its event loop), render (drawing the board) and assets (the piece images)
+# The engine and the other modules next to this package never import it, so headless tools and worker processes
+# don't load pygame
@@ -0,0 +1,131 @@
+# Piece images for the gui
+# The 12 piece PNGs in images/ are scaled once to the square size and packed side by side into one sprite atlas. The
+# atlas is cached as raw RGBA bytes in .cache/ so the next start at the same size reads one file instead of decoding
+# and scaling 12 PNGs, and it is rebuilt when an image is newer than the cache
+# Paths are built from the root of the repository, found from the location of this file, so the gui starts from any
+# working directory on any OS
+# Nothing is loaded and pygame is not imported until the gui asks for pieceImages()
+# Usage: python -m ui.assets [--size N] [--runs N]   times loading the images one by one and through the atlas
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_DIR = os.path.join(ROOT, 'images')
+CACHE_DIR = os.path.join(ROOT, '.cache')
+# Piece codes and their image names, the atlas has the pieces in this order
+PIECE_NAMES = {9: 'wK', 10: 'wP', 11: 'wN', 12: 'wB', 13: 'wR', 14: 'wQ', 17: 'bK', 18: 'bP', 19: 'bN', 20: 'bB', 21: 'bR', 22: 'bQ'}
+ATLAS_ORDER = sorted(PIECE_NAMES)
+# Part of the cache file name, changed when the atlas layout changes so old files are not read
+ATLAS_VERSION = 1
+
+# size -> piece images already loaded by this process
+loaded = {}
+
+def imagePath(name):
+  return os.path.join(IMAGE_DIR, name + '.png')
+
+def atlasPath(size):
+  return os.path.join(CACHE_DIR, 'pieces-v{}-{}.rgba'.format(ATLAS_VERSION, size))
+
+# Is there a cached atlas at least as new as every image
+def cacheIsFresh(path):
+  if not os.path.exists(path):
+    return False
+  built = os.path.getmtime(path)
+  return all(os.path.getmtime(imagePath(name)) <= built for name in PIECE_NAMES.values())
+
+# One surface size * 12 wide with the scaled images in ATLAS_ORDER
+def buildAtlas(size):
+  import pygame
+  atlas = pygame.Surface((size * len(ATLAS_ORDER), size), pygame.SRCALPHA)
+  for i, piece in enumerate(ATLAS_ORDER):
+    image = pygame.transform.smoothscale(pygame.image.load(imagePath(PIECE_NAMES[piece])), (size, size))
+    # Adding to the transparent atlas copies the pixels as they are, a normal blit would blend the edges with it
+    atlas.blit(image, (i * size, 0), special_flags=pygame.BLEND_RGBA_ADD)
+  return atlas
+
+# The atlas of this size from the cache, built and written to the cache when it is missing or older than the images
+def loadAtlas(size):
+  import pygame
+  path = atlasPath(size)
+  atlasSize = (size * len(ATLAS_ORDER), size)
+  if cacheIsFresh(path):
+    with open(path, 'rb') as cache:
+      data = cache.read()
+    if len(data) == atlasSize[0] * atlasSize[1] * 4:
+      return pygame.image.frombuffer(data, atlasSize, 'RGBA')
+  atlas = buildAtlas(size)
+  os.makedirs(CACHE_DIR, exist_ok=True)
+  # Written next to the cache file and renamed so a gui starting at the same time never reads half a file
+  with open(path + '.tmp', 'wb') as cache:
+    cache.write(pygame.image.tostring(atlas, 'RGBA'))
+  os.replace(path + '.tmp', path)
+  return atlas
+
+# piece code -> image of size * size pixels, cut out of the atlas
+# Converted to the display's pixel format for fast blits when the display is set up already
+def pieceImages(size):
+  if size in loaded:
+    return loaded[size]
+  import pygame
+  atlas = loadAtlas(size)
+  if pygame.display.get_surface() is not None:
+    atlas = atlas.convert_alpha()
+  images = {piece: atlas.subsurface(pygame.Rect(i * size, 0, size, size)) for i, piece in enumerate(ATLAS_ORDER)}
+  loaded[size] = images
+  return images
+
+# Every image loaded and scaled on its own, the way the gui used to do it at every start
+def loadEachImage(size):
+  import pygame
+  return {piece: pygame.transform.scale(pygame.image.load(imagePath(name)), (size, size)) for piece, name in PIECE_NAMES.items()}
+
+# Median seconds of fn over the runs
+def timeCall(fn, runs):
+  times = []
+  for i in range(runs):
+    start = time.perf_counter()
+    fn()
+    times.append(time.perf_counter() - start)
+  return statistics.median(times)
+
+# Median seconds a new interpreter takes to run the code
+def timeInterpreter(code, runs):
+  env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+  return timeCall(lambda: subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, env=env), runs)
+
+def bench(size, runs):
+  os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+  import pygame
+  pygame.display.init()
+  pygame.display.set_mode((size * 8, size * 8))
+  def built():
+    if os.path.exists(atlasPath(size)):
+      os.remove(atlasPath(size))
+    loaded.clear()
+    pieceImages(size)
+  def cached():
+    loaded.clear()
+    pieceImages(size)
+  print('piece images at {} px:'.format(size))
+  print('  loaded and scaled one by one  {:7.2f} ms'.format(timeCall(lambda: loadEachImage(size), runs) * 1000))
+  print('  atlas built and cached        {:7.2f} ms'.format(timeCall(built, runs) * 1000))
+  print('  atlas from the cache          {:7.2f} ms'.format(timeCall(cached, runs) * 1000))
+  print('new interpreter:')
+  print('  import engine                 {:7.1f} ms'.format(timeInterpreter('import engine', runs) * 1000))
+  print('  import pygame, engine         {:7.1f} ms'.format(timeInterpreter('import pygame, engine', runs) * 1000))
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Times loading the piece images')
+  parser.add_argument('--size', type=int, default=100, help='square size in pixels')
+  parser.add_argument('--runs', type=int, default=7, help='runs per case, the median is printed')
+  args = parser.parse_args(argv)
+  bench(args.size, args.runs)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,95 @@
+# The gui: the window, its event loop and the analysis shown with it, started by main.py
+import pygame
+from constants import *
+from engine import Move, createBoard
+from ui.assets import pieceImages
+from ui.render import FrameLog, Renderer
+from analysis import AnalysisWorker, formatUpdate
+
+# Initialising the Board, the piece images are loaded once the window exists
+board = createBoard(BACKEND)
+
+
+# Initialising the Window
+def main():
+  # Variables needed for pygame
+  run = True
+  # The position on the board is analysed in the background, a new position is sent after every move and undo
+  analysis = AnalysisWorker(BACKEND) if ANALYSIS else None
+  
+  pygame.init()
+  clock = pygame.time.Clock()
+  screen = pygame.display.set_mode((WIDTH, HEIGHT))
+  pygame.display.set_caption('Chess')
+  # Only redraws the squares that changed each frame
+  renderer = Renderer(screen, pieceImages(SQUARE_SIZE))
+  # Every frame time, printed when the game is closed to check the frame rate held
+  frames = FrameLog()
+  if analysis:
+    analysis.analyse(board)
+  
+  selectedSquare = () # (x, y)
+  playerClicks = [] # Has 2 tuples Start, End
+  
+  while run:
+    for event in pygame.event.get():
+      # if user closes the program
+      if event.type == pygame.QUIT:
+        run = False
+      elif event.type == pygame.MOUSEBUTTONDOWN:
+        # if the user clicks the left mouse button
+        if event.button == 1:
+          # Gets the mouse location and divides by the square size this integer value is the index of the square
+          location = pygame.mouse.get_pos()
+          col = location[0] // SQUARE_SIZE
+          row = location[1] // SQUARE_SIZE
+          
+          if selectedSquare == (row, col):
+            selectedSquare = () # Deselect as user clicked twice
+            playerClicks = [] # Reset Clicks
+          else:  
+            selectedSquare = (row, col)
+            playerClicks.append(selectedSquare)
+
+          if len(playerClicks) == 2:
+            # deselects the clicks on empty squares
+            if board.board[playerClicks[0][0]][playerClicks[0][1]] == 0:
+              playerClicks = []
+            else:
+              # creates the Move object and executes the move if its in the Valid moves
+              # the board caches its valid moves per position so this is a set lookup
+              move = Move(playerClicks[0], playerClicks[1], board)
+              if board.isLegal(move):
+                print(move.getChessNotation(board))
+                board.makeMove(move)
+                if analysis:
+                  analysis.analyse(board)
+              # resets the variables for the next move
+              selectedSquare = ()
+              playerClicks = []
+              
+        elif event.button == 3:
+          # if the user clicks the right mouse button
+          board.undoMove()
+          if analysis:
+            analysis.analyse(board)
+      elif event.type == pygame.KEYDOWN and event.key == pygame.K_f:
+        renderer.toggleStats()
+      elif event.type == pygame.WINDOWEXPOSED:
+        # the window contents were lost (ex: it was minimised), draw everything again
+        renderer.invalidate()
+          
+    if analysis:
+      for update in analysis.poll():
+        text = formatUpdate(update)
+        if text is not None:
+          renderer.setAnalysis(text)
+    renderer.draw(board, selectedSquare)
+    frames.tick()
+    clock.tick(FPS)
+      
+  if analysis:
+    analysis.close()
+  print(frames.summary())
+  pygame.quit()
+  return 0
@@ -0,0 +1,161 @@
+# Draws the game with dirty rectangles
+# The empty board and the highlight overlays are rendered once, every frame only the squares whose
+# piece or highlight changed since the last frame are redrawn and sent to the display
+import time
+import pygame
+from constants import *
+
+# Highlight kinds of a square
+NONE, SELECTED, TARGET = 0, 1, 2
+
+class Renderer:
+  def __init__(self, screen, images, showStats=SHOW_STATS):
+    self.screen = screen
+    self.images = images
+    self.background = self.renderBackground()
+    self.overlays = {SELECTED: self.renderOverlay(pygame.Color('blue')), TARGET: self.renderOverlay(pygame.Color('purple'))}
+    # (piece, highlight) of every square as it is on screen, None forces the square to be redrawn
+    self.drawn = [None] * 64
+    self.showStats = showStats
+    self.font = pygame.font.Font(None, 24)
+    self.statsText = ''
+    self.statsRect = pygame.Rect(0, 0, 0, 0)
+    self.statsUpdated = 0
+    self.lastFrame = None
+    self.frameTimes = [] # Seconds between the last frames
+    self.drawTimes = [] # Seconds spent in draw for the last frames
+    # One line of analysis in the bottom left corner, see setAnalysis
+    self.analysisText = ''
+    self.analysisRect = pygame.Rect(0, HEIGHT, 0, 0)
+
+  # The light and dark squares, drawn once
+  def renderBackground(self):
+    background = pygame.Surface((WIDTH, HEIGHT))
+    colors = [LIGHTCOL, DARKCOL]
+    for rank in range(RANKS):
+      for file in range(FILES):
+        pygame.draw.rect(background, colors[(rank + file) % 2], squareRect(rank, file))
+    return background
+
+  def renderOverlay(self, color):
+    overlay = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE))
+    overlay.set_alpha(150)
+    overlay.fill(color)
+    return overlay
+
+  # Forces the next draw to redraw everything, ex: after the window was hidden
+  def invalidate(self):
+    self.drawn = [None] * 64
+
+  def toggleStats(self):
+    self.showStats = not self.showStats
+    self.lastFrame = None
+    self.invalidateRect(self.statsRect)
+
+  # Shows the text in the bottom left corner, an empty text hides it
+  # Like the stats, the text is redrawn on top of the squares under it whenever those are
+  def setAnalysis(self, text):
+    if text == self.analysisText:
+      return
+    self.invalidateRect(self.analysisRect)
+    self.analysisText = text
+    width, height = self.font.size(text) if text else (0, 0)
+    self.analysisRect = pygame.Rect(0, HEIGHT - height, width, height)
+    self.invalidateRect(self.analysisRect)
+
+  # Forces the squares under rect to be redrawn
+  def invalidateRect(self, rect):
+    for sq in range(64):
+      if rect.colliderect(squareRect(sq // 8, sq % 8)):
+        self.drawn[sq] = None
+
+  # Highlight of every square: the selected piece and the squares it can move to
+  def highlights(self, board, selectedSquare):
+    highlights = {}
+    if selectedSquare != ():
+      r, f = selectedSquare
+      if board.board[r][f] != 0:
+        highlights[r * 8 + f] = SELECTED
+        for move in board.legalMovesFrom(r, f):
+          highlights[move.endRow * 8 + move.endCol] = TARGET
+    return highlights
+
+  # Redraws what changed since the last frame and updates only those parts of the display
+  # Returns the list of updated rects
+  def draw(self, board, selectedSquare):
+    start = time.perf_counter()
+    if self.showStats:
+      self.updateStats(start)
+
+    highlights = self.highlights(board, selectedSquare)
+    dirty = []
+    for sq in range(64):
+      r, f = divmod(sq, 8)
+      piece = board.board[r][f]
+      state = (piece, highlights.get(sq, NONE))
+      if state != self.drawn[sq]:
+        rect = squareRect(r, f)
+        self.screen.blit(self.background, rect, rect)
+        if state[1] != NONE:
+          self.screen.blit(self.overlays[state[1]], rect)
+        if piece != 0:
+          self.screen.blit(self.images[piece], rect)
+        self.drawn[sq] = state
+        dirty.append(rect)
+
+    # The stats are drawn on top of the board so they are redrawn whenever a square under them was
+    if self.showStats and self.statsRect.collidelist(dirty) != -1:
+      self.screen.blit(self.font.render(self.statsText, True, (0, 0, 0), (255, 255, 255)), self.statsRect)
+    if self.analysisText and self.analysisRect.collidelist(dirty) != -1:
+      self.screen.blit(self.font.render(self.analysisText, True, (0, 0, 0), (255, 255, 255)), self.analysisRect)
+
+    if dirty:
+      pygame.display.update(dirty)
+    self.drawTimes.append(time.perf_counter() - start)
+    return dirty
+
+  # Keeps the frame timings and refreshes the FPS / frame time text twice a second
+  def updateStats(self, now):
+    if self.lastFrame is not None:
+      self.frameTimes.append(now - self.lastFrame)
+    self.lastFrame = now
+    if now - self.statsUpdated < 0.5 or not self.frameTimes:
+      return
+    frame = sum(self.frameTimes) / len(self.frameTimes)
+    drawTime = sum(self.drawTimes) / len(self.drawTimes) if self.drawTimes else 0
+    self.statsText = '{:.0f} fps  {:.1f} ms frame  {:.2f} ms draw'.format(1 / frame if frame else 0, frame * 1000, drawTime * 1000)
+    self.frameTimes = []
+    self.drawTimes = []
+    self.statsUpdated = now
+    # The squares under the old and the new text are redrawn, which redraws the text on top of them
+    self.invalidateRect(self.statsRect)
+    self.statsRect = pygame.Rect((0, 0), self.font.size(self.statsText))
+    self.invalidateRect(self.statsRect)
+
+# Every frame time of a session, to check that the frame rate held (ex: while the analysis worker searches)
+class FrameLog:
+  def __init__(self, fps=FPS):
+    self.budget = 1 / fps
+    self.times = []
+    self.last = None
+
+  # Called once per frame
+  def tick(self):
+    now = time.perf_counter()
+    if self.last is not None:
+      self.times.append(now - self.last)
+    self.last = now
+
+  # Frames that took more than 1.5 frame budgets count as dropped
+  def summary(self):
+    if not self.times:
+      return 'no frames'
+    times = sorted(self.times)
+    count = len(times)
+    dropped = sum(1 for t in times if t > self.budget * 1.5)
+    return '{:,} frames, {:.1f} fps, frame time p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms, {} dropped'.format(
+      count, count / sum(times), times[count // 2] * 1000, times[min(count - 1, count * 99 // 100)] * 1000,
+      times[-1] * 1000, dropped)
+
+def squareRect(rank, file):
+  return pygame.Rect(file * SQUARE_SIZE, rank * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)